@@ -0,0 +1,110 @@
+# File: candidate_scoring.py
+# Cheap quality heuristics for ranking best-of-N takes of the same text.
+# Every metric is computed from the speech tokens and the waveform already in
+# memory (no extra model passes). Penalties are normalized to [0, 1]; the
+# score is 1 minus their weighted mean, so higher is better.
+
+import math
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+# Spanish speech at the model's default pace (matches the spillover prior).
+EXPECTED_SEC_PER_CHAR = 0.065
+
+DEFAULT_WEIGHTS = {
+    "duration": 1.0,  # Far from the length expected for the text
+    "repetition": 1.0,  # Looping speech tokens (stutter, repeated words)
+    "clipping": 1.0,  # Samples at full scale
+    "silence": 1.0,  # Long pauses or dead air
+    "no_stop": 1.0,  # Hit the token limit without a stop token (babbling)
+}
+
+
+def expected_duration_sec(text: str, sec_per_char: float = EXPECTED_SEC_PER_CHAR) -> float:
+    return max(len(text.strip()), 1) * sec_per_char
+
+
+def duration_penalty(actual_sec: float, expected_sec: float, tolerance: float = 1.25) -> float:
+    """0 within ±25% of the expected length, rising to 1 at 2x too long or short."""
+    if actual_sec <= 0 or expected_sec <= 0:
+        return 1.0
+    deviation = abs(math.log(actual_sec / expected_sec)) - math.log(tolerance)
+    return float(min(max(deviation, 0.0) / math.log(2.0 / tolerance), 1.0))
+
+
+def repetition_ratio(tokens: Sequence[int], n: int = 4) -> float:
+    """Fraction of token n-grams that repeat an earlier n-gram."""
+    if len(tokens) <= n:
+        return 0.0
+    ngrams = [tuple(tokens[i : i + n]) for i in range(len(tokens) - n + 1)]
+    return 1.0 - len(set(ngrams)) / len(ngrams)
+
+
+def clipping_ratio(wav: np.ndarray, threshold: float = 0.99) -> float:
+    if wav.size == 0:
+        return 0.0
+    return float(np.mean(np.abs(wav) >= threshold))
+
+
+def silence_ratio(
+    wav: np.ndarray, sample_rate: int, frame_ms: float = 20.0, threshold_db: float = -40.0
+) -> float:
+    """Fraction of frames whose RMS is `threshold_db` below the loudest frame."""
+    frame = max(int(sample_rate * frame_ms / 1000), 1)
+    frames = wav.size // frame
+    if frames == 0:
+        return 1.0
+    rms = np.sqrt(np.mean(wav[: frames * frame].reshape(frames, frame) ** 2, axis=1))
+    peak = float(rms.max())
+    if peak <= 0:
+        return 1.0
+    return float(np.mean(rms < peak * 10 ** (threshold_db / 20)))
+
+
+def score_candidate(
+    wav: np.ndarray,
+    sample_rate: int,
+    text: str,
+    tokens: Optional[Sequence[int]] = None,
+    reached_stop: Optional[bool] = None,
+    weights: Optional[Dict[str, float]] = None,
+) -> Dict[str, float]:
+    """
+    Scores one take. `tokens`/`reached_stop` are optional (unknown when the
+    model's own generate() produced the audio); their penalties are skipped.
+
+    Returns:
+        Dict with "score" in [0, 1] and the raw metrics behind it.
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    wav = np.asarray(wav, dtype=np.float32).reshape(-1)
+    duration = wav.size / sample_rate if sample_rate else 0.0
+    expected = expected_duration_sec(text)
+    metrics = {
+        "duration_sec": round(duration, 3),
+        "expected_sec": round(expected, 3),
+        "clipping_ratio": round(clipping_ratio(wav), 5),
+        "silence_ratio": round(silence_ratio(wav, sample_rate), 4),
+    }
+    penalties = {
+        "duration": duration_penalty(duration, expected),
+        "clipping": min(metrics["clipping_ratio"] * 100.0, 1.0),  # 1% clipped = full penalty
+        # Natural pauses stay under ~30% of frames.
+        "silence": max(metrics["silence_ratio"] - 0.3, 0.0) / 0.7,
+    }
+    if tokens is not None:
+        metrics["repetition_ratio"] = round(repetition_ratio(list(tokens)), 4)
+        # Short silence runs repeat a little in normal speech.
+        penalties["repetition"] = min(max(metrics["repetition_ratio"] - 0.1, 0.0) / 0.4, 1.0)
+    if reached_stop is not None:
+        metrics["reached_stop"] = reached_stop
+        penalties["no_stop"] = 0.0 if reached_stop else 1.0
+
+    total_weight = sum(weights.get(name, 0.0) for name in penalties) or 1.0
+    penalty = sum(weights.get(name, 0.0) * value for name, value in penalties.items())
+    metrics["score"] = round(1.0 - penalty / total_weight, 4)
+    return metrics
+
+
+# --- End File: candidate_scoring.py ---
@@ -0,0 +1,282 @@
+# File: component_residency.py
+# Per-voice conditionals cache and component-level residency. Once a voice's
+# conditionals are cached, the components that only compute conditionals
+# (VoiceEncoder, S3 speech tokenizer, CAMPPlus speaker encoder) sit idle; they
+# are offloaded to CPU or disk on their own and restored when a new voice
+# has to be embedded. This complements the all-or-nothing `sleep_model()`.
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Optional
+
+import torch
+from torch import nn
+
+from model_sharing import get_component
+
+logger = logging.getLogger(__name__)
+
+# Components only used by `prepare_conditionals`, never by decoding/vocoding.
+DEFAULT_CONDITIONING_COMPONENTS = ["ve", "s3gen.tokenizer", "s3gen.speaker_encoder"]
+
+
+class VoiceConditionalsCache:
+    """Thread-safe LRU of prepared conditionals keyed by voice identity."""
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            conds = self._entries.get(key)
+            if conds is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return conds
+
+    def put(self, key: Hashable, conds: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = conds
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class _ResidentComponent:
+    def __init__(self, module: nn.Module, name: str):
+        self.module = module
+        self.names: List[str] = [name]
+        self.location = "device"  # "device", "cpu" or "disk"
+        self.last_used = time.time()
+        self.in_use = 0
+        self.offload_file: Optional[Path] = None
+        self.offloads = 0
+        self.restores = 0
+        self.unmovable = False  # Set if a move failed (e.g. NF4 layers pinned to CUDA)
+
+
+class ComponentResidency:
+    """
+    Tracks conditioning components of every resident model and moves each one
+    off the inference device after `idle_sec` without use.
+
+    `offload_to="cpu"` keeps the weights in host RAM; `"disk"` writes them to
+    `offload_dir` and leaves the module on the meta device, freeing both VRAM
+    and RAM. `acquire()` restores components before they are used.
+    """
+
+    def __init__(
+        self,
+        component_paths: Optional[List[str]] = None,
+        idle_sec: float = 300.0,
+        offload_to: str = "cpu",
+        offload_dir: Optional[Path] = None,
+    ):
+        self.component_paths = list(component_paths or DEFAULT_CONDITIONING_COMPONENTS)
+        self.idle_sec = idle_sec
+        self.offload_to = offload_to
+        self.offload_dir = offload_dir
+        self.enabled = False
+        self._components: Dict[int, _ResidentComponent] = {}  # id(module) -> entry
+        self._lock = threading.RLock()
+
+    def configure(
+        self, idle_sec: float, offload_to: str, offload_dir: Optional[Path]
+    ) -> None:
+        if offload_to not in ("cpu", "disk"):
+            logger.warning(f"Unknown offload target '{offload_to}', using 'cpu'.")
+            offload_to = "cpu"
+        self.idle_sec = idle_sec
+        self.offload_to = offload_to
+        self.offload_dir = offload_dir
+        self.enabled = True
+
+    def register(self, model: Any, variant: str) -> None:
+        """Starts tracking `model`'s conditioning components (shared ones once)."""
+        with self._lock:
+            for path in self.component_paths:
+                module = get_component(model, path)
+                if not isinstance(module, nn.Module):
+                    continue
+                entry = self._components.get(id(module))
+                name = f"{variant}:{path}"
+                if entry is None:
+                    self._components[id(module)] = _ResidentComponent(module, name)
+                else:
+                    entry.names.append(name)
+
+    def clear(self) -> None:
+        with self._lock:
+            for entry in self._components.values():
+                if entry.offload_file is not None:
+                    entry.offload_file.unlink(missing_ok=True)
+            self._components.clear()
+
+    def _entries_for(self, model: Any) -> List[_ResidentComponent]:
+        entries = []
+        for path in self.component_paths:
+            module = get_component(model, path)
+            entry = self._components.get(id(module)) if module is not None else None
+            if entry is not None:
+                entries.append(entry)
+        return entries
+
+    def _restore(self, entry: _ResidentComponent, device: str) -> None:
+        if entry.location == "device":
+            return
+        start_time = time.perf_counter()
+        if entry.location == "disk":
+            saved = torch.load(entry.offload_file, map_location=device)
+            entry.module.to_empty(device=device)
+            with torch.no_grad():
+                for name, tensor in list(entry.module.named_parameters()) + list(
+                    entry.module.named_buffers()
+                ):
+                    if name in saved:
+                        tensor.copy_(saved[name])
+        else:
+            entry.module.to(device)
+        entry.location = "device"
+        entry.restores += 1
+        logger.info(
+            f"Restored component {entry.names[0]} to {device} "
+            f"in {time.perf_counter() - start_time:.2f}s."
+        )
+
+    def _offload(self, entry: _ResidentComponent) -> None:
+        if self.offload_to == "disk" and self.offload_dir is not None:
+            if entry.offload_file is None or not entry.offload_file.exists():
+                self.offload_dir.mkdir(parents=True, exist_ok=True)
+                entry.offload_file = self.offload_dir / (
+                    f"{entry.names[0].replace(':', '_').replace('.', '_')}_{id(entry.module):x}.pt"
+                )
+                # Parameters and all buffers, including non-persistent ones that
+                # a state_dict would drop (e.g. mel filterbanks).
+                tensors = {
+                    name: tensor.detach().cpu()
+                    for name, tensor in list(entry.module.named_parameters())
+                    + list(entry.module.named_buffers())
+                }
+                torch.save(tensors, entry.offload_file)
+            entry.module.to("meta")
+            entry.location = "disk"
+        else:
+            entry.module.to("cpu")
+            entry.location = "cpu"
+        entry.offloads += 1
+
+    @contextmanager
+    def acquire(self, model: Any, device: str):
+        """Keeps `model`'s conditioning components on `device` for the block."""
+        with self._lock:
+            entries = self._entries_for(model)
+            for entry in entries:
+                self._restore(entry, device)
+                entry.in_use += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                now = time.time()
+                for entry in entries:
+                    entry.in_use -= 1
+                    entry.last_used = now
+
+    def offload_idle(self, now: Optional[float] = None) -> int:
+        """Offloads components idle for `idle_sec`. Returns how many were moved."""
+        if not self.enabled or self.idle_sec <= 0:
+            return 0
+        now = now or time.time()
+        moved = 0
+        with self._lock:
+            for entry in self._components.values():
+                if (
+                    entry.location != "device"
+                    or entry.in_use
+                    or entry.unmovable
+                    or now - entry.last_used < self.idle_sec
+                ):
+                    continue
+                if self.offload_to == "cpu" and _module_device_type(entry.module) == "cpu":
+                    continue  # Already in host RAM; nothing to free.
+                try:
+                    self._offload(entry)
+                    moved += 1
+                    logger.info(
+                        f"Offloaded idle component {entry.names[0]} to {entry.location}."
+                    )
+                except Exception as e:
+                    entry.unmovable = True
+                    logger.warning(
+                        f"Could not offload component {entry.names[0]} (kept resident): {e}"
+                    )
+        if moved and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        return moved
+
+    def restore_all(self, device: str) -> None:
+        """Brings every offloaded component back, e.g. before a whole-model move."""
+        with self._lock:
+            for entry in self._components.values():
+                try:
+                    self._restore(entry, device)
+                except Exception as e:
+                    logger.error(f"Failed to restore component {entry.names[0]}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "idle_sec": self.idle_sec,
+                "offload_to": self.offload_to,
+                "components": {
+                    entry.names[0]: {
+                        "location": entry.location,
+                        "shared_by": entry.names,
+                        "idle_sec": round(time.time() - entry.last_used, 1),
+                        "offloads": entry.offloads,
+                        "restores": entry.restores,
+                        "unmovable": entry.unmovable,
+                    }
+                    for entry in self._components.values()
+                },
+            }
+
+
+def _module_device_type(module: nn.Module) -> Optional[str]:
+    for tensor in module.parameters():
+        return tensor.device.type
+    for tensor in module.buffers():
+        return tensor.device.type
+    return None
+
+
+# --- End File: component_residency.py ---
@@ -47,9 +47,55 @@ DEFAULT_CONFIG: Dict[str, Any] = {
         ),  # Path to the server log file.
         "log_file_max_size_mb": 10,  # Maximum size of a single log file before rotation.
         "log_file_backup_count": 5,  # Number of backup log files to keep.
+        "executor": {  # Thread pools for blocking work behind the async endpoints.
+            "inference_workers": 4,  # Concurrent generations (memory admission/spillover still apply).
+            "encoding_workers": 2,  # Concurrent audio encodes (wav/opus/mp3).
+            "interactive_workers": 2,  # Separate lane for interactive-priority generations.
+        },
+        "priority": {  # Chunk-level priority scheduling (interactive > default > bulk).
+            "enabled": True,
+            "slots": 2,  # Chunk generations running at once; the rest wait in priority order.
+            "aging_sec": 10.0,  # Each N seconds waited raises a waiting chunk one class.
+            "default_class": "default",  # Class for requests without an API key mapping.
+            "api_key_classes": {},  # X-API-Key -> highest class it may use, e.g. {"batch-key": "bulk"}
+        },
+        "fair_queueing": {  # Weighted fair queueing across API clients (cost = predicted synthesis seconds).
+            "enabled": True,
+            "client_header": "X-Client-ID",  # Client id header; falls back to a digest of X-API-Key.
+            "default_weight": 1.0,
+            "default_max_concurrency": 0,  # Requests in service per client (0 = unlimited).
+            "clients": {},  # e.g. {"crm": {"weight": 2.0, "max_concurrency": 2}}
+        },
+        "coalescing": {  # Single-flight: identical concurrent (non-streamed) requests share one generation.
+            "enabled": True,
+        },
+        "admission": {  # Load shedding before work queues behind the model.
+            "enabled": True,
+            "max_queued_audio_sec": 600.0,  # Predicted audio-seconds admitted but not finished; beyond it: 429.
+        },
+        "jobs": {  # Asynchronous long-form jobs (POST /jobs), persisted under paths.output/jobs.
+            "workers": 1,  # Jobs synthesized at once; each runs one chunk at a time.
+            "chunk_size": 200,  # Default sentence chunk size for job text.
+            "max_text_chars": 500000,  # Longest text a single job accepts.
+            "memory_retry_limit": 60,  # Waits for memory per chunk before the job fails.
+            "memory_retry_sec": 5.0,  # Delay between those waits.
+        },
+        "batch": {  # POST /tts/batch: many short texts in one call.
+            "max_items": 256,  # Items accepted per request.
+            "max_item_chars": 300,  # Longer items fail individually (use /tts or /jobs).
+            "max_batch_size": 8,  # Items decoded together in one batched T3 pass.
+        },
     },
     "model": {  # Added section for model source configuration
         "repo_id": "chatterbox-es-latam",  # UPDATED: Default to es-latam model
+        "resident_variants": [],  # Extra selectors kept loaded next to repo_id (same model class).
+        "share_components": True,  # Deduplicate identical components across variants by tensor hash.
+        "offline": {  # Load from a verified local snapshot before contacting the hub.
+            "enabled": True,
+            "require_local": False,  # Fail fast instead of downloading when the snapshot is missing/incomplete.
+            "revision": "main",  # Hub cache ref (or commit hash) to resolve.
+            "full_verify": False,  # Rehash every file on each load instead of size checks against the manifest.
+        },
     },
     "tts_engine": {
         "device": "auto",  # TTS processing device: 'auto', 'cuda', 'mps', or 'cpu'.
@@ -61,6 +107,49 @@ DEFAULT_CONFIG: Dict[str, Any] = {
             DEFAULT_REFERENCE_AUDIO_PATH
         ),  # Directory for reference audio files for cloning.
         "default_voice_id": "default_sample.wav",  # Default voice file to use if none is specified.
+        "idle_timeout_sec": 300,  # Offload model from VRAM after this many seconds idle (0 = disabled).
+        "predictive_wake": {  # Pre-wake the sleeping model ahead of recurring traffic.
+            "enabled": True,
+            "bin_minutes": 15,  # Width of each time-of-day histogram bin.
+            "lead_time_sec": 300,  # How far ahead of predicted traffic to wake the model.
+            "busy_threshold": 1.0,  # Expected arrivals per bin that marks a bin as busy.
+            "min_bin_arrivals": 3.0,  # Arrivals a bin needs in its history before it can be busy.
+            "half_life_days": 14.0,  # Decay half-life of the arrival histogram.
+            "history_file": str(
+                DEFAULT_LOGS_PATH / "traffic_history.json"
+            ),  # Where the histogram is persisted across restarts.
+        },
+        "memory_admission": {  # Gate requests on predicted peak memory.
+            "enabled": True,
+            "headroom_fraction": 0.1,  # Fraction of total device memory kept out of the budget.
+            "safety_factor": 1.2,  # Multiplier applied to every peak estimate.
+            "speech_tokens_per_char": 1.8,  # Expected speech tokens per input character.
+            "queue_timeout_sec": 30.0,  # Max wait for in-flight requests to free memory.
+            "force_chunking": True,  # Split oversized single-chunk requests instead of rejecting.
+        },
+        "component_residency": {  # Offload conditioning-only components when voices are cached.
+            "enabled": True,
+            "idle_sec": 300,  # Offload VoiceEncoder/S3 tokenizer/speaker encoder after this idle time.
+            "offload_to": "cpu",  # 'cpu' (host RAM) or 'disk' (model_cache/component_offload).
+            "voice_cache_entries": 64,  # Prepared conditionals kept per voice file (LRU).
+        },
+        "paged_kv_cache": {  # Block-based KV storage shared by concurrent T3 sequences.
+            "enabled": False,
+            "pool_mib": 1024,  # Fixed pool size per device; blocks = pool / (2 * layers * heads * block_size * head_dim * dtype).
+            "block_size": 16,  # Token positions per block.
+        },
+        "speculative_decoding": {  # Draft-and-verify T3 decoding (output distribution unchanged).
+            "enabled": False,
+            "draft_layers": 8,  # Draft = first N backbone layers of T3 (shares the target's weights).
+            "num_speculative_tokens": 4,  # Tokens proposed by the draft per verification pass (k).
+        },
+        "spillover": {  # Route overflow to secondary replicas when the primary is backed up.
+            "enabled": False,
+            "queue_wait_threshold_sec": 2.0,  # Spill when the primary's predicted wait exceeds this.
+            "primary_threads": 0,  # torch threads for a CPU primary (0 = torch default).
+            "primary_concurrency": 0,  # Requests the primary runs at once (0 = server.priority.slots, or inference_workers without the gate).
+            "replicas": [],  # e.g. [{"name": "cpu-overflow", "device": "cpu", "threads": 8, "concurrency": 1}]
+        },
     },
     "paths": {  # General configurable paths for the application.
         "model_cache": str(
@@ -82,6 +171,9 @@ DEFAULT_CONFIG: Dict[str, Any] = {
         "format": "wav",  # Output audio format (e.g., 'wav', 'mp3').
         "sample_rate": 24000,  # Sample rate of the output audio in Hz.
         "max_reference_duration_sec": 30,  # Maximum duration for reference audio files.
+        "max_reference_upload_mb": 10,  # Maximum size of reference audio uploaded inline (multipart endpoints).
+        "stream_by_default": False,  # Send audio chunk by chunk as it is synthesized (requests opt in with `stream`).
+        "stream_chunk_size": 120,  # Sentence chunk size used when streaming /v1/audio/speech.
         "save_to_disk": False,  # If true, save generated audio files to disk in outputs folder.
     },
     "ui_state": {  # Stores user interface preferences and last-used values.
@@ -110,7 +202,11 @@ DEFAULT_CONFIG: Dict[str, Any] = {
         "use_bf16_inference": True,  # Use bfloat16 autocast during inference (Ampere native).
         "use_nf4_quantization": False,  # Quantize model linear layers to NF4 4-bit via bitsandbytes.
         "nf4_min_features": 128,  # Minimum layer width to quantize (skip tiny layers).
-        "use_torch_compile": False,  # Apply torch.compile for JIT graph optimizations.
+        "use_torch_compile": False,  # Apply torch.compile for JIT graph optimizations (CUDA or CPU inductor).
+        "compile_length_buckets": [64, 96, 128, 192, 256, 384, 512],  # Prefill lengths compiled graphs are padded to.
+    },
+    "cpu_optimizations": {  # CPU-specific performance tuning (Xeon AMX / AVX-512 BF16 hosts)
+        "use_bf16_inference": "auto",  # bfloat16 autocast on CPU: 'auto' (native BF16 only), 'true' or 'false'.
     },
 }
 
@@ -935,6 +1031,21 @@ def get_gpu_use_torch_compile() -> bool:
     )
 
 
+# CPU Optimization Settings Accessors
+def get_cpu_bf16_inference_mode() -> str:
+    """Returns the CPU bfloat16 autocast mode: 'auto', 'true' or 'false'."""
+    mode = config_manager.get_string(
+        "cpu_optimizations.use_bf16_inference",
+        str(_get_default_from_structure("cpu_optimizations.use_bf16_inference")),
+    )
+    mode = mode.strip().lower()
+    if mode in ("true", "1", "yes", "on"):
+        return "true"
+    if mode in ("false", "0", "no", "off"):
+        return "false"
+    return "auto"
+
+
 def get_full_config_for_template() -> Dict[str, Any]:
     """
     Returns a deep copy of the current configuration, with Path objects
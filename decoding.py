@@ -0,0 +1,1031 @@
+# File: decoding.py
+# Request-scoped speech-token decoding for the Chatterbox T3 backbone.
+# Mirrors the sampling loop of ChatterboxTTS.generate, but keeps every piece of
+# per-request state (RNG, conditionals) local to the call instead of relying on
+# process-wide seeds or on the shared `model.conds` attribute.
+
+import bisect
+import copy
+import dataclasses
+import inspect
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+logger = logging.getLogger(__name__)
+
+# Defensive imports - helper locations differ between chatterbox releases
+try:
+    from chatterbox.tts import punc_norm
+except ImportError:
+    punc_norm = None
+
+try:
+    from chatterbox.models.s3tokenizer import SPEECH_VOCAB_SIZE
+except ImportError:
+    SPEECH_VOCAB_SIZE = 6561
+
+DEFAULT_MAX_NEW_TOKENS = 1000
+
+# Sampling defaults used by ChatterboxTTS.generate
+DEFAULT_MIN_P = 0.05
+DEFAULT_TOP_P = 1.0
+DEFAULT_REPETITION_PENALTY = 1.2
+
+
+class GenerationCancelled(Exception):
+    """Raised when a request's CancellationToken is triggered mid-generation."""
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation flag shared between a request handler and the
+    engine. The decoding loop checks it between decode steps and the server
+    checks it between chunks, so cancelled work stops at the next boundary.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+
+    def cancel(self, reason: str = "cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise GenerationCancelled(self.reason or "cancelled")
+
+
+class CompileCounters:
+    """
+    Tracks torch.compile activity observed around backbone forward calls:
+    graphs built, recompiles after the first graph, time spent in calls that
+    triggered a compile, and how often each prefix length bucket was used.
+    """
+
+    def __init__(self):
+        self.enabled: bool = False
+        self.graphs_compiled: int = 0
+        self.recompile_events: int = 0
+        self.compile_time_sec: float = 0.0
+        self.bucket_hits: Dict[int, int] = {}
+        self.unbucketed_prefills: int = 0
+
+    @staticmethod
+    def _unique_graphs() -> int:
+        try:
+            from torch._dynamo.utils import counters
+
+            return int(counters["stats"]["unique_graphs"])
+        except Exception:
+            return 0
+
+    def observe(self, fn, *args, **kwargs):
+        """Calls `fn`, attributing its wall time to compilation if graphs were built."""
+        if not self.enabled:
+            return fn(*args, **kwargs)
+        graphs_before = self._unique_graphs()
+        start_time = time.perf_counter()
+        result = fn(*args, **kwargs)
+        new_graphs = self._unique_graphs() - graphs_before
+        if new_graphs > 0:
+            if self.graphs_compiled > 0:
+                self.recompile_events += new_graphs
+            self.graphs_compiled += new_graphs
+            self.compile_time_sec += time.perf_counter() - start_time
+        return result
+
+    def get_stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "graphs_compiled": self.graphs_compiled,
+            "recompile_events": self.recompile_events,
+            "compile_time_sec": round(self.compile_time_sec, 3),
+            "bucket_hits": dict(sorted(self.bucket_hits.items())),
+            "unbucketed_prefills": self.unbucketed_prefills,
+        }
+
+
+# Module-level counters, enabled by the engine when the backbone is compiled.
+compile_counters = CompileCounters()
+
+
+class SpeculativeStats:
+    """
+    Acceptance metrics for speculative decoding: draft tokens proposed and
+    accepted, target (full model) forward passes, and tokens emitted.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.sequences: int = 0
+        self.proposed: int = 0
+        self.accepted: int = 0
+        self.target_forwards: int = 0
+        self.tokens_generated: int = 0
+
+    def get_stats(self) -> dict:
+        return {
+            "sequences": self.sequences,
+            "proposed": self.proposed,
+            "accepted": self.accepted,
+            "acceptance_rate": round(self.accepted / self.proposed, 4)
+            if self.proposed
+            else None,
+            "target_forwards": self.target_forwards,
+            "tokens_per_target_forward": round(
+                self.tokens_generated / self.target_forwards, 3
+            )
+            if self.target_forwards
+            else None,
+        }
+
+
+speculative_stats = SpeculativeStats()
+
+
+def supports_request_scoped_decoding(model) -> bool:
+    """
+    Checks whether the loaded model exposes the T3/S3Gen internals that the
+    request-scoped decoding loop relies on. Models that do not (e.g. Turbo)
+    must go through their own `generate` method instead.
+    """
+    t3 = getattr(model, "t3", None)
+    if t3 is None:
+        return False
+    required_t3 = (
+        "tfmr",
+        "hp",
+        "prepare_input_embeds",
+        "speech_emb",
+        "speech_pos_emb",
+        "speech_head",
+    )
+    if not all(hasattr(t3, attr) for attr in required_t3):
+        return False
+    return all(
+        hasattr(model, attr)
+        for attr in ("s3gen", "tokenizer", "prepare_conditionals", "sr")
+    )
+
+
+def make_generator(seed: int, device: str) -> torch.Generator:
+    """
+    Creates a torch.Generator owned by a single request.
+
+    A non-zero seed makes the request reproducible regardless of what other
+    requests are running; seed 0 draws fresh entropy. Falls back to a CPU
+    generator when the device does not support its own generator type.
+    """
+    try:
+        generator = torch.Generator(device=device)
+    except RuntimeError:
+        logger.debug(f"torch.Generator not supported on '{device}', using CPU.")
+        generator = torch.Generator(device="cpu")
+    if seed != 0:
+        generator.manual_seed(seed)
+    else:
+        generator.seed()
+    return generator
+
+
+def derive_seed(generator: torch.Generator) -> int:
+    """Draws a 31-bit integer seed from a request generator."""
+    return int(
+        torch.randint(
+            0, 2**31 - 1, (1,), generator=generator, device=generator.device
+        ).item()
+    )
+
+
+def with_exaggeration(conds, exaggeration: float, device):
+    """
+    Returns conditionals whose T3 emotion vector matches `exaggeration`.
+    The input object is never modified, so cached conditionals stay intact.
+    """
+    t3_cond = conds.t3
+    current = getattr(t3_cond, "emotion_adv", None)
+    if current is not None and float(current.view(-1)[0]) == float(exaggeration):
+        return conds
+    new_t3_cond = dataclasses.replace(
+        t3_cond, emotion_adv=exaggeration * torch.ones(1, 1, 1)
+    ).to(device=device)
+    return dataclasses.replace(conds, t3=new_t3_cond)
+
+
+def tokenize_text(model, text: str, cfg_weight: float) -> torch.Tensor:
+    """
+    Normalizes and tokenizes text exactly like ChatterboxTTS.generate, adding
+    start/stop text tokens and duplicating the row for classifier-free guidance.
+    """
+    if punc_norm is not None:
+        text = punc_norm(text)
+    text_tokens = model.tokenizer.text_to_tokens(text).to(model.device)
+    if cfg_weight > 0.0:
+        text_tokens = torch.cat([text_tokens, text_tokens], dim=0)
+    hp = model.t3.hp
+    text_tokens = F.pad(text_tokens, (1, 0), value=hp.start_text_token)
+    text_tokens = F.pad(text_tokens, (0, 1), value=hp.stop_text_token)
+    return text_tokens
+
+
+def process_logits(
+    logits: torch.Tensor,
+    generated_ids: torch.Tensor,
+    temperature: float,
+    min_p: float = DEFAULT_MIN_P,
+    top_p: float = DEFAULT_TOP_P,
+    repetition_penalty: float = DEFAULT_REPETITION_PENALTY,
+) -> torch.Tensor:
+    """
+    Applies repetition penalty, temperature, min-p and top-p filtering (in that
+    order, as in upstream T3.inference) to a (batch, vocab) logits tensor.
+    Filtered entries are set to -inf; at least one token always survives.
+    """
+    logits = logits.float()
+
+    if repetition_penalty != 1.0 and generated_ids.numel() > 0:
+        score = torch.gather(logits, 1, generated_ids)
+        score = torch.where(
+            score < 0, score * repetition_penalty, score / repetition_penalty
+        )
+        logits = logits.scatter(1, generated_ids, score)
+
+    if temperature > 0 and temperature != 1.0:
+        logits = logits / temperature
+
+    if min_p > 0.0:
+        probs = torch.softmax(logits, dim=-1)
+        top_probs = probs.max(dim=-1, keepdim=True).values
+        logits = logits.masked_fill(probs < min_p * top_probs, float("-inf"))
+
+    if top_p < 1.0:
+        sorted_logits, sorted_indices = torch.sort(logits, descending=False, dim=-1)
+        cumulative_probs = sorted_logits.softmax(dim=-1).cumsum(dim=-1)
+        sorted_to_remove = cumulative_probs <= (1 - top_p)
+        sorted_to_remove[..., -1:] = False
+        to_remove = sorted_to_remove.scatter(1, sorted_indices, sorted_to_remove)
+        logits = logits.masked_fill(to_remove, float("-inf"))
+
+    return logits
+
+
+def sample_from_logits(
+    logits: torch.Tensor, generator: torch.Generator, temperature: float
+) -> torch.Tensor:
+    """
+    Draws one token per row from processed logits using the request generator.
+    A temperature of 0 selects the argmax instead of sampling.
+    """
+    if temperature <= 0:
+        return logits.argmax(dim=-1, keepdim=True)
+    probs = torch.softmax(logits, dim=-1)
+    if probs.device != generator.device:
+        return torch.multinomial(
+            probs.to(generator.device), num_samples=1, generator=generator
+        ).to(probs.device)
+    return torch.multinomial(probs, num_samples=1, generator=generator)
+
+
+def guided_logits(step_logits: torch.Tensor, cfg_weight: float) -> torch.Tensor:
+    """Combines conditional/unconditional rows with classifier-free guidance."""
+    if step_logits.size(0) < 2:
+        return step_logits[0:1]
+    cond = step_logits[0:1]
+    uncond = step_logits[1:2]
+    cfg = torch.as_tensor(cfg_weight, device=cond.device, dtype=cond.dtype)
+    return cond + cfg * (cond - uncond)
+
+
+def _prepare_input_embeds(t3, t3_cond, text_tokens, speech_tokens, cfg_weight):
+    """Calls T3.prepare_input_embeds, passing cfg_weight only when supported."""
+    kwargs = {
+        "t3_cond": t3_cond,
+        "text_tokens": text_tokens,
+        "speech_tokens": speech_tokens,
+    }
+    if "cfg_weight" in inspect.signature(t3.prepare_input_embeds).parameters:
+        kwargs["cfg_weight"] = cfg_weight
+    embeds, _ = t3.prepare_input_embeds(**kwargs)
+    return embeds
+
+
+def pad_to_length_bucket(
+    inputs_embeds: torch.Tensor, length_buckets: Optional[Sequence[int]]
+):
+    """
+    Left-pads a prefix to the smallest bucket length that fits it so that a
+    compiled backbone sees a small, fixed set of prefill shapes.
+
+    Padding positions are masked out via the returned attention mask. Because
+    the backbone uses rotary (relative) position encoding, shifting the real
+    tokens right does not change their attention scores.
+
+    Returns:
+        (inputs_embeds, attention_mask) - the mask is None when no padding was applied.
+    """
+    if not length_buckets:
+        return inputs_embeds, None
+    rows, length, _ = inputs_embeds.shape
+    index = bisect.bisect_left(length_buckets, length)
+    if index >= len(length_buckets):
+        compile_counters.unbucketed_prefills += 1
+        return inputs_embeds, None
+    bucket = length_buckets[index]
+    compile_counters.bucket_hits[bucket] = compile_counters.bucket_hits.get(bucket, 0) + 1
+    pad = bucket - length
+    attention_mask = torch.ones(
+        (rows, bucket), dtype=torch.long, device=inputs_embeds.device
+    )
+    if pad == 0:
+        return inputs_embeds, attention_mask
+    attention_mask[:, :pad] = 0
+    inputs_embeds = F.pad(inputs_embeds, (0, 0, pad, 0))
+    return inputs_embeds, attention_mask
+
+
+def _forward_step(
+    t3,
+    inputs_embeds: torch.Tensor,
+    past_key_values,
+    attention_mask: Optional[torch.Tensor] = None,
+):
+    """Runs the transformer backbone and returns (last-position logits, cache)."""
+    kwargs = {
+        "inputs_embeds": inputs_embeds,
+        "past_key_values": past_key_values,
+        "use_cache": True,
+        "return_dict": True,
+    }
+    if attention_mask is not None:
+        kwargs["attention_mask"] = attention_mask
+    output = compile_counters.observe(t3.tfmr, **kwargs)
+    hidden = output.last_hidden_state[:, -1:, :]
+    logits = t3.speech_head(hidden)[:, -1, :]
+    return logits, output.past_key_values
+
+
+def _extend_attention_mask(attention_mask: Optional[torch.Tensor], new_tokens: int = 1):
+    """Appends `new_tokens` attended positions to a padding mask (no-op for None)."""
+    if attention_mask is None:
+        return None
+    extension = attention_mask.new_ones((attention_mask.size(0), new_tokens))
+    return torch.cat([attention_mask, extension], dim=1)
+
+
+def _speech_token_embed(t3, token: torch.Tensor, position: int, rows: int):
+    """Embeds a single speech token at `position`, replicated for each CFG row."""
+    embed = t3.speech_emb(token) + t3.speech_pos_emb.get_fixed_embedding(position)
+    return embed.expand(rows, -1, -1)
+
+
+def _speech_tokens_embed(t3, tokens: List[int], start_position: int, rows: int):
+    """Embeds consecutive speech tokens starting at `start_position`, for each CFG row."""
+    device = t3.speech_head.weight.device
+    token_ids = torch.tensor([tokens], dtype=torch.long, device=device)
+    positions = torch.arange(
+        start_position, start_position + len(tokens), device=device
+    ).unsqueeze(0)
+    embed = t3.speech_emb(token_ids) + t3.speech_pos_emb.get_fixed_embedding(positions)
+    return embed.expand(rows, -1, -1)
+
+
+def _backbone_logits(
+    tfmr,
+    speech_head,
+    inputs_embeds: torch.Tensor,
+    past_key_values,
+    attention_mask: Optional[torch.Tensor] = None,
+    last_n: int = 1,
+):
+    """Runs a backbone and returns (logits for the last `last_n` positions, cache)."""
+    kwargs = {
+        "inputs_embeds": inputs_embeds,
+        "past_key_values": past_key_values,
+        "use_cache": True,
+        "return_dict": True,
+    }
+    if attention_mask is not None:
+        kwargs["attention_mask"] = attention_mask
+    output = compile_counters.observe(tfmr, **kwargs)
+    logits = speech_head(output.last_hidden_state[:, -last_n:, :])
+    return logits, output.past_key_values
+
+
+def _crop_cache(past_key_values, length: int):
+    """Drops cached positions beyond `length` (rejected speculative tokens)."""
+    if hasattr(past_key_values, "crop"):
+        past_key_values.crop(length)
+        return past_key_values
+    return tuple(
+        (key[:, :, :length], value[:, :, :length]) for key, value in past_key_values
+    )
+
+
+def _release_cache(past_key_values) -> None:
+    """Returns a paged cache's blocks to its pool; no-op for other caches."""
+    release = getattr(past_key_values, "release", None)
+    if callable(release):
+        release()
+
+
+def build_layer_truncated_draft(tfmr, num_layers: int):
+    """
+    Returns a draft backbone that runs only the first `num_layers` decoder
+    layers of `tfmr` (followed by its final norm). The layers, embeddings and
+    norm are the target's own modules, so the draft adds no weights; it is an
+    early-exit view of the same network.
+    """
+    base = getattr(tfmr, "_orig_mod", tfmr)  # Unwrap torch.compile
+    layers = list(base.layers)
+    num_layers = max(1, min(num_layers, len(layers)))
+    draft = copy.copy(base)
+    draft._modules = dict(base._modules)
+    draft.layers = torch.nn.ModuleList(layers[:num_layers])
+    config = copy.copy(base.config)
+    config.num_hidden_layers = num_layers
+    if getattr(config, "layer_types", None):
+        config.layer_types = list(config.layer_types)[:num_layers]
+    draft.config = config
+    return draft
+
+
+def _sample_from_probs(probs: torch.Tensor, generator: torch.Generator) -> int:
+    return int(
+        torch.multinomial(probs.to(generator.device), num_samples=1, generator=generator).item()
+    )
+
+
+@torch.inference_mode()
+def decode_speech_tokens(
+    t3,
+    t3_cond,
+    text_tokens: torch.Tensor,
+    generator: torch.Generator,
+    temperature: float = 0.8,
+    cfg_weight: float = 0.5,
+    max_new_tokens: int = DEFAULT_MAX_NEW_TOKENS,
+    min_p: float = DEFAULT_MIN_P,
+    top_p: float = DEFAULT_TOP_P,
+    repetition_penalty: float = DEFAULT_REPETITION_PENALTY,
+    length_buckets: Optional[Sequence[int]] = None,
+    cancel_token: Optional[CancellationToken] = None,
+    kv_cache_factory: Optional[Callable[[], object]] = None,
+) -> torch.Tensor:
+    """
+    Autoregressively samples speech tokens from T3 for one request.
+
+    All randomness comes from `generator`, so concurrent requests never share
+    or perturb each other's RNG streams. When `length_buckets` is given (sorted
+    ascending), the prefill is left-padded to a bucket length for compiled graphs.
+    `cancel_token` is checked before every decode step; GenerationCancelled is
+    raised as soon as it is triggered. `kv_cache_factory` supplies the KV cache
+    (e.g. a paged cache); anything with `release()` is released on exit.
+
+    Returns:
+        1D LongTensor of generated speech tokens (stop token included if reached).
+    """
+    hp = t3.hp
+    device = text_tokens.device
+    rows = text_tokens.size(0)
+
+    initial_speech_tokens = torch.full(
+        (rows, 1), hp.start_speech_token, dtype=torch.long, device=device
+    )
+    embeds = _prepare_input_embeds(
+        t3, t3_cond, text_tokens, initial_speech_tokens, cfg_weight
+    )
+    rows = embeds.size(0)
+
+    # Upstream appends an extra BOS embedding after the conditioned prefix.
+    bos_token = torch.tensor([[hp.start_speech_token]], dtype=torch.long, device=device)
+    inputs_embeds = torch.cat(
+        [embeds, _speech_token_embed(t3, bos_token, 0, rows)], dim=1
+    )
+
+    inputs_embeds, attention_mask = pad_to_length_bucket(inputs_embeds, length_buckets)
+
+    generated_ids = bos_token.clone()
+    past = kv_cache_factory() if kv_cache_factory is not None else None
+    try:
+        step_logits, past = _forward_step(t3, inputs_embeds, past, attention_mask)
+
+        for step in range(max_new_tokens):
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            logits = guided_logits(step_logits, cfg_weight)
+            logits = process_logits(
+                logits,
+                generated_ids,
+                temperature=temperature,
+                min_p=min_p,
+                top_p=top_p,
+                repetition_penalty=repetition_penalty,
+            )
+            next_token = sample_from_logits(logits, generator, temperature)
+            generated_ids = torch.cat([generated_ids, next_token], dim=1)
+            if int(next_token.item()) == hp.stop_speech_token:
+                break
+            attention_mask = _extend_attention_mask(attention_mask)
+            step_logits, past = _forward_step(
+                t3,
+                _speech_token_embed(t3, next_token, step + 1, rows),
+                past,
+                attention_mask,
+            )
+    finally:
+        _release_cache(past)
+
+    return generated_ids[0, 1:]
+
+
+@torch.inference_mode()
+def decode_speech_token_candidates(
+    t3,
+    t3_cond,
+    text_tokens: torch.Tensor,
+    generators: Sequence[torch.Generator],
+    temperature: float = 0.8,
+    cfg_weight: float = 0.5,
+    max_new_tokens: int = DEFAULT_MAX_NEW_TOKENS,
+    min_p: float = DEFAULT_MIN_P,
+    top_p: float = DEFAULT_TOP_P,
+    repetition_penalty: float = DEFAULT_REPETITION_PENALTY,
+    length_buckets: Optional[Sequence[int]] = None,
+    cancel_token: Optional[CancellationToken] = None,
+    kv_cache_factory: Optional[Callable[[], object]] = None,
+) -> List[torch.Tensor]:
+    """
+    Samples one speech-token sequence per generator in a single batched pass.
+
+    The CFG rows of the prefix are repeated per candidate, so each decode step
+    is one backbone forward for all candidates. Candidate i draws only from
+    `generators[i]`, so it matches `decode_speech_tokens` seeded the same way
+    (up to batched-kernel numerics). Finished candidates feed their stop token
+    (ignored) until every candidate has stopped.
+
+    Returns:
+        One 1D LongTensor per candidate (stop token included if reached).
+    """
+    hp = t3.hp
+    device = text_tokens.device
+    num_candidates = len(generators)
+    rows = text_tokens.size(0)
+
+    initial_speech_tokens = torch.full(
+        (rows, 1), hp.start_speech_token, dtype=torch.long, device=device
+    )
+    embeds = _prepare_input_embeds(
+        t3, t3_cond, text_tokens, initial_speech_tokens, cfg_weight
+    )
+    rows = embeds.size(0)
+
+    bos_token = torch.tensor([[hp.start_speech_token]], dtype=torch.long, device=device)
+    prefix = torch.cat([embeds, _speech_token_embed(t3, bos_token, 0, rows)], dim=1)
+    # Batch layout: [cond_0, uncond_0, cond_1, uncond_1, ...]
+    inputs_embeds = prefix.repeat(num_candidates, 1, 1)
+    inputs_embeds, attention_mask = pad_to_length_bucket(inputs_embeds, length_buckets)
+
+    generated_ids = bos_token.expand(num_candidates, 1).clone()
+    lengths: List[Optional[int]] = [None] * num_candidates
+    past = kv_cache_factory() if kv_cache_factory is not None else None
+    try:
+        step_logits, past = _forward_step(t3, inputs_embeds, past, attention_mask)
+
+        for step in range(max_new_tokens):
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            grouped = step_logits.view(num_candidates, rows, -1)
+            logits = grouped[:, 0]
+            if rows >= 2:
+                cfg = torch.as_tensor(cfg_weight, device=logits.device, dtype=logits.dtype)
+                logits = logits + cfg * (logits - grouped[:, 1])
+            logits = process_logits(
+                logits,
+                generated_ids,
+                temperature=temperature,
+                min_p=min_p,
+                top_p=top_p,
+                repetition_penalty=repetition_penalty,
+            )
+            next_tokens = torch.full(
+                (num_candidates, 1), hp.stop_speech_token, dtype=torch.long, device=device
+            )
+            for index, generator in enumerate(generators):
+                if lengths[index] is None:
+                    next_tokens[index] = sample_from_logits(
+                        logits[index : index + 1], generator, temperature
+                    )[0]
+            generated_ids = torch.cat([generated_ids, next_tokens], dim=1)
+            for index, token in enumerate(next_tokens.view(-1).tolist()):
+                if lengths[index] is None and token == hp.stop_speech_token:
+                    lengths[index] = generated_ids.size(1)
+            if all(length is not None for length in lengths):
+                break
+            attention_mask = _extend_attention_mask(attention_mask)
+            token_embeds = t3.speech_emb(next_tokens) + t3.speech_pos_emb.get_fixed_embedding(
+                step + 1
+            )
+            step_logits, past = _forward_step(
+                t3, token_embeds.repeat_interleave(rows, dim=0), past, attention_mask
+            )
+    finally:
+        _release_cache(past)
+
+    return [
+        generated_ids[index, 1 : lengths[index] or generated_ids.size(1)]
+        for index in range(num_candidates)
+    ]
+
+
+def _left_pad_prefixes(
+    prefixes: Sequence[torch.Tensor], length_buckets: Optional[Sequence[int]]
+):
+    """
+    Stacks per-item prefixes of different lengths into one batch, left-padded
+    to the longest (then to a length bucket, when given). As in
+    `pad_to_length_bucket`, padding is masked and rotary positions make the
+    shift harmless.
+
+    Returns:
+        (inputs_embeds, attention_mask) - the mask is None when nothing was padded.
+    """
+    length = max(prefix.size(1) for prefix in prefixes)
+    padded = [F.pad(prefix, (0, 0, length - prefix.size(1), 0)) for prefix in prefixes]
+    inputs_embeds = torch.cat(padded, dim=0)
+    attention_mask = None
+    if any(prefix.size(1) != length for prefix in prefixes):
+        attention_mask = torch.cat(
+            [
+                F.pad(
+                    torch.ones(
+                        (prefix.size(0), prefix.size(1)),
+                        dtype=torch.long,
+                        device=inputs_embeds.device,
+                    ),
+                    (length - prefix.size(1), 0),
+                )
+                for prefix in prefixes
+            ],
+            dim=0,
+        )
+    inputs_embeds, bucket_mask = pad_to_length_bucket(inputs_embeds, length_buckets)
+    if bucket_mask is not None and attention_mask is not None:
+        bucket_mask[:, -length:] = attention_mask
+    return inputs_embeds, bucket_mask if bucket_mask is not None else attention_mask
+
+
+@torch.inference_mode()
+def decode_speech_token_batch(
+    t3,
+    t3_conds: Sequence,
+    text_tokens: Sequence[torch.Tensor],
+    generators: Sequence[torch.Generator],
+    temperatures: Sequence[float],
+    cfg_weights: Sequence[float],
+    max_new_tokens: int = DEFAULT_MAX_NEW_TOKENS,
+    min_p: float = DEFAULT_MIN_P,
+    top_p: float = DEFAULT_TOP_P,
+    repetition_penalty: float = DEFAULT_REPETITION_PENALTY,
+    length_buckets: Optional[Sequence[int]] = None,
+    cancel_token: Optional[CancellationToken] = None,
+    kv_cache_factory: Optional[Callable[[], object]] = None,
+) -> List[torch.Tensor]:
+    """
+    Samples speech tokens for several independent prompts in one batched pass.
+
+    Each item has its own conditionals, text, generator, temperature and CFG
+    weight; all items must have the same number of CFG rows (cfg_weight > 0
+    or not). Prefixes are left-padded to a common length, so every decode
+    step is one backbone forward for the whole batch. Item i draws only from
+    `generators[i]`. Finished items feed their stop token (ignored) until
+    every item has stopped.
+
+    Returns:
+        One 1D LongTensor per item (stop token included if reached).
+    """
+    hp = t3.hp
+    device = text_tokens[0].device
+    num_items = len(text_tokens)
+
+    bos_token = torch.tensor([[hp.start_speech_token]], dtype=torch.long, device=device)
+    prefixes = []
+    for t3_cond, item_tokens, cfg_weight in zip(t3_conds, text_tokens, cfg_weights):
+        initial_speech_tokens = torch.full(
+            (item_tokens.size(0), 1), hp.start_speech_token, dtype=torch.long, device=device
+        )
+        embeds = _prepare_input_embeds(
+            t3, t3_cond, item_tokens, initial_speech_tokens, cfg_weight
+        )
+        prefixes.append(
+            torch.cat([embeds, _speech_token_embed(t3, bos_token, 0, embeds.size(0))], dim=1)
+        )
+    rows = prefixes[0].size(0)
+    if any(prefix.size(0) != rows for prefix in prefixes):
+        raise ValueError("Batched items must share the same number of CFG rows.")
+    # Batch layout: [cond_0, uncond_0, cond_1, uncond_1, ...]
+    inputs_embeds, attention_mask = _left_pad_prefixes(prefixes, length_buckets)
+
+    generated_ids = bos_token.expand(num_items, 1).clone()
+    lengths: List[Optional[int]] = [None] * num_items
+    past = kv_cache_factory() if kv_cache_factory is not None else None
+    try:
+        step_logits, past = _forward_step(t3, inputs_embeds, past, attention_mask)
+        cfg = torch.tensor(cfg_weights, device=step_logits.device, dtype=step_logits.dtype)
+
+        for step in range(max_new_tokens):
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            grouped = step_logits.view(num_items, rows, -1)
+            logits = grouped[:, 0]
+            if rows >= 2:
+                logits = logits + cfg.unsqueeze(1) * (logits - grouped[:, 1])
+            next_tokens = torch.full(
+                (num_items, 1), hp.stop_speech_token, dtype=torch.long, device=device
+            )
+            for index, generator in enumerate(generators):
+                if lengths[index] is not None:
+                    continue
+                item_logits = process_logits(
+                    logits[index : index + 1],
+                    generated_ids[index : index + 1],
+                    temperature=temperatures[index],
+                    min_p=min_p,
+                    top_p=top_p,
+                    repetition_penalty=repetition_penalty,
+                )
+                next_tokens[index] = sample_from_logits(
+                    item_logits, generator, temperatures[index]
+                )[0]
+            generated_ids = torch.cat([generated_ids, next_tokens], dim=1)
+            for index, token in enumerate(next_tokens.view(-1).tolist()):
+                if lengths[index] is None and token == hp.stop_speech_token:
+                    lengths[index] = generated_ids.size(1)
+            if all(length is not None for length in lengths):
+                break
+            attention_mask = _extend_attention_mask(attention_mask)
+            token_embeds = t3.speech_emb(next_tokens) + t3.speech_pos_emb.get_fixed_embedding(
+                step + 1
+            )
+            step_logits, past = _forward_step(
+                t3, token_embeds.repeat_interleave(rows, dim=0), past, attention_mask
+            )
+    finally:
+        _release_cache(past)
+
+    return [
+        generated_ids[index, 1 : lengths[index] or generated_ids.size(1)]
+        for index in range(num_items)
+    ]
+
+
+@torch.inference_mode()
+def speculative_decode_speech_tokens(
+    t3,
+    draft_tfmr,
+    t3_cond,
+    text_tokens: torch.Tensor,
+    generator: torch.Generator,
+    temperature: float = 0.8,
+    cfg_weight: float = 0.5,
+    max_new_tokens: int = DEFAULT_MAX_NEW_TOKENS,
+    min_p: float = DEFAULT_MIN_P,
+    top_p: float = DEFAULT_TOP_P,
+    repetition_penalty: float = DEFAULT_REPETITION_PENALTY,
+    num_speculative_tokens: int = 4,
+    length_buckets: Optional[Sequence[int]] = None,
+    cancel_token: Optional[CancellationToken] = None,
+    kv_cache_factory: Optional[Callable[[], object]] = None,
+) -> torch.Tensor:
+    """
+    Speculative variant of `decode_speech_tokens`.
+
+    Each round the draft backbone proposes up to `num_speculative_tokens`
+    tokens, and the full backbone scores all of them in a single forward pass.
+    Proposal i is accepted with probability min(1, p_i(x) / q_i(x)). On the
+    first rejection a replacement is drawn from the residual max(p_i - q_i, 0);
+    if every proposal is accepted, one bonus token is drawn from p. p and q
+    are built with the same CFG and logit processing as the standard loop, so
+    the output follows the full model's sampling distribution exactly. With
+    temperature 0 a proposal is accepted iff it matches the full model's argmax.
+
+    Both KV caches hold every generated token except the latest. After each
+    round they are cropped back to the accepted prefix. `kv_cache_factory`
+    supplies the target's cache; the draft uses a regular dynamic cache.
+
+    Returns:
+        1D LongTensor of generated speech tokens (stop token included if reached).
+    """
+    hp = t3.hp
+    device = text_tokens.device
+    rows = text_tokens.size(0)
+
+    initial_speech_tokens = torch.full(
+        (rows, 1), hp.start_speech_token, dtype=torch.long, device=device
+    )
+    embeds = _prepare_input_embeds(
+        t3, t3_cond, text_tokens, initial_speech_tokens, cfg_weight
+    )
+
+    target_embeds, prefix_mask = pad_to_length_bucket(embeds, length_buckets)
+    target_past = kv_cache_factory() if kv_cache_factory is not None else None
+    try:
+        return _speculative_rounds(
+            t3,
+            draft_tfmr,
+            embeds,
+            target_embeds,
+            prefix_mask,
+            target_past,
+            generator,
+            temperature=temperature,
+            cfg_weight=cfg_weight,
+            max_new_tokens=max_new_tokens,
+            min_p=min_p,
+            top_p=top_p,
+            repetition_penalty=repetition_penalty,
+            num_speculative_tokens=num_speculative_tokens,
+            cancel_token=cancel_token,
+        )
+    finally:
+        _release_cache(target_past)
+
+
+def _speculative_rounds(
+    t3,
+    draft_tfmr,
+    embeds: torch.Tensor,
+    target_embeds: torch.Tensor,
+    prefix_mask: Optional[torch.Tensor],
+    target_past,
+    generator: torch.Generator,
+    temperature: float,
+    cfg_weight: float,
+    max_new_tokens: int,
+    min_p: float,
+    top_p: float,
+    repetition_penalty: float,
+    num_speculative_tokens: int,
+    cancel_token: Optional[CancellationToken],
+) -> torch.Tensor:
+    """Draft/verify loop of `speculative_decode_speech_tokens` after prefix setup."""
+    hp = t3.hp
+    device = embeds.device
+    rows = embeds.size(0)
+    stop_token = hp.stop_speech_token
+
+    _, target_past = _backbone_logits(
+        t3.tfmr, t3.speech_head, target_embeds, target_past, prefix_mask
+    )
+    _, draft_past = _backbone_logits(draft_tfmr, t3.speech_head, embeds, None)
+    target_base, draft_base = target_embeds.size(1), embeds.size(1)
+
+    # Upstream appends an extra BOS after the conditioned prefix; it is the
+    # first "latest token" not yet in either cache.
+    generated = [hp.start_speech_token]
+    target_fed = draft_fed = 0  # Generated tokens already in each cache
+    k = max(1, num_speculative_tokens)
+    speculative_stats.sequences += 1
+
+    def processed(step_logits: torch.Tensor, history: List[int]) -> torch.Tensor:
+        history_ids = torch.tensor([history], dtype=torch.long, device=device)
+        return process_logits(
+            guided_logits(step_logits, cfg_weight),
+            history_ids,
+            temperature=temperature,
+            min_p=min_p,
+            top_p=top_p,
+            repetition_penalty=repetition_penalty,
+        )
+
+    while generated[-1] != stop_token and len(generated) - 1 < max_new_tokens:
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+
+        # Draft: catch up on tokens it has not seen, then propose.
+        budget = min(k, max_new_tokens - (len(generated) - 1))
+        draft_logits, draft_past = _backbone_logits(
+            draft_tfmr,
+            t3.speech_head,
+            _speech_tokens_embed(t3, generated[draft_fed:], draft_fed, rows),
+            draft_past,
+        )
+        draft_fed = len(generated)
+        proposals: List[int] = []
+        draft_probs: List[torch.Tensor] = []
+        for i in range(budget):
+            q_logits = processed(draft_logits[:, -1, :], generated + proposals)
+            token = int(sample_from_logits(q_logits, generator, temperature).item())
+            proposals.append(token)
+            draft_probs.append(torch.softmax(q_logits, dim=-1)[0])
+            if token == stop_token or i == budget - 1:
+                break
+            draft_logits, draft_past = _backbone_logits(
+                draft_tfmr,
+                t3.speech_head,
+                _speech_tokens_embed(t3, [token], draft_fed, rows),
+                draft_past,
+            )
+            draft_fed += 1
+
+        # Target: score the pending token(s) and every proposal in one pass.
+        verify_tokens = generated[target_fed:] + proposals
+        attention_mask = None
+        if prefix_mask is not None:
+            attention_mask = torch.cat(
+                [prefix_mask, prefix_mask.new_ones((rows, target_fed + len(verify_tokens)))],
+                dim=1,
+            )
+        target_logits, target_past = _backbone_logits(
+            t3.tfmr,
+            t3.speech_head,
+            _speech_tokens_embed(t3, verify_tokens, target_fed, rows),
+            target_past,
+            attention_mask,
+            last_n=len(proposals) + 1,
+        )
+        # target_logits[:, i] scores proposal i; the last position is the bonus.
+
+        accepted = 0
+        next_token: Optional[int] = None
+        for i, token in enumerate(proposals):
+            p_logits = processed(target_logits[:, i, :], generated + proposals[:i])
+            if temperature <= 0:
+                target_token = int(p_logits.argmax(dim=-1).item())
+                if target_token == token:
+                    accepted += 1
+                    continue
+                next_token = target_token
+                break
+            p = torch.softmax(p_logits, dim=-1)[0]
+            q = draft_probs[i]
+            u = torch.rand(1, generator=generator, device=generator.device).item()
+            if u * float(q[token]) < float(p[token]):
+                accepted += 1
+                continue
+            residual = torch.clamp(p - q, min=0.0)
+            total = float(residual.sum())
+            next_token = _sample_from_probs(residual / total if total > 0 else p, generator)
+            break
+
+        generated.extend(proposals[:accepted])
+        if (
+            next_token is None
+            and generated[-1] != stop_token
+            and len(generated) - 1 < max_new_tokens
+        ):
+            bonus_logits = processed(target_logits[:, len(proposals), :], generated)
+            next_token = int(sample_from_logits(bonus_logits, generator, temperature).item())
+        if next_token is not None:
+            generated.append(next_token)
+
+        speculative_stats.proposed += len(proposals)
+        speculative_stats.accepted += accepted
+        speculative_stats.target_forwards += 1
+        speculative_stats.tokens_generated += accepted + (next_token is not None)
+
+        # Keep every generated token except the latest in both caches.
+        target_fed = len(generated) - 1
+        target_past = _crop_cache(target_past, target_base + target_fed)
+        draft_fed = min(draft_fed, len(generated) - 1)
+        draft_past = _crop_cache(draft_past, draft_base + draft_fed)
+
+    return torch.tensor(generated[1:], dtype=torch.long, device=device)
+
+
+@torch.inference_mode()
+def tokens_to_wav(model, speech_tokens: torch.Tensor, ref_dict: dict) -> np.ndarray:
+    """
+    Vocodes speech tokens with S3Gen and applies the model's watermark.
+
+    Returns:
+        Float32 NumPy array of shape (1, samples) at `model.sr`.
+    """
+    speech_tokens = speech_tokens[speech_tokens < SPEECH_VOCAB_SIZE].to(model.device)
+    if speech_tokens.numel() == 0:
+        raise ValueError("T3 produced no valid speech tokens for this text.")
+
+    output = model.s3gen.inference(speech_tokens=speech_tokens, ref_dict=ref_dict)
+    wav = output[0] if isinstance(output, tuple) else output
+    wav = wav.squeeze(0).detach().float().cpu().numpy()
+
+    watermarker = getattr(model, "watermarker", None)
+    if watermarker is not None:
+        wav = watermarker.apply_watermark(wav, sample_rate=model.sr)
+    return np.asarray(wav, dtype=np.float32)[np.newaxis, :]
+
+
+# --- End File: decoding.py ---
@@ -2,17 +2,42 @@
 # Core TTS model loading and speech generation logic.
 
 import gc
+import hashlib
+import io
+import os
 import logging
 import random
 import inspect
 import threading
 import time
+from contextlib import contextmanager, nullcontext
 import numpy as np
 import torch
 import torch.nn as nn
-from typing import Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
 from pathlib import Path
 
+import candidate_scoring
+import decoding
+from decoding import CancellationToken, GenerationCancelled
+from component_residency import ComponentResidency, VoiceConditionalsCache
+from model_sharing import ComponentShareRegistry
+from model_resolver import (
+    CHATTERBOX_OPTIONAL_FILES,
+    CHATTERBOX_REQUIRED_FILES,
+    SnapshotIntegrityError,
+    SnapshotVerifier,
+    resolve_local_snapshot,
+)
+from paged_kv import KVBlockPool, KVCachePoolExhausted, make_cache_factory
+from spillover import ModelReplica, SpilloverScheduler
+from memory_admission import (
+    MemoryAdmissionController,
+    MemoryAdmissionError,
+    MemoryEstimator,
+    get_available_memory_bytes,
+)
+
 from chatterbox.tts import ChatterboxTTS  # Main TTS engine class
 from chatterbox.models.s3gen.const import (
     S3GEN_SR,
@@ -44,6 +69,8 @@ from config import (
     get_gpu_use_bf16_inference,
     get_gpu_use_nf4_quantization,
     get_gpu_use_torch_compile,
+    get_model_cache_path,
+    get_cpu_bf16_inference_mode,
 )
 
 logger = logging.getLogger(__name__)
@@ -81,12 +108,83 @@ def _apply_cuda_optimizations():
         logger.info("Enabled cuDNN benchmark mode for convolution auto-tuning.")
 
 
+def _cpu_bf16_capabilities() -> dict:
+    """
+    Detects CPU bfloat16 support.
+
+    `native` is True when the CPU has AMX-BF16 or AVX512-BF16 instructions, where
+    bf16 matmuls are substantially faster than fp32. `supported` is True when
+    oneDNN can run bf16 kernels at all (possibly emulated via AVX-512, slower).
+    """
+    supported = False
+    try:
+        if torch.backends.mkldnn.is_available():
+            is_supported_fn = getattr(torch.ops.mkldnn, "_is_mkldnn_bf16_supported", None)
+            supported = bool(is_supported_fn()) if is_supported_fn is not None else True
+    except Exception as e:
+        logger.debug(f"oneDNN bf16 capability check failed: {e}")
+
+    cpu_flags = set()
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    cpu_flags = set(line.split(":", 1)[1].split())
+                    break
+    except OSError:
+        pass  # Non-Linux host: no flag information, rely on oneDNN only.
+
+    native_flags = sorted(cpu_flags & {"amx_bf16", "avx512_bf16"})
+    return {
+        "supported": supported,
+        "native": supported and bool(native_flags),
+        "flags": native_flags,
+    }
+
+
+def _resolve_bf16_autocast_device(device: str) -> Optional[str]:
+    """
+    Returns the autocast device type ('cuda' or 'cpu') for bf16 inference on
+    `device`, or None when bf16 autocast should not be used.
+    """
+    if device == "cuda":
+        return "cuda" if get_gpu_use_bf16_inference() else None
+    if device != "cpu":
+        return None
+
+    mode = get_cpu_bf16_inference_mode()
+    if mode == "false":
+        return None
+    caps = _cpu_bf16_capabilities()
+    if mode == "auto":
+        if caps["native"]:
+            logger.info(
+                f"CPU has native BF16 ({', '.join(caps['flags'])}); enabling CPU bf16 autocast."
+            )
+            return "cpu"
+        logger.info("CPU lacks native BF16 instructions; keeping fp32 inference.")
+        return None
+    # mode == "true"
+    if not caps["supported"]:
+        logger.warning(
+            "CPU bf16 inference requested but oneDNN bf16 kernels are unavailable. Using fp32."
+        )
+        return None
+    if not caps["native"]:
+        logger.warning(
+            "CPU bf16 inference forced on a CPU without AMX/AVX512-BF16; it may be slower than fp32."
+        )
+    return "cpu"
+
+
 def _quantize_model_nf4(model):
     """
     Replaces nn.Linear layers in the model with bitsandbytes Linear4bit (NF4)
     to reduce VRAM usage by ~4x while preserving quality.
 
-    Only quantizes layers that are large enough to benefit.
+    Only quantizes layers that are large enough to benefit. Layers that are
+    already Linear4bit (components shared with a quantized variant) are left
+    alone, so calling this on models that share modules is safe.
     """
     if not BNB_AVAILABLE:
         logger.warning(
@@ -127,7 +225,9 @@ def _quantize_model_nf4(model):
             visited_modules.add(module_id)
 
             for child_name, child in list(module.named_children()):
-                if not isinstance(child, nn.Linear):
+                # Linear4bit subclasses nn.Linear; re-wrapping would pack
+                # already-packed weights.
+                if not isinstance(child, nn.Linear) or isinstance(child, bnb.nn.Linear4bit):
                     continue
                 if child.in_features < min_features or child.out_features < min_features:
                     continue
@@ -155,6 +255,66 @@ def _quantize_model_nf4(model):
     logger.info(f"NF4 quantization applied to {quantized_count} linear layers.")
     return quantized_count
 
+# Name of the portable torch.compile artifact bundle inside the compile cache dir
+COMPILE_ARTIFACTS_FILENAME = "compile_artifacts.bin"
+
+
+def _configure_compile_cache(cache_dir: Path) -> None:
+    """
+    Points TorchInductor's on-disk caches at `cache_dir` and preloads any
+    artifact bundle saved by a previous process, so restarts reuse compiled
+    graphs instead of re-tracing. Explicit TORCHINDUCTOR_* env vars win.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(cache_dir / "inductor"))
+    os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+    os.environ.setdefault("TORCHINDUCTOR_AUTOGRAD_CACHE", "1")
+    try:
+        import torch._inductor.config as inductor_config
+
+        inductor_config.fx_graph_cache = True
+    except Exception as e:
+        logger.debug(f"Could not enable inductor FX graph cache: {e}")
+
+    artifacts_path = cache_dir / COMPILE_ARTIFACTS_FILENAME
+    load_artifacts = getattr(torch.compiler, "load_cache_artifacts", None)
+    if artifacts_path.is_file() and load_artifacts is not None:
+        try:
+            load_artifacts(artifacts_path.read_bytes())
+            logger.info(f"Loaded torch.compile cache artifacts from {artifacts_path}.")
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable compile cache {artifacts_path}: {e}")
+    logger.info(f"torch.compile cache directory: {cache_dir}")
+
+
+def _save_compile_artifacts() -> None:
+    """Persists compiled graphs once new ones have been built since the last save."""
+    global _compile_graphs_saved
+    if _compile_cache_dir is None:
+        return
+    graphs_compiled = decoding.compile_counters.graphs_compiled
+    if graphs_compiled <= _compile_graphs_saved:
+        return
+    save_artifacts = getattr(torch.compiler, "save_cache_artifacts", None)
+    _compile_graphs_saved = graphs_compiled
+    if save_artifacts is None:
+        return  # Older PyTorch: the inductor FX graph cache on disk still applies.
+    try:
+        result = save_artifacts()
+        if not result:
+            return
+        artifact_bytes = result[0]
+        artifacts_path = _compile_cache_dir / COMPILE_ARTIFACTS_FILENAME
+        tmp_path = artifacts_path.with_suffix(".tmp")
+        tmp_path.write_bytes(artifact_bytes)
+        os.replace(tmp_path, artifacts_path)
+        logger.info(
+            f"Saved torch.compile cache artifacts ({len(artifact_bytes)} bytes) to {artifacts_path}."
+        )
+    except Exception as e:
+        logger.warning(f"Could not save torch.compile cache artifacts: {e}")
+
+
 # Model selector whitelist - maps config values to model types
 MODEL_SELECTOR_MAP = {
     # Original model selectors
@@ -190,6 +350,41 @@ model_device: Optional[str] = (
     None  # Stores the resolved device string ('cuda' or 'cpu')
 )
 _use_bf16_inference: bool = False  # Cached BF16 inference flag, set during model loading
+_bf16_autocast_device: Optional[str] = None  # Autocast device type for BF16 ('cuda' or 'cpu')
+_request_scoped_decoding: bool = False  # True when synthesis uses decoding.py instead of model.generate
+
+# Memory-aware admission (configured after model load)
+memory_estimator: Optional[MemoryEstimator] = None
+memory_controller: Optional[MemoryAdmissionController] = None
+
+# torch.compile state
+_torch_compile_active: bool = False
+_compile_length_buckets: Optional[List[int]] = None  # Sorted prefill lengths for compiled graphs
+_compile_cache_dir: Optional[Path] = None
+_compile_graphs_saved: int = 0  # Graph count at the last artifact save
+
+# Resident model variants (primary included), keyed by normalized selector
+variant_models: Dict[str, Any] = {}
+component_registry = ComponentShareRegistry()
+
+# Per-voice conditionals and idle offloading of conditioning-only components
+voice_conditionals_cache = VoiceConditionalsCache()
+component_residency = ComponentResidency()
+
+# Paged KV cache pools shared by all concurrent T3 sequences, one per device
+# (the primary's and any spillover replica's); None when paging is disabled.
+kv_block_pools: Optional[Dict[str, KVBlockPool]] = None
+_kv_block_pools_lock = threading.Lock()
+paged_kv_fallbacks: int = 0  # Requests that fell back to a dynamic cache (pool full)
+
+# Speculative decoding drafts, keyed by id(model.t3)
+_speculative_drafts: Dict[int, Any] = {}
+
+# Spillover replicas (configured after model load when enabled)
+spillover_scheduler: Optional[SpilloverScheduler] = None
+# Chunk gate in front of generate() (server.priority), set by the server. The
+# primary gets its slots as lanes, and each spillover lane adds one slot.
+spillover_gate: Optional[Any] = None
 
 # Track which model type is loaded
 loaded_model_type: Optional[str] = None  # "original", "turbo", or "custom"
@@ -201,11 +396,17 @@ _model_lock: threading.RLock = threading.RLock()
 _model_on_cpu: bool = False  # True when model has been offloaded to CPU to free VRAM
 last_request_time: float = 0.0  # Epoch seconds of last TTS generate() call
 
+# Per-request RNG isolation
+_conditionals_lock: threading.Lock = threading.Lock()  # Guards model.conds mutation
+_global_rng_lock: threading.Lock = threading.Lock()  # Guards sections that use torch's global RNG
+cancelled_generations: int = 0  # Generations stopped early by a CancellationToken
+
 
 def set_seed(seed_value: int):
     """
-    Sets the seed for torch, random, and numpy for reproducibility.
-    This is called if a non-zero seed is provided for generation.
+    Sets the seed for torch, random, and numpy process-wide.
+    Not used on the request path (see `_global_rng_scope`); kept for scripts
+    that want whole-process reproducibility.
     """
     torch.manual_seed(seed_value)
     if torch.cuda.is_available():
@@ -218,6 +419,25 @@ def set_seed(seed_value: int):
     logger.info(f"Global seed set to: {seed_value}")
 
 
+@contextmanager
+def _global_rng_scope(generator: torch.Generator):
+    """
+    Runs a block that can only draw from torch's global RNG (library code we do
+    not control, such as the S3Gen vocoder or Turbo's generate) with a seed
+    derived from the request generator. The global RNG state is restored on
+    exit and the section is serialized so concurrent requests cannot interleave.
+    """
+    derived_seed = decoding.derive_seed(generator)
+    cuda_devices = (
+        [torch.cuda.current_device()]
+        if model_device == "cuda" and torch.cuda.is_available()
+        else []
+    )
+    with _global_rng_lock, torch.random.fork_rng(devices=cuda_devices):
+        torch.manual_seed(derived_seed)
+        yield
+
+
 def _test_cuda_functionality() -> bool:
     """
     Tests if CUDA is actually functional, not just available.
@@ -309,6 +529,164 @@ def _get_model_class(selector: str) -> tuple:
     return ChatterboxTTS, "original"
 
 
+def _from_pretrained(model_class, model_selector: str, device: str):
+    """
+    Instantiates `model_class` from the repo/path a selector resolves to,
+    passing it only when the installed from_pretrained API supports it.
+    """
+    # Resolve well-known aliases to explicit HuggingFace repo IDs.
+    selector_normalized = model_selector.lower().strip()
+    repo_aliases = {
+        "chatterbox": "ResembleAI/chatterbox",
+        "original": "ResembleAI/chatterbox",
+        "resembleai/chatterbox": "ResembleAI/chatterbox",
+        "chatterbox-turbo": "ResembleAI/chatterbox-turbo",
+        "turbo": "ResembleAI/chatterbox-turbo",
+        "resembleai/chatterbox-turbo": "ResembleAI/chatterbox-turbo",
+    }
+    resolved_repo_id = repo_aliases.get(selector_normalized, model_selector)
+    logger.info(f"Resolved model repo/path for loading: '{resolved_repo_id}'")
+
+    pretrained_signature = inspect.signature(model_class.from_pretrained)
+    accepts_repo = any(
+        name in pretrained_signature.parameters
+        for name in ("repo_id", "pretrained_model_name_or_path", "model_id")
+    )
+    if config_manager.get_bool("model.offline.enabled", True):
+        # Without a repo kwarg, from_pretrained loads the class's default repo.
+        offline_repo = resolved_repo_id
+        if not accepts_repo:
+            offline_repo = getattr(
+                inspect.getmodule(model_class), "REPO_ID", resolved_repo_id
+            )
+        local_model = _from_local_snapshot(model_class, offline_repo, device)
+        if local_model is not None:
+            return local_model
+
+    if "repo_id" in pretrained_signature.parameters:
+        return model_class.from_pretrained(device=device, repo_id=resolved_repo_id)
+    if "pretrained_model_name_or_path" in pretrained_signature.parameters:
+        return model_class.from_pretrained(
+            device=device, pretrained_model_name_or_path=resolved_repo_id
+        )
+    if "model_id" in pretrained_signature.parameters:
+        return model_class.from_pretrained(device=device, model_id=resolved_repo_id)
+    logger.warning(
+        "from_pretrained does not accept repo/path selection in this chatterbox version; "
+        "loading default pretrained weights."
+    )
+    return model_class.from_pretrained(device=device)
+
+
+def _from_local_snapshot(model_class, repo_id: str, device: str):
+    """
+    Loads `model_class` via `from_local` from a verified local snapshot of
+    `repo_id` (a directory path or a hub cache entry), without any hub calls.
+    Returns None when the caller should fall back to `from_pretrained`.
+    Raises when `model.offline.require_local` (or HF_HUB_OFFLINE) is set and
+    no complete snapshot exists, so air-gapped nodes fail fast.
+    """
+    require_local = config_manager.get_bool(
+        "model.offline.require_local", False
+    ) or os.environ.get("HF_HUB_OFFLINE", "").lower() in ("1", "true", "yes")
+    from_local = getattr(model_class, "from_local", None)
+    if from_local is None:
+        if require_local:
+            raise RuntimeError(
+                f"{model_class.__name__} has no from_local(); cannot load offline."
+            )
+        return None
+
+    # Only ChatterboxTTS has a known file layout; other classes verify every
+    # file present in the snapshot.
+    required, optional = None, None
+    if model_class is ChatterboxTTS:
+        required, optional = CHATTERBOX_REQUIRED_FILES, CHATTERBOX_OPTIONAL_FILES
+    verifier = SnapshotVerifier(get_model_cache_path() / "snapshot_manifests")
+    try:
+        snapshot = resolve_local_snapshot(
+            repo_id,
+            config_manager.get_string("model.offline.revision", "main"),
+            verifier,
+            required,
+            optional,
+            full_verify=config_manager.get_bool("model.offline.full_verify", False),
+        )
+    except SnapshotIntegrityError as e:
+        if require_local:
+            raise
+        logger.error(f"{e}. Falling back to the hub to repair the snapshot.")
+        return None
+    if snapshot is None:
+        if require_local:
+            raise SnapshotIntegrityError(
+                f"No local snapshot of '{repo_id}' found in the hub cache and "
+                f"offline loading is required."
+            )
+        logger.info(f"No local snapshot of '{repo_id}'; loading through the hub.")
+        return None
+
+    logger.info(f"Loading '{repo_id}' offline from local snapshot {snapshot}")
+    local_signature = inspect.signature(from_local)
+    if "ckpt_dir" in local_signature.parameters:
+        return from_local(ckpt_dir=snapshot, device=device)
+    return from_local(snapshot, device)
+
+
+def _variant_key(selector: str) -> str:
+    return selector.lower().strip()
+
+
+def _load_resident_variants(primary_class, primary_selector: str) -> None:
+    """
+    Loads `model.resident_variants` alongside the primary model and
+    deduplicates their components through `component_registry`.
+    Variants of a different model class than the primary are skipped.
+    With sharing on, each variant is loaded on the CPU and deduplicated
+    there, and only its unique components are moved to the device, so
+    loading never needs room for a full second copy in VRAM.
+    """
+    variant_models.clear()
+    _speculative_drafts.clear()
+    component_registry.clear()
+    variant_models[_variant_key(primary_selector)] = chatterbox_model
+    share = config_manager.get_bool("model.share_components", True)
+    if share:
+        component_registry.register(_variant_key(primary_selector), chatterbox_model)
+
+    for selector in config_manager.get("model.resident_variants", []) or []:
+        key = _variant_key(str(selector))
+        if key in variant_models:
+            continue
+        try:
+            variant_class, _ = _get_model_class(str(selector))
+            if variant_class is not primary_class:
+                logger.warning(
+                    f"Skipping resident variant '{selector}': {variant_class.__name__} "
+                    f"differs from the primary {primary_class.__name__}."
+                )
+                continue
+            load_device = "cpu" if share else model_device
+            variant = _from_pretrained(variant_class, str(selector), load_device)
+            if share:
+                component_registry.register(key, variant)
+                if load_device != model_device:
+                    # Shared components are the primary's, already on the device.
+                    _move_components(variant, model_device)
+                    if hasattr(variant, "device"):
+                        variant.device = model_device
+                    conds = getattr(variant, "conds", None)
+                    if conds is not None and hasattr(conds, "to"):
+                        variant.conds = conds.to(model_device)
+            variant_models[key] = variant
+            logger.info(f"Resident model variant '{selector}' loaded.")
+        except Exception as e:
+            logger.error(f"Failed to load resident variant '{selector}': {e}", exc_info=True)
+    gc.collect()
+    if model_device == "cuda":
+        torch.cuda.empty_cache()
+
+
 def get_model_info() -> dict:
     """
     Returns information about the currently loaded model.
@@ -332,26 +710,258 @@ def get_model_info() -> dict:
         "gpu_optimizations": {
             "tf32_enabled": is_cuda and get_gpu_enable_tf32(),
             "cudnn_benchmark": is_cuda and get_gpu_cudnn_benchmark(),
-            "bf16_inference": is_cuda and get_gpu_use_bf16_inference(),
+            "bf16_inference": _use_bf16_inference,
+            "bf16_autocast_device": _bf16_autocast_device,
             "nf4_quantization": is_cuda and get_gpu_use_nf4_quantization(),
             "nf4_quantized_layers": _nf4_quantized_layers,
             "nf4_active": _nf4_quantized_layers > 0,
-            "torch_compile": is_cuda and get_gpu_use_torch_compile(),
+            "torch_compile": _torch_compile_active,
+            "torch_compile_stats": decoding.compile_counters.get_stats(),
             "bitsandbytes_available": BNB_AVAILABLE,
         },
+        "request_scoped_decoding": _request_scoped_decoding,
+        "paged_kv_cache": {
+            "enabled": kv_block_pools is not None,
+            "pools": {
+                device: pool.get_stats() for device, pool in (kv_block_pools or {}).items()
+            },
+            "fallbacks": paged_kv_fallbacks,
+        },
+        "speculative_decoding": {
+            "enabled": config_manager.get_bool(
+                "tts_engine.speculative_decoding.enabled", False
+            ),
+            **decoding.speculative_stats.get_stats(),
+        },
+        "memory_admission": {
+            "estimator": memory_estimator.get_stats() if memory_estimator else None,
+            "controller": memory_controller.get_stats() if memory_controller else None,
+        },
+        "resident_variants": list(variant_models.keys()),
+        "component_sharing": component_registry.get_stats(),
+        "component_residency": component_residency.get_stats(),
+        "voice_conditionals_cache": voice_conditionals_cache.get_stats(),
+        "spillover": spillover_scheduler.get_stats() if spillover_scheduler else None,
+        "cancelled_generations": cancelled_generations,
         "sleeping": _model_on_cpu,
     }
 
 
+def _init_memory_admission(model) -> None:
+    """
+    Builds the per-request memory estimator for the freshly loaded model,
+    calibrates it (CUDA only) and sizes the admission budget from the memory
+    that is free once the weights are resident.
+    """
+    global memory_estimator, memory_controller
+    memory_estimator = None
+    memory_controller = None
+    if not config_manager.get_bool("tts_engine.memory_admission.enabled", True):
+        return
+    try:
+        estimator = MemoryEstimator(
+            speech_tokens_per_char=config_manager.get_float(
+                "tts_engine.memory_admission.speech_tokens_per_char", 1.8
+            ),
+            max_speech_tokens=decoding.DEFAULT_MAX_NEW_TOKENS,
+            safety_factor=config_manager.get_float(
+                "tts_engine.memory_admission.safety_factor", 1.2
+            ),
+        )
+        dtype_bytes = 2 if _use_bf16_inference else 4
+        estimator.configure_from_model(model, dtype_bytes=dtype_bytes)
+        conds = getattr(model, "conds", None)
+        if conds is not None and _request_scoped_decoding:
+            estimator.measure_cond_prefix(
+                model, conds.t3, decoding._prepare_input_embeds
+            )
+        estimator.calibrate(model, model_device, _bf16_autocast_device)
+
+        available_bytes, total_bytes = get_available_memory_bytes(model_device)
+        headroom = config_manager.get_float(
+            "tts_engine.memory_admission.headroom_fraction", 0.1
+        )
+        budget_bytes = int(available_bytes - headroom * total_bytes)
+        if budget_bytes <= 0:
+            logger.warning(
+                "Memory admission: no free memory budget detected; admission disabled."
+            )
+            return
+        memory_estimator = estimator
+        memory_controller = MemoryAdmissionController(
+            budget_bytes,
+            queue_timeout_sec=config_manager.get_float(
+                "tts_engine.memory_admission.queue_timeout_sec", 30.0
+            ),
+        )
+        logger.info(
+            f"Memory admission enabled: budget {budget_bytes / 1024**3:.2f} GiB on {model_device}."
+        )
+    except Exception as e:
+        logger.warning(f"Memory admission setup failed (non-fatal): {e}", exc_info=True)
+
+
+def _init_component_residency() -> None:
+    """
+    Resets the per-voice conditionals cache and starts tracking the
+    conditioning components of every resident variant for idle offloading.
+    """
+    component_residency.clear()
+    voice_conditionals_cache.clear()
+    voice_conditionals_cache.max_entries = config_manager.get_int(
+        "tts_engine.component_residency.voice_cache_entries", 64
+    )
+    if not config_manager.get_bool("tts_engine.component_residency.enabled", True):
+        component_residency.enabled = False
+        return
+    component_residency.configure(
+        idle_sec=config_manager.get_float(
+            "tts_engine.component_residency.idle_sec", 300.0
+        ),
+        offload_to=config_manager.get_string(
+            "tts_engine.component_residency.offload_to", "cpu"
+        ),
+        offload_dir=get_model_cache_path() / "component_offload",
+    )
+    for variant, model in variant_models.items():
+        component_residency.register(model, variant)
+
+
+def _serves_primary_variant(model_variant: Optional[str]) -> bool:
+    """True if a request for `model_variant` runs on the primary model."""
+    if not model_variant:
+        return True
+    return variant_models.get(_variant_key(model_variant), chatterbox_model) is chatterbox_model
+
+
+def _init_spillover(model_class, model_selector: str) -> None:
+    """
+    Builds the spillover scheduler from `tts_engine.spillover.replicas`.
+    A replica on the primary's device reuses the primary weights and only adds
+    an execution lane (own thread count and slots); a replica on another
+    device gets its own copy of the model.
+    """
+    global spillover_scheduler
+    if spillover_scheduler is not None:
+        spillover_scheduler.shutdown()
+    spillover_scheduler = None
+    gate = spillover_gate
+    if gate is not None:
+        gate.set_extra_slots(0)
+    if not config_manager.get_bool("tts_engine.spillover.enabled", False):
+        return
+    # 0 = as many primary lanes as chunks can run at once without spillover:
+    # the priority gate's slots, or the inference workers without a gate.
+    # Only then does the primary's own queue, which routing looks at, fill up.
+    primary_concurrency = config_manager.get_int(
+        "tts_engine.spillover.primary_concurrency", 0
+    ) or (
+        gate.slots
+        if gate is not None
+        else config_manager.get_int("server.executor.inference_workers", 4)
+    )
+    primary = ModelReplica(
+        "primary",
+        chatterbox_model,
+        model_device,
+        num_threads=config_manager.get_int("tts_engine.spillover.primary_threads", 0)
+        if model_device == "cpu"
+        else 0,
+        max_concurrency=primary_concurrency,
+        autocast_device=_bf16_autocast_device,
+    )
+    secondaries = []
+    for index, spec in enumerate(config_manager.get("tts_engine.spillover.replicas", []) or []):
+        device = str(spec.get("device", "cpu"))
+        name = str(spec.get("name") or f"{device}-{index}")
+        try:
+            if device == model_device:
+                replica_model = chatterbox_model
+            else:
+                replica_model = _from_pretrained(model_class, model_selector, device)
+            secondaries.append(
+                ModelReplica(
+                    name,
+                    replica_model,
+                    device,
+                    num_threads=int(spec.get("threads", 0)) if device == "cpu" else 0,
+                    max_concurrency=int(spec.get("concurrency", 1)),
+                    autocast_device=_resolve_bf16_autocast_device(device),
+                )
+            )
+            logger.info(
+                f"Spillover replica '{name}' ready on {device} "
+                f"(threads={spec.get('threads', 'default')}, "
+                f"shared weights={replica_model is chatterbox_model})."
+            )
+        except Exception as e:
+            logger.error(f"Failed to create spillover replica '{name}': {e}", exc_info=True)
+    if gate is not None:
+        gate.set_extra_slots(sum(replica.max_concurrency for replica in secondaries))
+    spillover_scheduler = SpilloverScheduler(
+        primary,
+        secondaries,
+        wait_threshold_sec=config_manager.get_float(
+            "tts_engine.spillover.queue_wait_threshold_sec", 2.0
+        ),
+    )
+
+
+def offload_idle_components() -> int:
+    """Offloads conditioning components idle past their timeout (model awake only)."""
+    with _model_lock:
+        if not MODEL_LOADED or _model_on_cpu:
+            return 0
+        return component_residency.offload_idle()
+
+
+def estimate_peak_memory(text: str, batch: int = 1) -> Optional[dict]:
+    """
+    Predicts the peak memory of synthesizing `text` as a single chunk
+    (`batch` candidates at once for best-of-N).
+    Returns the estimator's breakdown dict, or None if admission is disabled.
+    """
+    model = chatterbox_model
+    if memory_estimator is None or model is None:
+        return None
+    try:
+        text_tokens = int(model.tokenizer.text_to_tokens(text).shape[-1])
+    except Exception:
+        text_tokens = len(text)  # Tokenizer unavailable: one token per char is an upper bound.
+    return memory_estimator.estimate(text_tokens, len(text), batch=batch)
+
+
+def reserve_memory(estimated_bytes: int):
+    """
+    Context manager holding `estimated_bytes` of the admission budget for the
+    duration of a request. Blocks while other requests hold the memory and
+    raises MemoryAdmissionError if it can never fit or the wait times out.
+    """
+    if memory_controller is None or estimated_bytes <= 0:
+        return nullcontext()
+    return memory_controller.reserve(estimated_bytes)
+
+
 def _move_model_to_device(target_device: str) -> None:
-    """Moves all nn.Module components of chatterbox_model to target_device."""
+    """Moves all nn.Module components of every resident variant to target_device."""
     if chatterbox_model is None:
         return
-    if isinstance(chatterbox_model, torch.nn.Module):
-        chatterbox_model.to(target_device)
+    # Offloaded components must be materialized before a whole-model move.
+    component_residency.restore_all(target_device)
+    models = [chatterbox_model] + [
+        m for m in variant_models.values() if m is not chatterbox_model
+    ]
+    for model in models:
+        _move_components(model, target_device)
+
+
+def _move_components(model, target_device: str) -> None:
+    """Moves one model's nn.Module components to target_device (shared ones included)."""
+    if isinstance(model, torch.nn.Module):
+        model.to(target_device)
         return
     # Fallback: iterate attributes for composite model objects
-    for attr_val in vars(chatterbox_model).values():
+    for attr_val in vars(model).values():
         if isinstance(attr_val, torch.nn.Module):
             attr_val.to(target_device)
 
@@ -379,6 +989,11 @@ def sleep_model() -> None:
             if chatterbox_model is not None:
                 del chatterbox_model
                 chatterbox_model = None
+            variant_models.clear()
+            _speculative_drafts.clear()
+            component_registry.clear()
+            component_residency.clear()
+            voice_conditionals_cache.clear()
             MODEL_LOADED = False
             _model_on_cpu = False
             _nf4_quantized_layers = 0
@@ -388,6 +1003,9 @@ def sleep_model() -> None:
                 "Model unloaded from GPU memory. Next request will lazy-reload model."
             )
             return
+        for pool in (kv_block_pools or {}).values():
+            # Pools still in use are freed once their last block is returned.
+            pool.release_storage()
         gc.collect()
         torch.cuda.empty_cache()
         _model_on_cpu = True
@@ -431,8 +1049,9 @@ def ensure_loaded() -> bool:
 def load_model() -> bool:
     """
     Loads the TTS model.
-    This version directly attempts to load from the Hugging Face repository (or its cache)
-    using `from_pretrained`, bypassing the local `paths.model_cache` directory.
+    A verified local snapshot (hub cache or directory path) is loaded with
+    `from_local` first; otherwise the model is loaded from the Hugging Face
+    repository using `from_pretrained`.
     Updates global variables `chatterbox_model`, `MODEL_LOADED`, and `model_device`.
 
     Returns:
@@ -440,7 +1059,9 @@ def load_model() -> bool:
     """
     global chatterbox_model, MODEL_LOADED, model_device
     global loaded_model_type, loaded_model_class_name, _use_bf16_inference
-    global _model_on_cpu, _nf4_quantized_layers
+    global _model_on_cpu, _nf4_quantized_layers, _request_scoped_decoding
+    global _bf16_autocast_device
+    global _torch_compile_active, _compile_length_buckets, _compile_cache_dir
 
     if MODEL_LOADED:
         logger.info("TTS model is already loaded.")
@@ -529,40 +1150,11 @@ def load_model() -> bool:
                     f"Turbo model supports paralinguistic tags: {TURBO_PARALINGUISTIC_TAGS}"
                 )
 
-            # Resolve well-known aliases to explicit HuggingFace repo IDs.
-            selector_normalized = model_selector.lower().strip()
-            repo_aliases = {
-                "chatterbox": "ResembleAI/chatterbox",
-                "original": "ResembleAI/chatterbox",
-                "resembleai/chatterbox": "ResembleAI/chatterbox",
-                "chatterbox-turbo": "ResembleAI/chatterbox-turbo",
-                "turbo": "ResembleAI/chatterbox-turbo",
-                "resembleai/chatterbox-turbo": "ResembleAI/chatterbox-turbo",
-            }
-            resolved_repo_id = repo_aliases.get(selector_normalized, model_selector)
-            logger.info(f"Resolved model repo/path for loading: '{resolved_repo_id}'")
-
-            # Load from_pretrained, passing repo/path only when the installed API supports it.
-            pretrained_signature = inspect.signature(model_class.from_pretrained)
-            if "repo_id" in pretrained_signature.parameters:
-                chatterbox_model = model_class.from_pretrained(
-                    device=model_device, repo_id=resolved_repo_id
-                )
-            elif "pretrained_model_name_or_path" in pretrained_signature.parameters:
-                chatterbox_model = model_class.from_pretrained(
-                    device=model_device,
-                    pretrained_model_name_or_path=resolved_repo_id,
-                )
-            elif "model_id" in pretrained_signature.parameters:
-                chatterbox_model = model_class.from_pretrained(
-                    device=model_device, model_id=resolved_repo_id
-                )
-            else:
-                logger.warning(
-                    "from_pretrained does not accept repo/path selection in this chatterbox version; "
-                    "loading default pretrained weights."
-                )
-                chatterbox_model = model_class.from_pretrained(device=model_device)
+            chatterbox_model = _from_pretrained(model_class, model_selector, model_device)
+
+            # Load extra variants next to the primary one, sharing identical
+            # components. Done before NF4/compile so hashes see the raw weights.
+            _load_resident_variants(model_class, model_selector)
 
             # Apply NF4 quantization if enabled (reduces VRAM ~4x on CUDA)
             if model_device == "cuda" and get_gpu_use_nf4_quantization():
@@ -572,20 +1164,45 @@ def load_model() -> bool:
                     logger.warning(
                         "NF4 was enabled but no eligible Linear layers were quantized."
                     )
+                # Variants after the primary: components they share with it are
+                # already Linear4bit and are skipped, so each layer is packed once.
+                for variant in variant_models.values():
+                    if variant is not chatterbox_model:
+                        _quantize_model_nf4(variant)
             else:
                 _nf4_quantized_layers = 0
 
-            # Apply torch.compile if enabled (PyTorch 2.x JIT optimization)
-            if model_device == "cuda" and get_gpu_use_torch_compile():
+            # Apply torch.compile if enabled (PyTorch 2.x JIT optimization).
+            # Works with the CUDA and CPU inductor backends; prefill lengths are
+            # bucketed so a small set of graphs is reused across requests.
+            _torch_compile_active = False
+            _compile_length_buckets = None
+            if get_gpu_use_torch_compile() and model_device in ("cuda", "cpu"):
                 try:
                     if hasattr(chatterbox_model, "t3") and hasattr(
                         chatterbox_model.t3, "tfmr"
                     ):
+                        _compile_cache_dir = get_model_cache_path() / "torch_compile"
+                        _configure_compile_cache(_compile_cache_dir)
+                        buckets = config_manager.get(
+                            "gpu_optimizations.compile_length_buckets", []
+                        )
+                        _compile_length_buckets = (
+                            sorted({int(b) for b in buckets}) or None
+                        )
+                        if _compile_length_buckets:
+                            torch._dynamo.config.cache_size_limit = max(
+                                torch._dynamo.config.cache_size_limit,
+                                len(_compile_length_buckets) + 8,
+                            )
                         chatterbox_model.t3.tfmr = torch.compile(
                             chatterbox_model.t3.tfmr
                         )
+                        _torch_compile_active = True
+                        decoding.compile_counters.enabled = True
                         logger.info(
-                            "Applied torch.compile to transformer backbone."
+                            f"Applied torch.compile to transformer backbone "
+                            f"(length buckets: {_compile_length_buckets})."
                         )
                 except Exception as e_compile:
                     logger.warning(
@@ -619,8 +1236,23 @@ def load_model() -> bool:
 
         MODEL_LOADED = True
         _model_on_cpu = False
-        # Cache BF16 inference flag to avoid per-call config lookups
-        _use_bf16_inference = model_device == "cuda" and get_gpu_use_bf16_inference()
+        # Cache BF16 inference flags to avoid per-call config lookups
+        _bf16_autocast_device = _resolve_bf16_autocast_device(model_device)
+        _use_bf16_inference = _bf16_autocast_device is not None
+        _request_scoped_decoding = (
+            loaded_model_type != "turbo"
+            and decoding.supports_request_scoped_decoding(chatterbox_model)
+        )
+        logger.info(
+            "Per-request RNG decoding: "
+            + ("enabled" if _request_scoped_decoding else "unavailable, using model.generate")
+        )
+        if chatterbox_model is not None:
+            _init_component_residency()
+            _init_paged_kv_cache()
+            _init_spillover(model_class, model_selector)
+            # Last, so the budget reflects memory taken by spillover replicas.
+            _init_memory_admission(chatterbox_model)
         if chatterbox_model:
             logger.info(
                 f"TTS Model loaded successfully on {model_device}. Engine sample rate: {chatterbox_model.sr} Hz."
@@ -645,77 +1277,367 @@ def load_model() -> bool:
         return False
 
 
+def _init_paged_kv_cache() -> None:
+    """Enables per-device KV block pools when `tts_engine.paged_kv_cache` is enabled."""
+    global kv_block_pools
+    kv_block_pools = None
+    if not config_manager.get_bool("tts_engine.paged_kv_cache.enabled", False):
+        return
+    if not _request_scoped_decoding:
+        logger.info("Paged KV cache needs request-scoped decoding; not enabled.")
+        return
+    kv_block_pools = {}
+
+
+def _kv_block_pool(device: str) -> KVBlockPool:
+    """The KV block pool for `device`, created on first use (storage stays lazy)."""
+    with _kv_block_pools_lock:
+        pool = kv_block_pools.get(device)
+        if pool is None:
+            pool = KVBlockPool(
+                pool_bytes=int(
+                    config_manager.get_float("tts_engine.paged_kv_cache.pool_mib", 1024.0)
+                    * 1024**2
+                ),
+                block_size=config_manager.get_int("tts_engine.paged_kv_cache.block_size", 16),
+            )
+            kv_block_pools[device] = pool
+        return pool
+
+
+def _paged_kv_cache_factory(model):
+    """
+    Returns a PagedKVCache factory for `model`'s backbone, backed by the pool
+    of the device it runs on, or None if paging is off.
+    """
+    if kv_block_pools is None:
+        return None
+    backbone = getattr(model.t3.tfmr, "_orig_mod", model.t3.tfmr)
+    device = str(getattr(model, "device", None) or next(backbone.parameters()).device)
+    return make_cache_factory(_kv_block_pool(device), len(backbone.layers))
+
+
+def _get_speculative_draft(model):
+    """
+    Returns the layer-truncated draft backbone for `model`'s T3, building it on
+    first use, or None when speculative decoding is disabled. Drafts are views
+    over the target's own layers, so they cost no extra weights.
+    """
+    if not config_manager.get_bool("tts_engine.speculative_decoding.enabled", False):
+        return None
+    key = id(model.t3)
+    draft = _speculative_drafts.get(key)
+    if draft is None:
+        num_layers = config_manager.get_int(
+            "tts_engine.speculative_decoding.draft_layers", 8
+        )
+        draft = decoding.build_layer_truncated_draft(model.t3.tfmr, num_layers)
+        _speculative_drafts[key] = draft
+        logger.info(
+            f"Speculative decoding draft built from the first {num_layers} T3 layers."
+        )
+    return draft
+
+
+class InlineVoice:
+    """
+    Reference audio uploaded with a request, kept in memory and identified by
+    the sha256 of its bytes, so re-sending the same clip reuses its cached
+    conditionals without touching disk. Accepted wherever a voice path is.
+    """
+
+    def __init__(self, data: bytes, filename: Optional[str] = None):
+        self.data = data
+        self.filename = filename
+        self.sha256 = hashlib.sha256(data).hexdigest()
+
+    def open(self) -> io.BytesIO:
+        """A fresh in-memory file for the decoder (librosa reads file objects)."""
+        return io.BytesIO(self.data)
+
+    def __str__(self) -> str:
+        return f"inline:{self.sha256[:12]}"
+
+
+def _voice_cache_key(model, audio_prompt_path: Union[str, InlineVoice]) -> tuple:
+    """
+    Identifies a voice's conditionals: the components that compute them plus
+    the reference file's identity, so an edited file is re-embedded (or, for
+    inline audio, its content hash). Variants sharing VoiceEncoder/S3Gen share
+    cache entries.
+    """
+    if isinstance(audio_prompt_path, InlineVoice):
+        return (
+            id(getattr(model, "ve", None)),
+            id(getattr(model, "s3gen", None)),
+            f"sha256:{audio_prompt_path.sha256}",
+        )
+    path = Path(audio_prompt_path).resolve()
+    stat = path.stat()
+    return (
+        id(getattr(model, "ve", None)),
+        id(getattr(model, "s3gen", None)),
+        str(path),
+        stat.st_mtime_ns,
+        stat.st_size,
+    )
+
+
+def _get_voice_conditionals(
+    model, audio_prompt_path: Optional[Union[str, InlineVoice]], exaggeration: float
+):
+    """
+    Returns the model's conditionals for a reference voice, from the per-voice
+    cache when possible. On a miss the conditioning components are restored
+    (if offloaded) and `prepare_conditionals` runs under `_conditionals_lock`,
+    since it stores its result on the shared `model.conds`.
+    """
+    if not audio_prompt_path:
+        with _conditionals_lock:
+            conds = getattr(model, "conds", None)
+        if conds is None:
+            raise ValueError(
+                "No reference audio provided and the model has no default conditionals."
+            )
+        return conds
+
+    key = _voice_cache_key(model, audio_prompt_path)
+    conds = voice_conditionals_cache.get(key)
+    if conds is not None:
+        return conds
+    audio_source = (
+        audio_prompt_path.open()
+        if isinstance(audio_prompt_path, InlineVoice)
+        else audio_prompt_path
+    )
+    with component_residency.acquire(model, model_device), _conditionals_lock:
+        model.prepare_conditionals(audio_source, exaggeration=exaggeration)
+        conds = model.conds
+    voice_conditionals_cache.put(key, conds)
+    return conds
+
+
+def _prepare_request_conditionals(
+    model, audio_prompt_path: Optional[Union[str, InlineVoice]], exaggeration: float
+):
+    """
+    Returns conditionals for one request without leaving them on the shared model.
+    Cached conditionals are never modified; exaggeration is applied to a copy.
+    """
+    conds = _get_voice_conditionals(model, audio_prompt_path, exaggeration)
+    return decoding.with_exaggeration(conds, exaggeration, model.device)
+
+
+def _decode_with_kv_fallback(
+    model, decode, generators: List[torch.Generator], scope: str = "request"
+):
+    """
+    Runs `decode(kv_cache_factory)` on the paged KV cache when it is enabled.
+    If the pool runs out mid-decode, the generators are rewound to their
+    state before the attempt and decoding restarts on a dynamic cache, so a
+    seeded request samples the same tokens whatever the pool pressure.
+    """
+    global paged_kv_fallbacks
+    kv_cache_factory = _paged_kv_cache_factory(model)
+    if kv_cache_factory is None:
+        return decode(None)
+    states = [generator.get_state() for generator in generators]
+    try:
+        return decode(kv_cache_factory)
+    except KVCachePoolExhausted as e:
+        paged_kv_fallbacks += 1
+        logger.warning(f"{e} Falling back to a dynamic KV cache for this {scope}.")
+        for generator, state in zip(generators, states):
+            generator.set_state(state)
+        return decode(None)
+
+
+def _synthesize_request_scoped(
+    model,
+    text: str,
+    audio_prompt_path: Optional[Union[str, InlineVoice]],
+    temperature: float,
+    exaggeration: float,
+    cfg_weight: float,
+    generator: torch.Generator,
+    cancel_token: Optional[CancellationToken] = None,
+) -> np.ndarray:
+    """Runs conditioning, T3 decoding and vocoding with request-local state only."""
+    conds = _prepare_request_conditionals(model, audio_prompt_path, exaggeration)
+    text_tokens = decoding.tokenize_text(model, text, cfg_weight)
+    length_buckets = _compile_length_buckets if _torch_compile_active else None
+    draft_tfmr = _get_speculative_draft(model)
+
+    def decode(kv_cache_factory):
+        if draft_tfmr is not None:
+            return decoding.speculative_decode_speech_tokens(
+                model.t3,
+                draft_tfmr,
+                conds.t3,
+                text_tokens,
+                generator=generator,
+                temperature=temperature,
+                cfg_weight=cfg_weight,
+                num_speculative_tokens=config_manager.get_int(
+                    "tts_engine.speculative_decoding.num_speculative_tokens", 4
+                ),
+                length_buckets=length_buckets,
+                cancel_token=cancel_token,
+                kv_cache_factory=kv_cache_factory,
+            )
+        return decoding.decode_speech_tokens(
+            model.t3,
+            conds.t3,
+            text_tokens,
+            generator=generator,
+            temperature=temperature,
+            cfg_weight=cfg_weight,
+            length_buckets=length_buckets,
+            cancel_token=cancel_token,
+            kv_cache_factory=kv_cache_factory,
+        )
+
+    speech_tokens = _decode_with_kv_fallback(model, decode, [generator])
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+    # S3Gen draws vocoder noise from the global RNG; pin it to this request.
+    with _global_rng_scope(generator):
+        return decoding.tokens_to_wav(model, speech_tokens, conds.gen)
+
+
+def _synthesize_with_model_generate(
+    model,
+    text: str,
+    audio_prompt_path: Optional[Union[str, InlineVoice]],
+    temperature: float,
+    exaggeration: float,
+    cfg_weight: float,
+    generator: torch.Generator,
+    cancel_token: Optional[CancellationToken] = None,
+):
+    """
+    Fallback for models whose internals the request-scoped loop does not support
+    (e.g. Turbo). The whole call runs inside `_global_rng_scope`, so it is
+    serialized with other users of the global RNG. Cancellation is only honoured
+    before the call starts, since model.generate cannot be interrupted.
+    """
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+    conds = _get_voice_conditionals(model, audio_prompt_path, exaggeration)
+    with _global_rng_scope(generator), _conditionals_lock:
+        # Install the (cached) voice so generate() does not re-embed it.
+        model.conds = conds
+        return model.generate(
+            text=text,
+            temperature=temperature,
+            exaggeration=exaggeration,
+            cfg_weight=cfg_weight,
+        )
+
+
 def synthesize(
     text: str,
-    audio_prompt_path: Optional[str] = None,
+    audio_prompt_path: Optional[Union[str, InlineVoice]] = None,
     temperature: float = 0.8,
     exaggeration: float = 0.5,
     cfg_weight: float = 0.5,
     seed: int = 0,
+    cancel_token: Optional[CancellationToken] = None,
+    model_variant: Optional[str] = None,
+    replica: Optional[ModelReplica] = None,
 ) -> Tuple[Optional[torch.Tensor], Optional[int]]:
     """
     Synthesizes audio from text using the loaded TTS model.
 
     Args:
         text: The text to synthesize.
-        audio_prompt_path: Path to an audio file for voice cloning or predefined voice.
+        audio_prompt_path: Path to an audio file for voice cloning or predefined voice,
+              or an InlineVoice holding uploaded reference audio.
         temperature: Controls randomness in generation.
         exaggeration: Controls expressiveness.
         cfg_weight: Classifier-Free Guidance weight.
         seed: Random seed for generation. If 0, default randomness is used.
-              If non-zero, a global seed is set for reproducibility.
+              If non-zero, the request gets its own seeded torch.Generator, so the
+              result is reproducible even while other requests run concurrently.
+        cancel_token: Optional token checked between decode steps.
+        model_variant: Selector of a resident variant to use instead of the
+              primary model (see `model.resident_variants`). Unknown names fall
+              back to the primary model.
+        replica: Spillover replica to run on (its model, device and autocast
+              settings); chosen by `spillover_scheduler` in `generate`.
 
     Returns:
         A tuple containing the audio waveform (torch.Tensor) and the sample rate (int),
         or (None, None) if synthesis fails.
-    """
-    global chatterbox_model
 
-    if not MODEL_LOADED or chatterbox_model is None:
+    Raises:
+        GenerationCancelled: If `cancel_token` was triggered before completion.
+    """
+    global chatterbox_model, cancelled_generations
+
+    model = chatterbox_model
+    device = model_device
+    autocast_device = _bf16_autocast_device
+    if replica is not None:
+        model, device, autocast_device = replica.model, replica.device, replica.autocast_device
+    elif model_variant:
+        model = variant_models.get(_variant_key(model_variant), chatterbox_model)
+    if not MODEL_LOADED or model is None:
         logger.error("TTS model is not loaded. Cannot synthesize audio.")
         return None, None
 
     try:
-        # Set seed globally if a specific seed value is provided and is non-zero.
         if seed != 0:
             logger.info(f"Applying user-provided seed for generation: {seed}")
-            set_seed(seed)
         else:
             logger.info(
                 "Using default (potentially random) generation behavior as seed is 0."
             )
+        generator = decoding.make_generator(seed, device)
 
         logger.debug(
             f"Synthesizing with params: audio_prompt='{audio_prompt_path}', temp={temperature}, "
-            f"exag={exaggeration}, cfg_weight={cfg_weight}, seed_applied_globally_if_nonzero={seed}"
-        )
-
-        # Call the core model's generate method, with optional BF16 autocast for Ampere GPUs
-        if _use_bf16_inference:
-            with torch.amp.autocast("cuda", dtype=torch.bfloat16):
-                wav_tensor = chatterbox_model.generate(
-                    text=text,
-                    audio_prompt_path=audio_prompt_path,
-                    temperature=temperature,
-                    exaggeration=exaggeration,
-                    cfg_weight=cfg_weight,
-                )
+            f"exag={exaggeration}, cfg_weight={cfg_weight}, seed={seed}, "
+            f"request_scoped_decoding={_request_scoped_decoding}"
+        )
+
+        synthesize_fn = (
+            _synthesize_request_scoped
+            if _request_scoped_decoding
+            else _synthesize_with_model_generate
+        )
+        synth_kwargs = dict(
+            text=text,
+            audio_prompt_path=audio_prompt_path,
+            temperature=temperature,
+            exaggeration=exaggeration,
+            cfg_weight=cfg_weight,
+            generator=generator,
+            cancel_token=cancel_token,
+        )
+
+        # Optional BF16 autocast for Ampere GPUs and BF16-capable CPUs
+        if autocast_device is not None:
+            with torch.amp.autocast(autocast_device, dtype=torch.bfloat16):
+                wav_tensor = synthesize_fn(model, **synth_kwargs)
         else:
-            wav_tensor = chatterbox_model.generate(
-                text=text,
-                audio_prompt_path=audio_prompt_path,
-                temperature=temperature,
-                exaggeration=exaggeration,
-                cfg_weight=cfg_weight,
-            )
+            wav_tensor = synthesize_fn(model, **synth_kwargs)
 
-        # The ChatterboxTTS.generate method already returns a CPU tensor.
-        # Convert to numpy array for compatibility with utils.encode_audio
+        # ChatterboxTTS.generate returns a tensor (bfloat16 under CPU bf16
+        # autocast, which NumPy cannot hold); the request-scoped path already
+        # returns NumPy. Normalize to float32 for utils.encode_audio.
         if isinstance(wav_tensor, torch.Tensor):
-            wav_tensor = wav_tensor.numpy()
+            wav_tensor = wav_tensor.float().cpu().numpy()
 
-        return wav_tensor, chatterbox_model.sr
+        if _torch_compile_active:
+            _save_compile_artifacts()
 
+        return wav_tensor, model.sr
+
+    except GenerationCancelled as e:
+        cancelled_generations += 1
+        logger.info(f"TTS synthesis cancelled: {e}")
+        raise
     except Exception as e:
         logger.error(f"Error during TTS synthesis: {e}", exc_info=True)
         return None, None
@@ -723,34 +1645,58 @@ def synthesize(
 
 def generate(
     text: str,
-    voice_source_path: Optional[str] = None,
+    voice_source_path: Optional[Union[str, InlineVoice]] = None,
     temperature: float = 0.8,
     exaggeration: float = 0.5,
     cfg_weight: float = 0.5,
     seed: int = 0,
     speed_factor: float = 1.0,
     language: str = "es",
+    cancel_token: Optional[CancellationToken] = None,
+    model_variant: Optional[str] = None,
+    memory_bytes: int = 0,
 ) -> Tuple[Optional[torch.Tensor], Optional[int]]:
     """
     Wrapper for synthesize to match server.py expectation.
     Lazy-loads the model on first call and wakes it from CPU sleep if needed.
+    Raises GenerationCancelled if `cancel_token` fires before audio is produced.
+    `memory_bytes` (the request's predicted peak) is reserved from the
+    admission budget once the request is routed, and only when it runs on the
+    primary's device; a request spilled to another device holds none of it.
     """
     global last_request_time
     # Reset idle timer immediately so a concurrent sleep_model() won't fire mid-request
     last_request_time = time.time()
 
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+
     if not ensure_loaded():
         logger.error("Model could not be loaded or woken. Cannot generate audio.")
         return None, None
 
-    wav_tensor, sr = synthesize(
+    synth_kwargs = dict(
         text=text,
         audio_prompt_path=voice_source_path,
         temperature=temperature,
         exaggeration=exaggeration,
         cfg_weight=cfg_weight,
         seed=seed,
+        cancel_token=cancel_token,
+        model_variant=model_variant,
     )
+    scheduler = spillover_scheduler
+    if scheduler is not None and _serves_primary_variant(model_variant):
+
+        def run_on(replica: ModelReplica):
+            held = memory_bytes if replica.device == model_device else 0
+            with reserve_memory(held):
+                return synthesize(replica=replica, **synth_kwargs)
+
+        wav_tensor, sr = scheduler.execute(len(text), run_on)
+    else:
+        with reserve_memory(memory_bytes):
+            wav_tensor, sr = synthesize(**synth_kwargs)
 
     if wav_tensor is not None and speed_factor != 1.0:
         import utils
@@ -760,6 +1706,305 @@ def generate(
     return wav_tensor, sr
 
 
+def _synthesize_candidates_request_scoped(
+    model,
+    text: str,
+    audio_prompt_path: Optional[Union[str, InlineVoice]],
+    temperature: float,
+    exaggeration: float,
+    cfg_weight: float,
+    generators: List[torch.Generator],
+    cancel_token: Optional[CancellationToken] = None,
+) -> List[Tuple[np.ndarray, torch.Tensor]]:
+    """
+    Decodes all candidates in one batched T3 pass, then vocodes each with its
+    own generator pinning the global RNG. Returns (wav, speech_tokens) pairs.
+    """
+    conds = _prepare_request_conditionals(model, audio_prompt_path, exaggeration)
+    text_tokens = decoding.tokenize_text(model, text, cfg_weight)
+    length_buckets = _compile_length_buckets if _torch_compile_active else None
+
+    def decode(kv_cache_factory):
+        return decoding.decode_speech_token_candidates(
+            model.t3,
+            conds.t3,
+            text_tokens,
+            generators,
+            temperature=temperature,
+            cfg_weight=cfg_weight,
+            length_buckets=length_buckets,
+            cancel_token=cancel_token,
+            kv_cache_factory=kv_cache_factory,
+        )
+
+    token_sequences = _decode_with_kv_fallback(model, decode, generators)
+
+    takes = []
+    for generator, speech_tokens in zip(generators, token_sequences):
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        with _global_rng_scope(generator):
+            takes.append((decoding.tokens_to_wav(model, speech_tokens, conds.gen), speech_tokens))
+    return takes
+
+
+def generate_candidates(
+    text: str,
+    voice_source_path: Optional[Union[str, InlineVoice]] = None,
+    n_candidates: int = 2,
+    temperature: float = 0.8,
+    exaggeration: float = 0.5,
+    cfg_weight: float = 0.5,
+    seed: int = 0,
+    speed_factor: float = 1.0,
+    language: str = "es",
+    cancel_token: Optional[CancellationToken] = None,
+    model_variant: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Best-of-N: generates `n_candidates` takes of `text` and scores each with
+    `candidate_scoring` heuristics. Candidate i uses seed `seed + i` (a random
+    base when seed is 0), so any take can be reproduced through `generate`.
+    Request-scoped models decode all takes in one batched T3 pass; others
+    fall back to sequential `synthesize` calls.
+
+    Returns:
+        Candidate dicts ("audio", "sample_rate", "seed", "index", "score",
+        "metrics") sorted best first, or an empty list on failure.
+    """
+    global last_request_time, cancelled_generations
+    last_request_time = time.time()
+
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+    if not ensure_loaded():
+        logger.error("Model could not be loaded or woken. Cannot generate audio.")
+        return []
+
+    model = chatterbox_model
+    if model_variant:
+        model = variant_models.get(_variant_key(model_variant), chatterbox_model)
+    base_seed = seed if seed != 0 else random.randint(1, 2**31 - 1 - n_candidates)
+    seeds = [base_seed + index for index in range(n_candidates)]
+    stop_token = getattr(getattr(getattr(model, "t3", None), "hp", None), "stop_speech_token", None)
+
+    if _request_scoped_decoding:
+        try:
+            autocast_ctx = (
+                torch.amp.autocast(_bf16_autocast_device, dtype=torch.bfloat16)
+                if _bf16_autocast_device is not None
+                else nullcontext()
+            )
+            with autocast_ctx:
+                takes = _synthesize_candidates_request_scoped(
+                    model,
+                    text,
+                    voice_source_path,
+                    temperature,
+                    exaggeration,
+                    cfg_weight,
+                    [decoding.make_generator(s, model_device) for s in seeds],
+                    cancel_token,
+                )
+        except GenerationCancelled as e:
+            cancelled_generations += 1
+            logger.info(f"Best-of-{n_candidates} synthesis cancelled: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"Error during best-of-{n_candidates} synthesis: {e}", exc_info=True)
+            return []
+        sample_rate = model.sr
+    else:
+        takes = []
+        sample_rate = None
+        for candidate_seed in seeds:
+            wav, sample_rate = synthesize(
+                text=text,
+                audio_prompt_path=voice_source_path,
+                temperature=temperature,
+                exaggeration=exaggeration,
+                cfg_weight=cfg_weight,
+                seed=candidate_seed,
+                cancel_token=cancel_token,
+                model_variant=model_variant,
+            )
+            if wav is None:
+                return []
+            takes.append((wav, None))
+
+    import utils
+
+    candidates = []
+    for index, (wav, speech_tokens) in enumerate(takes):
+        tokens = speech_tokens.tolist() if speech_tokens is not None else None
+        reached_stop = bool(tokens) and tokens[-1] == stop_token if tokens is not None else None
+        metrics = candidate_scoring.score_candidate(
+            wav, sample_rate, text, tokens=tokens, reached_stop=reached_stop
+        )
+        audio, candidate_sr = wav, sample_rate
+        if speed_factor != 1.0:
+            audio, candidate_sr = utils.apply_speed_factor(audio, candidate_sr, speed_factor)
+        candidates.append(
+            {
+                "index": index,
+                "seed": seeds[index],
+                "score": metrics["score"],
+                "metrics": metrics,
+                "audio": audio,
+                "sample_rate": candidate_sr,
+            }
+        )
+    candidates.sort(key=lambda candidate: candidate["score"], reverse=True)
+    logger.info(
+        f"Best-of-{n_candidates}: scores "
+        f"{[(c['index'], c['score']) for c in candidates]}, picked #{candidates[0]['index']}."
+    )
+    return candidates
+
+
+def _synthesize_batch_request_scoped(
+    model,
+    items: List[Dict[str, Any]],
+    results: List[Optional[Dict[str, Any]]],
+    cancel_token: Optional[CancellationToken] = None,
+) -> None:
+    """
+    Decodes batch items in one batched T3 pass per CFG layout, then vocodes
+    each with its own generator pinning the global RNG. Fills `results` in
+    place; items whose batched decode failed are left as None for the caller
+    to retry one at a time.
+    """
+    groups: Dict[int, list] = {}  # CFG rows -> [(index, conds, text_tokens, generator)]
+    for index, item in enumerate(items):
+        try:
+            conds = _prepare_request_conditionals(
+                model, item["voice_source_path"], item["exaggeration"]
+            )
+            text_tokens = decoding.tokenize_text(model, item["text"], item["cfg_weight"])
+        except Exception as e:
+            logger.warning(f"Batch item {index}: conditioning failed: {e}")
+            results[index] = {"error": str(e)}
+            continue
+        generator = decoding.make_generator(item["seed"], model_device)
+        groups.setdefault(text_tokens.size(0), []).append(
+            (index, conds, text_tokens, generator)
+        )
+    length_buckets = _compile_length_buckets if _torch_compile_active else None
+
+    for group in groups.values():
+
+        def decode(kv_cache_factory):
+            return decoding.decode_speech_token_batch(
+                model.t3,
+                [conds.t3 for _, conds, _, _ in group],
+                [text_tokens for _, _, text_tokens, _ in group],
+                [generator for _, _, _, generator in group],
+                temperatures=[items[index]["temperature"] for index, _, _, _ in group],
+                cfg_weights=[items[index]["cfg_weight"] for index, _, _, _ in group],
+                length_buckets=length_buckets,
+                cancel_token=cancel_token,
+                kv_cache_factory=kv_cache_factory,
+            )
+
+        try:
+            token_sequences = _decode_with_kv_fallback(
+                model, decode, [generator for _, _, _, generator in group], scope="batch"
+            )
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            logger.warning(
+                f"Batched decode of {len(group)} item(s) failed ({e}); "
+                f"retrying them one at a time."
+            )
+            continue
+
+        for (index, conds, _, generator), speech_tokens in zip(group, token_sequences):
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            try:
+                with _global_rng_scope(generator):
+                    wav = decoding.tokens_to_wav(model, speech_tokens, conds.gen)
+                results[index] = {"audio": wav, "sample_rate": model.sr}
+            except Exception as e:
+                logger.warning(f"Batch item {index}: vocoding failed: {e}")
+                results[index] = {"error": str(e)}
+
+
+def generate_batch(
+    items: List[Dict[str, Any]],
+    cancel_token: Optional[CancellationToken] = None,
+    model_variant: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Synthesizes several independent texts together. Each item holds "text",
+    "voice_source_path" and its own temperature, exaggeration, cfg_weight,
+    seed and speed_factor. Request-scoped models decode the items in one
+    batched T3 pass (per CFG layout); others, and items whose batched decode
+    failed, fall back to `synthesize` one item at a time.
+
+    Returns:
+        One dict per item, in order: {"audio", "sample_rate"} on success or
+        {"error"} when that item failed. One item failing never fails the
+        others; only cancellation (GenerationCancelled) aborts the batch.
+    """
+    global last_request_time, cancelled_generations
+    last_request_time = time.time()
+
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+    if not ensure_loaded():
+        logger.error("Model could not be loaded or woken. Cannot generate audio.")
+        return [{"error": "Model could not be loaded"} for _ in items]
+
+    model = chatterbox_model
+    if model_variant:
+        model = variant_models.get(_variant_key(model_variant), chatterbox_model)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+
+    if _request_scoped_decoding:
+        autocast_ctx = (
+            torch.amp.autocast(_bf16_autocast_device, dtype=torch.bfloat16)
+            if _bf16_autocast_device is not None
+            else nullcontext()
+        )
+        try:
+            with autocast_ctx:
+                _synthesize_batch_request_scoped(model, items, results, cancel_token)
+        except GenerationCancelled as e:
+            cancelled_generations += 1
+            logger.info(f"Batch synthesis cancelled: {e}")
+            raise
+
+    for index, item in enumerate(items):
+        if results[index] is not None:
+            continue
+        wav, sample_rate = synthesize(
+            text=item["text"],
+            audio_prompt_path=item["voice_source_path"],
+            temperature=item["temperature"],
+            exaggeration=item["exaggeration"],
+            cfg_weight=item["cfg_weight"],
+            seed=item["seed"],
+            cancel_token=cancel_token,
+            model_variant=model_variant,
+        )
+        results[index] = (
+            {"audio": wav, "sample_rate": sample_rate}
+            if wav is not None
+            else {"error": "Audio generation failed"}
+        )
+
+    import utils
+
+    for item, result in zip(items, results):
+        if "audio" in result and item["speed_factor"] != 1.0:
+            result["audio"], result["sample_rate"] = utils.apply_speed_factor(
+                result["audio"], result["sample_rate"], item["speed_factor"]
+            )
+    return results
+
+
 def reload_model() -> bool:
     """
     Unloads the current model, clears GPU memory, and reloads the model
@@ -776,7 +2021,8 @@ def reload_model() -> bool:
         loaded_model_type, \
         loaded_model_class_name, \
         _model_on_cpu, \
-        _nf4_quantized_layers
+        _nf4_quantized_layers, \
+        spillover_scheduler
 
     logger.info("Initiating model hot-swap/reload sequence...")
 
@@ -785,6 +2031,16 @@ def reload_model() -> bool:
         logger.info("Unloading existing TTS model from memory...")
         del chatterbox_model
         chatterbox_model = None
+    variant_models.clear()
+    _speculative_drafts.clear()
+    component_registry.clear()
+    component_residency.clear()
+    voice_conditionals_cache.clear()
+    if spillover_scheduler is not None:
+        spillover_scheduler.shutdown()
+    spillover_scheduler = None
+    if spillover_gate is not None:
+        spillover_gate.set_extra_slots(0)
 
     # 2. Reset state flags
     MODEL_LOADED = False
@@ -0,0 +1,329 @@
+# File: jobs.py
+# Asynchronous long-form synthesis jobs. A job's text is chunked by sentences
+# and persisted under <paths.output>/jobs/<id>/: job.json holds the request and
+# progress, chunk_NNNN.wav each finished chunk. Chunks already on disk are
+# never synthesized again, so a restart resumes where the job stopped. Progress
+# and ETA come from the job's own measured RTF (or the shared cost model
+# before its first chunk finishes).
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import soundfile as sf
+
+from spillover import RtfCostModel
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+# (job, chunk_text, cancel_token) -> (1D float audio, sample_rate)
+ChunkSynthesizer = Callable[[Dict[str, Any], str, Any], Awaitable[Tuple[np.ndarray, int]]]
+
+
+class JobStore:
+    """Reads and writes job state and chunk audio under one directory."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def job_dir(self, job_id: str) -> Path:
+        return self.root / job_id
+
+    def chunk_path(self, job_id: str, index: int) -> Path:
+        return self.job_dir(job_id) / f"chunk_{index:04d}.wav"
+
+    def audio_path(self, job_id: str, output_format: str) -> Path:
+        return self.job_dir(job_id) / f"audio.{output_format}"
+
+    def save(self, job: Dict[str, Any]) -> None:
+        """Writes job.json atomically (a crash never leaves it half-written)."""
+        job_dir = self.job_dir(job["id"])
+        job_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = job_dir / "job.json.tmp"
+        tmp_path.write_text(json.dumps(job, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp_path, job_dir / "job.json")
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        if not job_id or "/" in job_id or "\\" in job_id or job_id.startswith("."):
+            return None
+        path = self.job_dir(job_id) / "job.json"
+        if not path.is_file():
+            return None
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable job file {path}: {e}")
+            return None
+
+    def load_all(self) -> List[Dict[str, Any]]:
+        jobs = [self.load(p.name) for p in self.root.iterdir() if p.is_dir()]
+        return sorted((j for j in jobs if j), key=lambda j: j["created_at"])
+
+    def write_chunk(self, job_id: str, index: int, audio: np.ndarray, sample_rate: int) -> None:
+        path = self.chunk_path(job_id, index)
+        tmp_path = path.with_suffix(".tmp.wav")
+        sf.write(str(tmp_path), audio, sample_rate, subtype="FLOAT")
+        os.replace(tmp_path, path)
+
+    def write_audio(self, job_id: str, output_format: str, data: bytes) -> None:
+        """Writes the encoded final audio atomically (never served half-written)."""
+        path = self.audio_path(job_id, output_format)
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def has_chunk(self, job_id: str, index: int) -> bool:
+        return self.chunk_path(job_id, index).is_file()
+
+    def read_audio(self, job: Dict[str, Any]) -> Tuple[np.ndarray, int]:
+        """Concatenates every chunk of a finished job."""
+        chunks = []
+        sample_rate = job.get("sample_rate")
+        for index in range(len(job["chunks"])):
+            audio, chunk_sample_rate = sf.read(
+                str(self.chunk_path(job["id"], index)), dtype="float32"
+            )
+            sample_rate = sample_rate or chunk_sample_rate
+            chunks.append(audio)
+        return np.concatenate(chunks), sample_rate
+
+
+class JobManager:
+    """
+    Runs jobs in submission order on `workers` background tasks, one chunk
+    at a time through `synthesize`, persisting after every chunk. Each
+    running job gets a cancel token from `token_factory` (anything with
+    `cancel(reason)`), triggered by `cancel`.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        synthesize: ChunkSynthesizer,
+        workers: int = 1,
+        prior_rtf: float = 0.5,
+        token_factory: Optional[Callable[[], Any]] = None,
+    ):
+        self.store = store
+        self.synthesize = synthesize
+        self.workers = max(1, workers)
+        self.token_factory = token_factory
+        self._tokens: Dict[str, Any] = {}  # Running job id -> cancel token
+        self._cancelling: set = set()  # Running job ids asked to stop
+        self.cost = RtfCostModel(prior_rtf)
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: List[str] = []  # Queued job ids, for queue_position
+        self._tasks: List[asyncio.Task] = []
+        self._audio_locks: Dict[str, asyncio.Lock] = {}  # Job id -> final encode in progress
+
+    async def start(self) -> None:
+        """Starts the workers and re-queues jobs interrupted by a restart."""
+        self._queue = asyncio.Queue()
+        resumed = 0
+        for job in self.store.load_all():
+            if job["status"] in (JOB_QUEUED, JOB_RUNNING):
+                job["status"] = JOB_QUEUED
+                self.store.save(job)
+                self._enqueue(job["id"])
+                resumed += 1
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(
+            f"Job manager started ({self.workers} worker(s), {resumed} job(s) resumed) "
+            f"in {self.store.root}."
+        )
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _enqueue(self, job_id: str) -> None:
+        self._pending.append(job_id)
+        self._queue.put_nowait(job_id)
+
+    def submit(self, text_chunks: List[str], request: Dict[str, Any]) -> Dict[str, Any]:
+        """Persists a new job and queues it. `request` holds voice, params and format."""
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": JOB_QUEUED,
+            "created_at": now,
+            "updated_at": now,
+            "request": request,
+            "chunks": text_chunks,
+            "chunks_done": 0,
+            "chars_done": 0,
+            "audio_sec": 0.0,
+            "compute_sec": 0.0,
+            "sample_rate": None,
+            "error": None,
+        }
+        self.store.save(job)
+        self._enqueue(job["id"])
+        logger.info(f"Job {job['id']} queued: {len(text_chunks)} chunk(s).")
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            if job_id in self._pending:
+                self._pending.remove(job_id)
+            job = self.store.load(job_id)
+            if job is None or job["status"] not in (JOB_QUEUED, JOB_RUNNING):
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        job["status"] = JOB_RUNNING
+        job["updated_at"] = time.time()
+        self.store.save(job)
+        token = self.token_factory() if self.token_factory is not None else None
+        self._tokens[job["id"]] = token
+        try:
+            for index, text in enumerate(job["chunks"]):
+                if job["id"] in self._cancelling:
+                    raise RuntimeError("cancelled")
+                if self.store.has_chunk(job["id"], index):
+                    continue
+                start_time = time.perf_counter()
+                audio, sample_rate = await self.synthesize(job, text, token)
+                elapsed = time.perf_counter() - start_time
+                await asyncio.to_thread(
+                    self.store.write_chunk, job["id"], index, audio, sample_rate
+                )
+                audio_sec = audio.size / sample_rate
+                self.cost.observe(len(text), audio_sec, elapsed)
+                job["chunks_done"] = index + 1
+                job["chars_done"] += len(text)
+                job["audio_sec"] += audio_sec
+                job["compute_sec"] += elapsed
+                job["sample_rate"] = job["sample_rate"] or sample_rate
+                job["updated_at"] = time.time()
+                self.store.save(job)
+            job["status"] = JOB_COMPLETED
+            logger.info(
+                f"Job {job['id']} completed: {job['audio_sec']:.1f}s of audio in "
+                f"{job['compute_sec']:.1f}s."
+            )
+        except asyncio.CancelledError:
+            raise  # Shutdown: stays running on disk and resumes on restart
+        except Exception as e:
+            if job["id"] in self._cancelling:
+                job["status"] = JOB_CANCELLED
+                job["error"] = "Cancelled by request"
+                logger.info(f"Job {job['id']} cancelled after {job['chunks_done']} chunk(s).")
+            else:
+                job["status"] = JOB_FAILED
+                job["error"] = getattr(e, "detail", None) or str(e)
+                logger.error(f"Job {job['id']} failed: {job['error']}", exc_info=True)
+        finally:
+            self._tokens.pop(job["id"], None)
+            self._cancelling.discard(job["id"])
+        job["waiting_for"] = None
+        job["updated_at"] = time.time()
+        self.store.save(job)
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cancels a queued or running job. A queued job is marked cancelled at
+        once; a running one stops at its next check (its token also stops the
+        chunk in progress). Finished jobs are returned unchanged; None if unknown.
+        """
+        job = self.store.load(job_id)
+        if job is None:
+            return None
+        if job_id in self._tokens:
+            self._cancelling.add(job_id)
+            token = self._tokens[job_id]
+            if token is not None:
+                token.cancel("job cancelled")
+        elif job["status"] == JOB_QUEUED:
+            if job_id in self._pending:
+                self._pending.remove(job_id)
+            job["status"] = JOB_CANCELLED
+            job["error"] = "Cancelled by request"
+            job["updated_at"] = time.time()
+            self.store.save(job)
+        return job
+
+    def delete(self, job_id: str) -> bool:
+        """Removes a job that is not running, with its chunks and audio."""
+        if job_id in self._tokens or self.store.load(job_id) is None:
+            return False
+        if job_id in self._pending:
+            self._pending.remove(job_id)  # Its worker finds no job.json and skips it
+        shutil.rmtree(self.store.job_dir(job_id), ignore_errors=True)
+        self._audio_locks.pop(job_id, None)
+        return True
+
+    def is_running(self, job_id: str) -> bool:
+        return job_id in self._tokens
+
+    def note_waiting(self, job: Dict[str, Any], reason: Optional[str]) -> None:
+        """Records (and persists) what a running job is waiting for, shown in its status."""
+        job["waiting_for"] = reason
+        job["updated_at"] = time.time()
+        self.store.save(job)
+
+    def audio_lock(self, job_id: str) -> asyncio.Lock:
+        """Serializes encoding of a job's final audio, so concurrent GETs encode once."""
+        return self._audio_locks.setdefault(job_id, asyncio.Lock())
+
+    def eta_sec(self, job: Dict[str, Any]) -> float:
+        """Remaining compute time: the job's measured RTF, else the shared cost model."""
+        remaining = [
+            text
+            for index, text in enumerate(job["chunks"])
+            if not self.store.has_chunk(job["id"], index)
+        ]
+        if job["chars_done"] > 0 and job["audio_sec"] > 0:
+            sec_per_char = job["compute_sec"] / job["chars_done"]
+            return sec_per_char * sum(len(text) for text in remaining)
+        return sum(self.cost.predict(len(text)) for text in remaining)
+
+    def status(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        total_chars = sum(len(text) for text in job["chunks"]) or 1
+        done = job["status"] == JOB_COMPLETED
+        status = {
+            "id": job["id"],
+            "status": job["status"],
+            "chunks_total": len(job["chunks"]),
+            "chunks_done": job["chunks_done"],
+            "percent_complete": 100.0 if done else round(100.0 * job["chars_done"] / total_chars, 1),
+            "eta_sec": 0.0 if done else round(self.eta_sec(job), 1),
+            "audio_sec": round(job["audio_sec"], 2),
+            "rtf": round(job["compute_sec"] / job["audio_sec"], 3) if job["audio_sec"] else None,
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"],
+            "error": job["error"],
+            "waiting_for": job.get("waiting_for"),
+        }
+        if job["id"] in self._pending:
+            status["queue_position"] = self._pending.index(job["id"]) + 1
+        return status
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": len(self._pending),
+            "rtf": round(self.cost.rtf, 3),
+            "cost_samples": self.cost.samples,
+        }
+
+
+# --- End File: jobs.py ---
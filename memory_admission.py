@@ -0,0 +1,346 @@
+# File: memory_admission.py
+# Predicts the peak memory of a synthesis request from its token counts and
+# gates admission against the device's free memory budget, so one oversized
+# input is queued, re-chunked or rejected instead of OOM-ing the process.
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+GIB = 1024**3
+
+
+class MemoryAdmissionError(Exception):
+    """Raised when a request cannot be admitted within the memory budget."""
+
+    def __init__(
+        self,
+        message: str,
+        estimated_bytes: int = 0,
+        budget_bytes: int = 0,
+        retryable: bool = False,
+    ):
+        super().__init__(message)
+        self.estimated_bytes = estimated_bytes
+        self.budget_bytes = budget_bytes
+        # True when the request would fit once other in-flight requests finish.
+        self.retryable = retryable
+
+
+def get_available_memory_bytes(device: str) -> Tuple[int, int]:
+    """
+    Returns (available_bytes, total_bytes) for the inference device.
+    On CUDA, memory held by PyTorch's caching allocator but not in use counts
+    as available. On CPU/MPS, MemAvailable from /proc/meminfo is used.
+    """
+    if device == "cuda" and torch.cuda.is_available():
+        free_bytes, total_bytes = torch.cuda.mem_get_info()
+        cached_unused = torch.cuda.memory_reserved() - torch.cuda.memory_allocated()
+        return int(free_bytes + max(0, cached_unused)), int(total_bytes)
+
+    try:
+        meminfo = {}
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                meminfo[key] = int(value.split()[0]) * 1024
+        return meminfo.get("MemAvailable", meminfo.get("MemFree", 0)), meminfo.get(
+            "MemTotal", 0
+        )
+    except (OSError, ValueError):
+        pass
+    try:
+        page_size = os.sysconf("SC_PAGE_SIZE")
+        return (
+            os.sysconf("SC_AVPHYS_PAGES") * page_size,
+            os.sysconf("SC_PHYS_PAGES") * page_size,
+        )
+    except (ValueError, OSError, AttributeError):
+        return 0, 0
+
+
+class MemoryEstimator:
+    """
+    Models request peak memory as:
+
+        peak = prefill(prefix_len) + rows * kv_bytes_per_token * (prefix_len + speech_tokens)
+               + vocoder(speech_tokens)
+
+    where `prefill` is quadratic in prefix length (attention scores) and
+    `vocoder` is linear in speech tokens. The KV term is derived analytically
+    from the backbone config; the prefill and vocoder terms are measured at
+    startup on CUDA and use conservative analytic defaults elsewhere.
+    """
+
+    def __init__(
+        self,
+        speech_tokens_per_char: float = 1.8,
+        max_speech_tokens: int = 1000,
+        safety_factor: float = 1.2,
+    ):
+        self.speech_tokens_per_char = speech_tokens_per_char
+        self.max_speech_tokens = max_speech_tokens
+        self.safety_factor = safety_factor
+
+        self.rows: int = 2  # Conditional + unconditional (CFG) rows
+        self.cond_prefix_tokens: int = 34
+        self.kv_bytes_per_token: int = 0
+        self.prefill_coeffs: Tuple[float, float, float] = (0.0, 0.0, 0.0)
+        self.vocoder_coeffs: Tuple[float, float] = (0.0, 0.0)
+        self.calibrated: bool = False
+        self.calibration_seconds: float = 0.0
+
+    def configure_from_model(self, model, dtype_bytes: int = 4):
+        """Derives the analytic KV-cache and activation terms from the backbone config."""
+        cfg = getattr(getattr(model.t3, "tfmr", None), "config", None)
+        if cfg is None:
+            cfg = getattr(model.t3, "cfg", None)
+        hidden = int(getattr(cfg, "hidden_size", 1024))
+        layers = int(getattr(cfg, "num_hidden_layers", 30))
+        heads = int(getattr(cfg, "num_attention_heads", 16))
+        kv_heads = int(getattr(cfg, "num_key_value_heads", heads) or heads)
+        head_dim = int(getattr(cfg, "head_dim", hidden // heads) or hidden // heads)
+        intermediate = int(getattr(cfg, "intermediate_size", 4 * hidden))
+
+        self.kv_bytes_per_token = layers * 2 * kv_heads * head_dim * dtype_bytes
+        # Analytic fallback: a layer's MLP/hidden activations are linear in
+        # prefix length, attention scores are quadratic.
+        self.prefill_coeffs = (
+            64 * 1024**2,
+            float(self.rows * (hidden * 4 + intermediate * 2) * dtype_bytes),
+            float(self.rows * heads * dtype_bytes * 2),
+        )
+        # HiFiGAN-style vocoders upsample each 40 ms token to ~960 samples with
+        # hundreds of channels; ~2 MiB per token is a conservative default.
+        self.vocoder_coeffs = (128 * 1024**2, 2.0 * 1024**2)
+
+    def measure_cond_prefix(self, model, t3_cond, prepare_input_embeds):
+        """
+        Measures how many prefix positions the voice conditioning adds, by
+        embedding a one-token text and subtracting the text/BOS positions.
+        """
+        try:
+            hp = model.t3.hp
+            text_tokens = torch.tensor(
+                [[hp.start_text_token, hp.stop_text_token]] * self.rows,
+                dtype=torch.long,
+                device=model.device,
+            )
+            speech_tokens = torch.full(
+                (self.rows, 1), hp.start_speech_token, dtype=torch.long, device=model.device
+            )
+            with torch.inference_mode():
+                embeds = prepare_input_embeds(
+                    model.t3, t3_cond, text_tokens, speech_tokens, 0.5
+                )
+            self.cond_prefix_tokens = int(embeds.size(1)) - text_tokens.size(1) - 1
+        except Exception as e:
+            logger.debug(f"Could not measure conditioning prefix length: {e}")
+
+    def calibrate(self, model, device: str, autocast_device: Optional[str] = None):
+        """
+        Measures prefill and vocoder peak memory on CUDA at a few sizes and fits
+        the estimator's coefficients. No-op (analytic defaults kept) elsewhere.
+        """
+        if device != "cuda" or not torch.cuda.is_available():
+            logger.info("Memory estimator: using analytic defaults (no CUDA allocator stats).")
+            return
+        start_time = time.perf_counter()
+        autocast_ctx = (
+            torch.amp.autocast(autocast_device, dtype=torch.bfloat16)
+            if autocast_device
+            else nullcontext()
+        )
+        t3 = model.t3
+        hidden = t3.tfmr.config.hidden_size
+        dtype = next(t3.tfmr.parameters()).dtype
+
+        def _peak_delta(fn) -> int:
+            torch.cuda.synchronize()
+            baseline = torch.cuda.memory_allocated()
+            torch.cuda.reset_peak_memory_stats()
+            fn()
+            torch.cuda.synchronize()
+            return int(torch.cuda.max_memory_allocated() - baseline)
+
+        try:
+            with torch.inference_mode(), autocast_ctx:
+                lengths = [64, 256, 512]
+                peaks = []
+                for length in lengths:
+                    embeds = torch.zeros(
+                        (self.rows, length, hidden), dtype=dtype, device="cuda"
+                    )
+                    peaks.append(
+                        _peak_delta(
+                            lambda: t3.tfmr(
+                                inputs_embeds=embeds, use_cache=True, return_dict=True
+                            )
+                        )
+                    )
+                    del embeds
+                design = np.array([[1.0, n, n * n] for n in lengths])
+                self.prefill_coeffs = tuple(
+                    float(c) for c in np.linalg.lstsq(design, np.array(peaks), rcond=None)[0]
+                )
+
+                conds = getattr(model, "conds", None)
+                if conds is not None:
+                    token_counts = [50, 200]
+                    vocoder_peaks = []
+                    for count in token_counts:
+                        tokens = torch.randint(0, 4096, (count,), device="cuda")
+                        vocoder_peaks.append(
+                            _peak_delta(
+                                lambda: model.s3gen.inference(
+                                    speech_tokens=tokens, ref_dict=conds.gen
+                                )
+                            )
+                        )
+                    slope = (vocoder_peaks[1] - vocoder_peaks[0]) / (
+                        token_counts[1] - token_counts[0]
+                    )
+                    self.vocoder_coeffs = (
+                        float(max(0.0, vocoder_peaks[0] - slope * token_counts[0])),
+                        float(max(0.0, slope)),
+                    )
+            self.calibrated = True
+        except Exception as e:
+            logger.warning(f"Memory estimator calibration failed, using analytic defaults: {e}")
+        finally:
+            torch.cuda.empty_cache()
+        self.calibration_seconds = time.perf_counter() - start_time
+        logger.info(
+            f"Memory estimator calibrated in {self.calibration_seconds:.2f}s "
+            f"(prefill={self.prefill_coeffs}, vocoder={self.vocoder_coeffs})."
+        )
+
+    def estimate(self, text_tokens: int, text_chars: int, batch: int = 1) -> Dict[str, int]:
+        """
+        Returns a breakdown and the safety-scaled peak estimate in bytes.
+        `batch` candidates decoded together scale prefill and KV; they are
+        vocoded one at a time, so the vocoder term does not scale.
+        """
+        # Conditioning + text (with start/stop tokens) + the two BOS positions.
+        prefix_len = self.cond_prefix_tokens + text_tokens + 2 + 2
+        speech_tokens = min(
+            self.max_speech_tokens, int(text_chars * self.speech_tokens_per_char) + 1
+        )
+        c0, c1, c2 = self.prefill_coeffs
+        prefill = (c0 + c1 * prefix_len + c2 * prefix_len * prefix_len) * batch
+        kv = batch * self.rows * self.kv_bytes_per_token * (prefix_len + speech_tokens)
+        v0, v1 = self.vocoder_coeffs
+        vocoder = v0 + v1 * speech_tokens
+        # Decoding and vocoding do not overlap; the KV cache is freed before vocoding.
+        peak = max(prefill + kv, vocoder) * self.safety_factor
+        return {
+            "prefix_tokens": prefix_len,
+            "speech_tokens": speech_tokens,
+            "prefill_bytes": int(prefill),
+            "kv_bytes": int(kv),
+            "vocoder_bytes": int(vocoder),
+            "peak_bytes": int(peak),
+        }
+
+    def get_stats(self) -> dict:
+        return {
+            "calibrated": self.calibrated,
+            "calibration_seconds": round(self.calibration_seconds, 3),
+            "kv_bytes_per_token": self.kv_bytes_per_token,
+            "cond_prefix_tokens": self.cond_prefix_tokens,
+            "prefill_coeffs": [round(c, 3) for c in self.prefill_coeffs],
+            "vocoder_coeffs": [round(c, 3) for c in self.vocoder_coeffs],
+            "speech_tokens_per_char": self.speech_tokens_per_char,
+            "safety_factor": self.safety_factor,
+        }
+
+
+class MemoryAdmissionController:
+    """
+    Tracks memory reserved by in-flight requests against a fixed budget.
+    Requests that would fit on an idle device wait (up to a timeout) for
+    reservations to be released; requests that could never fit are rejected.
+    """
+
+    def __init__(self, budget_bytes: int, queue_timeout_sec: float = 30.0):
+        self.budget_bytes = int(budget_bytes)
+        self.queue_timeout_sec = queue_timeout_sec
+        self._reserved_bytes = 0
+        self._in_flight = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.rechunked = 0
+
+    def fits(self, estimated_bytes: int) -> bool:
+        """True when the request could run on an otherwise idle device."""
+        return estimated_bytes <= self.budget_bytes
+
+    @contextmanager
+    def reserve(self, estimated_bytes: int):
+        """Blocks until `estimated_bytes` fit in the budget, then holds them."""
+        if not self.fits(estimated_bytes):
+            self.rejected += 1
+            raise MemoryAdmissionError(
+                f"Estimated peak memory {estimated_bytes / GIB:.2f} GiB exceeds the "
+                f"memory budget of {self.budget_bytes / GIB:.2f} GiB. "
+                f"Shorten the input or enable text splitting.",
+                estimated_bytes,
+                self.budget_bytes,
+            )
+        deadline = time.monotonic() + self.queue_timeout_sec
+        with self._cond:
+            if self._reserved_bytes + estimated_bytes > self.budget_bytes:
+                self.queued += 1
+                self._waiting += 1
+                try:
+                    while self._reserved_bytes + estimated_bytes > self.budget_bytes:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.rejected += 1
+                            raise MemoryAdmissionError(
+                                f"Timed out after {self.queue_timeout_sec:.0f}s waiting for "
+                                f"{estimated_bytes / GIB:.2f} GiB of memory to free up.",
+                                estimated_bytes,
+                                self.budget_bytes,
+                                retryable=True,
+                            )
+                        self._cond.wait(timeout=remaining)
+                finally:
+                    self._waiting -= 1
+            self._reserved_bytes += estimated_bytes
+            self._in_flight += 1
+            self.admitted += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._reserved_bytes -= estimated_bytes
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            return {
+                "budget_bytes": self.budget_bytes,
+                "reserved_bytes": self._reserved_bytes,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected": self.rejected,
+                "rechunked": self.rechunked,
+            }
+
+
+# --- End File: memory_admission.py ---
@@ -0,0 +1,226 @@
+# File: model_resolver.py
+# Resolves a model selector to a local snapshot directory without touching the
+# Hugging Face hub, and verifies the snapshot's files against an integrity
+# manifest before loading, so restarts skip hub metadata calls and air-gapped
+# nodes fail fast on an incomplete cache instead of stalling.
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Files ChatterboxTTS.from_local reads; conds.pt (default voice) is optional.
+CHATTERBOX_REQUIRED_FILES = [
+    "ve.safetensors",
+    "t3_cfg.safetensors",
+    "s3gen.safetensors",
+    "tokenizer.json",
+]
+CHATTERBOX_OPTIONAL_FILES = ["conds.pt"]
+
+_SHA256_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+_HASH_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+class SnapshotIntegrityError(Exception):
+    """Raised when a local snapshot is missing files or fails verification."""
+
+    def __init__(self, message: str, problems: Optional[List[str]] = None):
+        super().__init__(message)
+        self.problems = problems or []
+
+
+def hub_cache_dir() -> Path:
+    """Returns the hub cache directory, honouring HF_HUB_CACHE and HF_HOME."""
+    try:
+        from huggingface_hub import constants
+
+        return Path(constants.HF_HUB_CACHE)
+    except Exception:
+        if os.environ.get("HF_HUB_CACHE"):
+            return Path(os.environ["HF_HUB_CACHE"])
+        hf_home = os.environ.get("HF_HOME", str(Path.home() / ".cache" / "huggingface"))
+        return Path(hf_home) / "hub"
+
+
+def find_snapshot(repo_id: str, revision: str = "main", cache_dir: Optional[Path] = None) -> Optional[Path]:
+    """
+    Locates a cached snapshot for `repo_id` using only the local cache layout
+    (models--org--name/refs/<revision> -> snapshots/<commit>). A revision that
+    is already a commit hash is used directly. Returns None if neither the ref
+    nor the commit is cached; another cached revision is never substituted.
+    """
+    repo_dir = (cache_dir or hub_cache_dir()) / f"models--{repo_id.replace('/', '--')}"
+    if not repo_dir.is_dir():
+        return None
+    commit = revision
+    ref_file = repo_dir / "refs" / revision
+    if ref_file.is_file():
+        commit = ref_file.read_text(encoding="utf-8").strip()
+    snapshot = repo_dir / "snapshots" / commit
+    return snapshot if snapshot.is_dir() else None
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _blob_path(path: Path) -> Optional[Path]:
+    """The blob a hub snapshot symlink points to, or None for a plain file."""
+    if not path.is_symlink():
+        return None
+    target = Path(os.readlink(path))
+    return target if target.is_absolute() else (path.parent / target)
+
+
+def _lfs_sha256(path: Path) -> Optional[str]:
+    """The sha256 the hub recorded for an LFS file (its blob name), if known."""
+    if path.is_symlink():
+        blob_name = Path(os.readlink(path)).name
+        if _SHA256_PATTERN.match(blob_name):
+            return blob_name
+    return None
+
+
+class SnapshotVerifier:
+    """
+    Checks a snapshot against a JSON manifest of file sizes and sha256 hashes.
+
+    The first verification hashes every file. LFS files are compared with the
+    sha256 the hub recorded as their blob name. The result is written to
+    `manifest_dir`, keyed by the snapshot's resolved path. Later loads compare
+    sizes against the manifest (fast) and only rehash when `full=True` or a
+    size changed. Stored hashes are enforced only for `immutable` snapshots
+    (hub commits); a plain directory may be edited, so its manifest is
+    refreshed instead.
+    """
+
+    def __init__(self, manifest_dir: Path):
+        self.manifest_dir = manifest_dir
+
+    def _manifest_path(self, snapshot: Path) -> Path:
+        # Keyed by resolved path: two local checkpoints with the same folder
+        # names never share a manifest.
+        resolved = str(snapshot.expanduser().resolve())
+        key = hashlib.sha256(resolved.encode("utf-8")).hexdigest()[:16]
+        return self.manifest_dir / f"{snapshot.name}-{key}.json"
+
+    def verify(
+        self,
+        snapshot: Path,
+        required: Optional[List[str]],
+        optional: Optional[List[str]] = None,
+        full: bool = False,
+        immutable: bool = True,
+    ) -> Dict[str, Dict]:
+        """
+        Raises SnapshotIntegrityError listing every problem found. With
+        `required=None` (layout unknown) every file in the snapshot is
+        checked, which still catches dangling links and interrupted downloads.
+        """
+        start_time = time.perf_counter()
+        problems = []
+        if required is None:
+            required = sorted(
+                p.name for p in snapshot.iterdir() if p.is_file() or p.is_symlink()
+            )
+            if not required:
+                problems.append("snapshot directory is empty")
+        for name in required:
+            path = snapshot / name
+            if not path.exists():  # Also catches symlinks to missing blobs
+                problems.append(f"missing: {name}")
+        # Only the blobs this snapshot links to; other downloads in the same
+        # repo cache are not our concern.
+        for name in required + list(optional or []):
+            blob = _blob_path(snapshot / name)
+            if blob is not None and Path(f"{blob}.incomplete").exists():
+                problems.append(f"interrupted download: {name}")
+        if problems:
+            raise SnapshotIntegrityError(
+                f"Snapshot {snapshot} is incomplete: {'; '.join(problems)}", problems
+            )
+
+        files = [n for n in required + list(optional or []) if (snapshot / n).exists()]
+        manifest_path = self._manifest_path(snapshot)
+        manifest: Dict[str, Dict] = {}
+        if manifest_path.is_file():
+            try:
+                manifest = json.loads(manifest_path.read_text(encoding="utf-8")).get("files", {})
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable integrity manifest {manifest_path}: {e}")
+
+        updated = False
+        for name in files:
+            path = snapshot / name
+            size = path.stat().st_size
+            if size == 0:
+                problems.append(f"empty: {name}")
+                continue
+            entry = manifest.get(name)
+            if entry and entry.get("size") == size and not full:
+                continue
+            digest = _sha256(path)
+            expected = _lfs_sha256(path) or (
+                (entry or {}).get("sha256") if immutable else None
+            )
+            if expected and digest != expected:
+                problems.append(f"sha256 mismatch: {name}")
+                continue
+            manifest[name] = {"size": size, "sha256": digest}
+            updated = True
+        if problems:
+            raise SnapshotIntegrityError(
+                f"Snapshot {snapshot} failed verification: {'; '.join(problems)}", problems
+            )
+
+        if updated:
+            try:
+                self.manifest_dir.mkdir(parents=True, exist_ok=True)
+                manifest_path.write_text(
+                    json.dumps({"snapshot": str(snapshot), "files": manifest}, indent=2),
+                    encoding="utf-8",
+                )
+            except Exception as e:
+                logger.warning(f"Could not write integrity manifest {manifest_path}: {e}")
+        logger.info(
+            f"Snapshot {snapshot.name[:12]} verified ({len(files)} files"
+            f"{', hashed' if updated else ''}) in {time.perf_counter() - start_time:.2f}s."
+        )
+        return manifest
+
+
+def resolve_local_snapshot(
+    repo_id: str,
+    revision: str,
+    verifier: SnapshotVerifier,
+    required: Optional[List[str]],
+    optional: Optional[List[str]] = None,
+    full_verify: bool = False,
+) -> Optional[Path]:
+    """
+    Returns a verified local directory for `repo_id`: the path itself if it is
+    a directory, otherwise its cached hub snapshot. Returns None if nothing is
+    cached; raises SnapshotIntegrityError if the local copy is incomplete.
+    """
+    local = Path(repo_id).expanduser()
+    snapshot = local if local.is_dir() else find_snapshot(repo_id, revision)
+    if snapshot is None:
+        return None
+    verifier.verify(
+        snapshot, required, optional, full=full_verify, immutable=not local.is_dir()
+    )
+    return snapshot
+
+
+# --- End File: model_resolver.py ---
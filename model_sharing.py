@@ -0,0 +1,163 @@
+# File: model_sharing.py
+# Deduplicates components across resident model variants. Each configured
+# component (VoiceEncoder, S3Gen, T3 embeddings/heads, ...) is fingerprinted by
+# hashing its tensors; a variant whose component matches one already resident
+# is pointed at that instance instead of keeping its own copy.
+
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+from torch import nn
+
+logger = logging.getLogger(__name__)
+
+# Attribute paths (relative to the ChatterboxTTS object) considered for sharing.
+# A LoRA fine-tune usually only changes `t3.tfmr`, so everything else matches.
+DEFAULT_SHARED_COMPONENTS = [
+    "ve",
+    "s3gen",
+    "tokenizer",
+    "t3.cond_enc",
+    "t3.text_emb",
+    "t3.speech_emb",
+    "t3.text_pos_emb",
+    "t3.speech_pos_emb",
+    "t3.text_head",
+    "t3.speech_head",
+    "t3.tfmr",
+]
+
+
+def get_component(obj: Any, path: str) -> Any:
+    """Resolves a dotted attribute path such as 's3gen.tokenizer', or None."""
+    for attr in path.split("."):
+        obj = getattr(obj, attr, None)
+        if obj is None:
+            return None
+    return obj
+
+
+def set_component(obj: Any, path: str, value: Any) -> None:
+    """Replaces the object at a dotted attribute path."""
+    parent_path, _, attr = path.rpartition(".")
+    parent = get_component(obj, parent_path) if parent_path else obj
+    setattr(parent, attr, value)
+
+
+def module_nbytes(module: nn.Module) -> int:
+    """Bytes held by a module's parameters and buffers (each tensor counted once)."""
+    seen = set()
+    total = 0
+    for tensor in list(module.parameters()) + list(module.buffers()):
+        if id(tensor) in seen:
+            continue
+        seen.add(id(tensor))
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def hash_component(component: Any) -> Optional[str]:
+    """
+    Returns a content fingerprint of a model component, or None if it cannot
+    be hashed. Modules hash every state_dict entry (name, dtype, shape and raw
+    bytes); text tokenizers hash their serialized vocabulary.
+    """
+    digest = hashlib.sha256()
+    if isinstance(component, nn.Module):
+        digest.update(type(component).__name__.encode())
+        for name, tensor in component.state_dict().items():
+            if not isinstance(tensor, torch.Tensor):
+                continue
+            digest.update(f"{name}|{tensor.dtype}|{tuple(tensor.shape)}".encode())
+            raw = tensor.detach().contiguous().reshape(-1).view(torch.uint8)
+            digest.update(raw.cpu().numpy().tobytes())
+        return digest.hexdigest()
+
+    inner = getattr(component, "tokenizer", None)
+    if inner is not None and hasattr(inner, "to_str"):
+        digest.update(type(component).__name__.encode())
+        digest.update(inner.to_str().encode("utf-8"))
+        return digest.hexdigest()
+    return None
+
+
+class ComponentShareRegistry:
+    """
+    Tracks the canonical instance of every component fingerprint seen so far.
+    `register` hashes a variant's components and swaps in canonical instances
+    for any that match, so identical weights are resident only once.
+    """
+
+    def __init__(self, component_paths: Optional[List[str]] = None):
+        self.component_paths = list(component_paths or DEFAULT_SHARED_COMPONENTS)
+        self._canonical: Dict[Tuple[str, str], Any] = {}  # (path, hash) -> instance
+        self._owner: Dict[Tuple[str, str], str] = {}  # (path, hash) -> variant name
+        self._variants: Dict[str, Dict[str, Any]] = {}
+        self.bytes_saved = 0
+        self._lock = threading.Lock()
+
+    def register(self, variant: str, model: Any) -> int:
+        """
+        Deduplicates `model`'s components against previously registered variants.
+        Returns the number of bytes saved by this variant.
+        """
+        shared, unique = [], []
+        saved = 0
+        with self._lock:
+            for path in self.component_paths:
+                component = get_component(model, path)
+                if component is None:
+                    continue
+                try:
+                    fingerprint = hash_component(component)
+                except Exception as e:
+                    logger.warning(f"Could not hash component '{path}' of '{variant}': {e}")
+                    fingerprint = None
+                if fingerprint is None:
+                    continue
+                key = (path, fingerprint)
+                canonical = self._canonical.get(key)
+                if canonical is None:
+                    self._canonical[key] = component
+                    self._owner[key] = variant
+                    unique.append(path)
+                    continue
+                if canonical is not component:
+                    set_component(model, path, canonical)
+                    if isinstance(component, nn.Module):
+                        saved += module_nbytes(component)
+                shared.append({"component": path, "with": self._owner[key]})
+            self._variants[variant] = {
+                "shared": shared,
+                "unique": unique,
+                "bytes_saved": saved,
+            }
+            self.bytes_saved += saved
+
+        if shared:
+            logger.info(
+                f"Model variant '{variant}' shares {len(shared)} component(s) "
+                f"({saved / 1024**2:.1f} MiB saved): {[s['component'] for s in shared]}"
+            )
+        return saved
+
+    def clear(self) -> None:
+        with self._lock:
+            self._canonical.clear()
+            self._owner.clear()
+            self._variants.clear()
+            self.bytes_saved = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "variants": dict(self._variants),
+                "bytes_saved": self.bytes_saved,
+                "mib_saved": round(self.bytes_saved / 1024**2, 1),
+            }
+
+
+# --- End File: model_sharing.py ---
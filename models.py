@@ -1,9 +1,12 @@
 # File: models.py
 # Pydantic models for API request and response validation.
 
-from typing import Optional, Literal
+from typing import List, Optional, Literal
 from pydantic import BaseModel, Field
 
+# Output formats accepted by every endpoint (see utils.AUDIO_MEDIA_TYPES).
+AudioFormat = Literal["wav", "opus", "mp3", "pcm", "flac", "mulaw", "alaw"]
+
 
 class GenerationParams(BaseModel):
     """Common parameters for TTS generation."""
@@ -61,8 +64,9 @@ class CustomTTSRequest(BaseModel):
         description="Filename of a user-uploaded reference audio for voice cloning. Required if voice_mode is 'clone'.",
     )
 
-    output_format: Optional[Literal["wav", "opus", "mp3"]] = Field(  # Added "mp3"
-        "wav", description="Desired audio output format."  # Default output format
+    output_format: Optional[AudioFormat] = Field(
+        "wav",  # Default output format
+        description="Desired audio output format. pcm: raw int16 LE; mulaw/alaw: raw 8 kHz G.711.",
     )
 
     split_text: Optional[bool] = Field(
@@ -93,6 +97,128 @@ class CustomTTSRequest(BaseModel):
     language: Optional[str] = Field(
         None, description="Overrides default language if provided."
     )
+    model: Optional[str] = Field(
+        None,
+        description="Resident model variant to use (see model.resident_variants). Defaults to the primary model.",
+    )
+    n_candidates: Optional[int] = Field(
+        1,
+        ge=1,
+        le=8,
+        description="Best-of-N: number of takes generated per chunk in one batched pass, ranked by quality heuristics (1-8).",
+    )
+    stream: Optional[bool] = Field(
+        None,
+        description="Send audio progressively, one chunk at a time as it is synthesized. Defaults to audio_output.stream_by_default.",
+    )
+    priority: Optional[Literal["interactive", "default", "bulk"]] = Field(
+        None,
+        description="Scheduling class. Defaults to the API key's class (server.priority); cannot exceed it.",
+    )
+    coalesce: Optional[bool] = Field(
+        None,
+        description="Share one generation with identical concurrent requests. Default: only with a fixed (non-zero) seed; true also with a random seed; false never.",
+    )
+    return_candidates: Optional[Literal["best", "all"]] = Field(
+        "best",
+        description="With n_candidates > 1: 'best' returns the top-scoring audio, 'all' returns every take with its scores as JSON.",
+    )
+
+
+class WebSocketTTSConfig(GenerationParams):
+    """Settings sent in the `start` message of the /ws/tts WebSocket."""
+
+    voice_mode: Literal["predefined", "clone"] = Field(
+        "predefined",
+        description="Voice mode: 'predefined' for a built-in voice, 'clone' for a reference audio file.",
+    )
+    predefined_voice_id: Optional[str] = Field(
+        None, description="Predefined voice filename. Required if voice_mode is 'predefined'."
+    )
+    reference_audio_filename: Optional[str] = Field(
+        None, description="Reference audio filename. Required if voice_mode is 'clone'."
+    )
+    output_format: AudioFormat = Field(
+        "wav", description="Format of the binary audio frames (one continuous stream per connection)."
+    )
+    model: Optional[str] = Field(
+        None, description="Resident model variant to use. Defaults to the primary model."
+    )
+    max_sentence_chars: int = Field(
+        300,
+        ge=50,
+        le=1000,
+        description="Unpunctuated text longer than this is synthesized without waiting for a sentence end.",
+    )
+
+
+class JobRequest(GenerationParams):
+    """Request model for POST /jobs (asynchronous long-form synthesis)."""
+
+    text: str = Field(..., min_length=1, description="Text to be synthesized (article, chapter, ...).")
+    voice_mode: Literal["predefined", "clone"] = Field(
+        "predefined",
+        description="Voice mode: 'predefined' for a built-in voice, 'clone' for a reference audio file.",
+    )
+    predefined_voice_id: Optional[str] = Field(
+        None, description="Predefined voice filename. Required if voice_mode is 'predefined'."
+    )
+    reference_audio_filename: Optional[str] = Field(
+        None, description="Reference audio filename. Required if voice_mode is 'clone'."
+    )
+    output_format: AudioFormat = Field(
+        "wav", description="Format of the finished audio returned by GET /jobs/{id}/audio."
+    )
+    chunk_size: Optional[int] = Field(
+        None,
+        ge=50,
+        le=500,
+        description="Target chunk length for sentence chunking. Defaults to server.jobs.chunk_size.",
+    )
+    model: Optional[str] = Field(
+        None, description="Resident model variant to use. Defaults to the primary model."
+    )
+
+
+class BatchTTSItem(GenerationParams):
+    """One text of a POST /tts/batch request."""
+
+    id: Optional[str] = Field(
+        None,
+        pattern=r"^[A-Za-z0-9._-]{1,128}$",
+        description="Caller's identifier, echoed in the result (and used as the ZIP entry name). Defaults to the item's index.",
+    )
+    text: str = Field(..., min_length=1, description="Text to be synthesized (short; see server.batch.max_item_chars).")
+    voice_mode: Literal["predefined", "clone"] = Field(
+        "predefined",
+        description="Voice mode: 'predefined' for a built-in voice, 'clone' for a reference audio file.",
+    )
+    predefined_voice_id: Optional[str] = Field(
+        None, description="Predefined voice filename. Required if voice_mode is 'predefined'."
+    )
+    reference_audio_filename: Optional[str] = Field(
+        None, description="Reference audio filename. Required if voice_mode is 'clone'."
+    )
+
+
+class BatchTTSRequest(BaseModel):
+    """Request model for POST /tts/batch (many short texts in one call)."""
+
+    items: List[BatchTTSItem] = Field(
+        ..., min_length=1, description="Texts to synthesize, each with its own voice and parameters."
+    )
+    output_format: AudioFormat = Field("wav", description="Audio format of every item.")
+    response_mode: Literal["ndjson", "zip"] = Field(
+        "ndjson",
+        description="'ndjson' streams one JSON line per item (base64 audio) as items finish; 'zip' returns one archive with a results.json manifest.",
+    )
+    model: Optional[str] = Field(
+        None, description="Resident model variant to use. Defaults to the primary model."
+    )
+    priority: Optional[Literal["interactive", "default", "bulk"]] = Field(
+        None,
+        description="Scheduling class. Defaults to the API key's class (server.priority); cannot exceed it.",
+    )
 
 
 class ErrorResponse(BaseModel):
@@ -0,0 +1,310 @@
+# File: paged_kv.py
+# Block-based (paged) KV-cache storage for the T3 backbone. A fixed pool of
+# equal-sized blocks is allocated once; each sequence holds a block table per
+# CFG row and grows one block at a time, so concurrent variable-length
+# generations share memory without reserving max length up front and
+# without fragmenting the allocator. Blocks return to the pool when the
+# sequence completes, is cancelled, or is cropped (speculative rejection).
+
+import itertools
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+try:
+    from transformers.cache_utils import DynamicCache
+except ImportError:  # Very old transformers: paged cache unavailable
+    DynamicCache = object
+
+
+class KVCachePoolExhausted(RuntimeError):
+    """Raised when a sequence needs a block and the pool has none free."""
+
+
+class KVBlockPool:
+    """
+    Fixed pool of KV blocks shared by all sequences.
+
+    Storage is allocated lazily on the first write, because the layer count,
+    head shape and dtype are only known once the backbone runs. The number of
+    blocks is derived from `pool_bytes`. Each block holds `block_size` token
+    positions for every layer, for keys and values.
+    """
+
+    def __init__(self, pool_bytes: int, block_size: int = 16):
+        self.pool_bytes = pool_bytes
+        self.block_size = block_size
+        self.keys: Optional[torch.Tensor] = None  # (layers, blocks, heads, block_size, head_dim)
+        self.values: Optional[torch.Tensor] = None
+        self.num_blocks = 0
+        self._free: List[int] = []
+        self._held: Dict[int, int] = {}  # owner -> blocks held
+        self._tokens: Dict[int, int] = {}  # owner -> token slots in use (all rows)
+        self._lock = threading.Lock()
+        self._release_pending = False  # Free storage once the last block returns
+        self.peak_used_blocks = 0
+        self.alloc_failures = 0
+        self.sequences_served = 0
+
+    def ensure_storage(
+        self, num_layers: int, num_heads: int, head_dim: int, dtype, device
+    ) -> bool:
+        """Allocates the pool for this shape; False if it exists with another shape."""
+        with self._lock:
+            if self.keys is not None:
+                return tuple(self.keys.shape[i] for i in (0, 2, 4)) == (
+                    num_layers,
+                    num_heads,
+                    head_dim,
+                ) and self.keys.device == torch.device(device)
+            element_size = torch.empty((), dtype=dtype).element_size()
+            block_bytes = 2 * num_layers * num_heads * self.block_size * head_dim * element_size
+            self.num_blocks = max(1, self.pool_bytes // block_bytes)
+            shape = (num_layers, self.num_blocks, num_heads, self.block_size, head_dim)
+            self.keys = torch.empty(shape, dtype=dtype, device=device)
+            self.values = torch.empty(shape, dtype=dtype, device=device)
+            self._free = list(range(self.num_blocks - 1, -1, -1))
+            logger.info(
+                f"Paged KV pool: {self.num_blocks} blocks x {self.block_size} tokens "
+                f"({self.num_blocks * block_bytes / 1024**2:.0f} MiB, {dtype}, {device})."
+            )
+            return True
+
+    def release_storage(self) -> bool:
+        """
+        Frees the pool tensors (re-created on next use). If sequences still
+        hold blocks, the tensors are freed when the last one is returned and
+        this returns False.
+        """
+        with self._lock:
+            if self.keys is None:
+                return False
+            if self._held:
+                self._release_pending = True
+                return False
+            self._drop_storage()
+            return True
+
+    def _drop_storage(self) -> None:
+        self.keys = self.values = None
+        self.num_blocks = 0
+        self._free = []
+        self._release_pending = False
+
+    def allocate(self, owner: int, count: int) -> List[int]:
+        with self._lock:
+            if count > len(self._free):
+                self.alloc_failures += 1
+                raise KVCachePoolExhausted(
+                    f"KV pool exhausted: need {count} block(s), {len(self._free)} free "
+                    f"of {self.num_blocks}."
+                )
+            blocks = [self._free.pop() for _ in range(count)]
+            if owner not in self._held:
+                self.sequences_served += 1
+            self._held[owner] = self._held.get(owner, 0) + count
+            used = self.num_blocks - len(self._free)
+            self.peak_used_blocks = max(self.peak_used_blocks, used)
+            return blocks
+
+    def free(self, owner: int, blocks: List[int]) -> None:
+        if not blocks:
+            return
+        with self._lock:
+            self._free.extend(blocks)
+            remaining = self._held.get(owner, 0) - len(blocks)
+            if remaining > 0:
+                self._held[owner] = remaining
+            else:
+                self._held.pop(owner, None)
+                self._tokens.pop(owner, None)
+                if self._release_pending and not self._held:
+                    self._drop_storage()
+
+    def set_tokens(self, owner: int, tokens: int) -> None:
+        with self._lock:
+            if owner in self._held:
+                self._tokens[owner] = tokens
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            used = self.num_blocks - len(self._free)
+            slots = used * self.block_size
+            tokens = sum(self._tokens.values())
+            return {
+                "block_size": self.block_size,
+                "pool_mib": round(self.pool_bytes / 1024**2, 1),
+                "allocated": self.keys is not None,
+                "total_blocks": self.num_blocks,
+                "used_blocks": used,
+                "free_blocks": len(self._free),
+                "utilization": round(used / self.num_blocks, 4) if self.num_blocks else 0.0,
+                "peak_used_blocks": self.peak_used_blocks,
+                "active_sequences": len(self._held),
+                "sequences_served": self.sequences_served,
+                # Unused slots in partially filled tail blocks
+                "internal_fragmentation": round(1 - tokens / slots, 4) if slots else 0.0,
+                "alloc_failures": self.alloc_failures,
+            }
+
+
+_owner_ids = itertools.count(1)
+
+
+class PagedKVCache(DynamicCache):
+    """
+    Per-sequence KV cache whose storage lives in a KVBlockPool.
+
+    Implements the DynamicCache interface the Llama backbone uses (`update`,
+    `get_seq_length`, `crop`, ...). New keys/values are written into the
+    sequence's blocks. Attention receives a contiguous gather of its blocks,
+    so stock attention kernels work unchanged. Call `release()` (idempotent)
+    when the sequence ends to return its blocks.
+    """
+
+    def __init__(self, pool: KVBlockPool, num_layers: int):
+        super().__init__()
+        self.pool = pool
+        self.num_layers = num_layers
+        self.owner = next(_owner_ids)
+        self._block_tables: List[List[int]] = []  # One per batch row (CFG cond/uncond)
+        self._table_tensor: Optional[torch.Tensor] = None
+        self._layer_lengths: List[int] = []
+        self._released = False
+
+    # --- block management -------------------------------------------------
+
+    def _ensure_capacity(self, rows: int, tokens: int) -> None:
+        needed = -(-tokens // self.pool.block_size)
+        if not self._block_tables:
+            self._block_tables = [[] for _ in range(rows)]
+        missing = needed - len(self._block_tables[0])
+        if missing <= 0:
+            return
+        for table in self._block_tables:
+            table.extend(self.pool.allocate(self.owner, missing))
+        self._table_tensor = None
+
+    def _tables(self, device) -> torch.Tensor:
+        if self._table_tensor is None:
+            self._table_tensor = torch.tensor(
+                self._block_tables, dtype=torch.long, device=device
+            )
+        return self._table_tensor
+
+    def release(self) -> None:
+        """Returns every block to the pool."""
+        if self._released:
+            return
+        self._released = True
+        for table in self._block_tables:
+            self.pool.free(self.owner, table)
+        self._block_tables = []
+        self._table_tensor = None
+        self._layer_lengths = []
+
+    def __del__(self):
+        try:
+            self.release()
+        except Exception:
+            pass
+
+    # --- Cache interface --------------------------------------------------
+
+    def update(
+        self,
+        key_states: torch.Tensor,
+        value_states: torch.Tensor,
+        layer_idx: int,
+        cache_kwargs: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        rows, num_heads, new_tokens, head_dim = key_states.shape
+        if not self._layer_lengths:
+            if not self.pool.ensure_storage(
+                self.num_layers, num_heads, head_dim, key_states.dtype, key_states.device
+            ):
+                raise KVCachePoolExhausted("KV pool shape does not match this backbone.")
+            self._layer_lengths = [0] * self.num_layers
+
+        start = self._layer_lengths[layer_idx]
+        end = start + new_tokens
+        if layer_idx == 0:
+            self._ensure_capacity(rows, end)
+
+        block_size = self.pool.block_size
+        device = key_states.device
+        tables = self._tables(device)
+        positions = torch.arange(start, end, device=device)
+        block_slots = positions // block_size
+        offsets = positions % block_size
+        pool_keys, pool_values = self.pool.keys[layer_idx], self.pool.values[layer_idx]
+        for row in range(rows):
+            block_ids = tables[row, block_slots]
+            pool_keys[block_ids, :, offsets, :] = key_states[row].transpose(0, 1).to(pool_keys.dtype)
+            pool_values[block_ids, :, offsets, :] = value_states[row].transpose(0, 1).to(pool_values.dtype)
+        self._layer_lengths[layer_idx] = end
+        if layer_idx == 0:
+            self.pool.set_tokens(self.owner, end * rows)
+
+        # Gather this layer's blocks into contiguous (rows, heads, end, head_dim).
+        used_blocks = -(-end // block_size)
+        gathered_keys, gathered_values = [], []
+        for row in range(rows):
+            block_ids = tables[row, :used_blocks]
+            for pool_tensor, out in ((pool_keys, gathered_keys), (pool_values, gathered_values)):
+                blocks = pool_tensor[block_ids]  # (blocks, heads, block_size, head_dim)
+                out.append(
+                    blocks.transpose(0, 1).reshape(num_heads, used_blocks * block_size, head_dim)[:, :end]
+                )
+        return (
+            torch.stack(gathered_keys).to(key_states.dtype),
+            torch.stack(gathered_values).to(value_states.dtype),
+        )
+
+    def get_seq_length(self, layer_idx: Optional[int] = 0) -> int:
+        if not self._layer_lengths:
+            return 0
+        return self._layer_lengths[layer_idx or 0]
+
+    def get_max_length(self) -> Optional[int]:
+        return None
+
+    def get_max_cache_shape(self) -> Optional[int]:
+        return None
+
+    def get_mask_sizes(self, cache_position: torch.Tensor, layer_idx: int = 0) -> Tuple[int, int]:
+        return self.get_seq_length(layer_idx) + cache_position.shape[0], 0
+
+    def __len__(self) -> int:
+        return sum(1 for length in self._layer_lengths if length > 0)
+
+    def crop(self, max_length: int) -> None:
+        """Truncates to `max_length` positions and frees the blocks past it."""
+        if max_length < 0:
+            max_length = self.get_seq_length() + max_length
+        if not self._layer_lengths or max_length >= self.get_seq_length():
+            return
+        self._layer_lengths = [min(length, max_length) for length in self._layer_lengths]
+        keep = -(-max_length // self.pool.block_size)
+        for index, table in enumerate(self._block_tables):
+            self.pool.free(self.owner, table[keep:])
+            self._block_tables[index] = table[:keep]
+        self._table_tensor = None
+        rows = len(self._block_tables)
+        self.pool.set_tokens(self.owner, max_length * rows)
+
+
+def make_cache_factory(pool: KVBlockPool, num_layers: int):
+    """Returns a zero-argument factory of PagedKVCache objects for one backbone."""
+
+    def factory() -> PagedKVCache:
+        return PagedKVCache(pool, num_layers)
+
+    return factory
+
+
+# --- End File: paged_kv.py ---
@@ -0,0 +1,682 @@
+# File: scheduler.py
+# Dedicated thread pools for blocking work behind the async endpoints. Model
+# inference and audio encoding each get their own bounded pool, so a burst of
+# synthesis never blocks the event loop (health checks, voice listings) and
+# encoding finished audio never waits behind a long generation. Queue depth,
+# running count and wait times are tracked per pool for /metrics. In front of
+# the pools, admission control bounds outstanding work in predicted
+# audio-seconds and sheds excess load with a drain-time Retry-After. Inside
+# them, a priority gate hands out generation slots one chunk at a time, so
+# interactive work overtakes bulk work at chunk boundaries. Both the pools'
+# dispatch and the gate order waiters with the same fair queue: priority
+# class first, then weighted fair queueing across clients by predicted
+# synthesis seconds.
+
+import asyncio
+import itertools
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from spillover import RtfCostModel
+
+logger = logging.getLogger(__name__)
+
+# Priority classes, most urgent first.
+PRIORITY_CLASSES = ("interactive", "default", "bulk")
+
+ANONYMOUS_CLIENT = "anonymous"
+
+
+def priority_level(priority: Optional[str]) -> int:
+    return PRIORITY_CLASSES.index(priority) if priority in PRIORITY_CLASSES else 1
+
+
+class RequestSchedule:
+    """Scheduling hints of one generation request."""
+
+    def __init__(
+        self,
+        priority: str = "default",
+        client: str = ANONYMOUS_CLIENT,
+        cost_sec: float = 1.0,
+    ):
+        self.priority = priority
+        self.client = client
+        self.cost_sec = cost_sec  # Predicted synthesis seconds of the whole request
+
+
+class ClientRegistry:
+    """Per-client weights and concurrency caps, plus usage accounting for /metrics."""
+
+    def __init__(
+        self,
+        default_weight: float = 1.0,
+        default_max_concurrency: int = 0,
+        overrides: Optional[Dict[str, Dict[str, Any]]] = None,
+    ):
+        self.default_weight = default_weight
+        self.default_max_concurrency = default_max_concurrency
+        self.overrides = overrides or {}
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def weight(self, client: str) -> float:
+        return max(float(self.overrides.get(client, {}).get("weight", self.default_weight)), 1e-3)
+
+    def max_concurrency(self, client: str) -> int:
+        """Requests the client may have in service at once (0: unlimited)."""
+        return int(self.overrides.get(client, {}).get("max_concurrency", self.default_max_concurrency))
+
+    def _client_stats(self, client: str) -> Dict[str, float]:
+        if client not in self._stats:
+            self._stats[client] = {
+                "requests": 0,
+                "queue_wait_sec": 0.0,
+                "max_queue_wait_sec": 0.0,
+                "chunks": 0,
+                "chunk_wait_sec": 0.0,
+                "served_audio_sec": 0.0,
+                "served_compute_sec": 0.0,
+            }
+        return self._stats[client]
+
+    def record_wait(self, client: str, waited_sec: float, chunk: bool = False) -> None:
+        with self._lock:
+            stats = self._client_stats(client)
+            if chunk:
+                stats["chunks"] += 1
+                stats["chunk_wait_sec"] += waited_sec
+            else:
+                stats["requests"] += 1
+                stats["queue_wait_sec"] += waited_sec
+                stats["max_queue_wait_sec"] = max(stats["max_queue_wait_sec"], waited_sec)
+
+    def record_served(self, client: str, audio_sec: float, compute_sec: float) -> None:
+        with self._lock:
+            stats = self._client_stats(client)
+            stats["served_audio_sec"] += audio_sec
+            stats["served_compute_sec"] += compute_sec
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                client: {
+                    "weight": self.weight(client),
+                    "max_concurrency": self.max_concurrency(client),
+                    "requests": stats["requests"],
+                    "avg_queue_wait_sec": (
+                        round(stats["queue_wait_sec"] / stats["requests"], 3)
+                        if stats["requests"]
+                        else 0.0
+                    ),
+                    "max_queue_wait_sec": round(stats["max_queue_wait_sec"], 3),
+                    "chunks": stats["chunks"],
+                    "avg_chunk_wait_sec": (
+                        round(stats["chunk_wait_sec"] / stats["chunks"], 3)
+                        if stats["chunks"]
+                        else 0.0
+                    ),
+                    "served_audio_sec": round(stats["served_audio_sec"], 1),
+                    "served_compute_sec": round(stats["served_compute_sec"], 1),
+                }
+                for client, stats in self._stats.items()
+            }
+
+
+class FairQueue:
+    """
+    Orders waiters by priority class, then by weighted fair queueing across
+    clients, then by arrival.
+
+    Priority ages: each `aging_sec` waited raises a waiter one class. Within
+    a class, start-time fair queueing applies. Each waiter gets a virtual
+    finish tag `max(virtual_time, client's last tag) + cost_sec / weight`, so
+    a client's share of service tracks its weight in predicted synthesis
+    seconds rather than in request count. With `enforce_caps`, clients at
+    their concurrency cap are skipped.
+
+    Not thread-safe: the owner serializes calls.
+    """
+
+    def __init__(
+        self, clients: ClientRegistry, aging_sec: float = 10.0, enforce_caps: bool = False
+    ):
+        self.clients = clients
+        self.aging_sec = aging_sec
+        self.enforce_caps = enforce_caps
+        # ticket -> (class level, enqueued at, client, start tag, finish tag)
+        self._waiting: Dict[int, Tuple[int, float, str, float, float]] = {}
+        self._last_finish: Dict[str, float] = {}
+        self._running: Dict[str, int] = {}
+        self._virtual_time = 0.0
+
+    def __len__(self) -> int:
+        return len(self._waiting)
+
+    def push(self, ticket: int, schedule: RequestSchedule, cost_sec: Optional[float] = None) -> None:
+        client = schedule.client
+        start_tag = max(self._virtual_time, self._last_finish.get(client, 0.0))
+        cost = schedule.cost_sec if cost_sec is None else cost_sec
+        finish_tag = start_tag + max(cost, 1e-3) / self.clients.weight(client)
+        self._last_finish[client] = finish_tag
+        self._waiting[ticket] = (
+            priority_level(schedule.priority),
+            time.perf_counter(),
+            client,
+            start_tag,
+            finish_tag,
+        )
+
+    def remove(self, ticket: int) -> None:
+        """Drops a waiter that gave up, refunding its tag if it was the client's last."""
+        _, _, client, start_tag, finish_tag = self._waiting.pop(ticket)
+        if self._last_finish.get(client) == finish_tag:
+            self._last_finish[client] = start_tag
+
+    def _class(self, level: int, enqueued_at: float, now: float) -> int:
+        if self.aging_sec <= 0:
+            return level
+        return max(level - int((now - enqueued_at) // self.aging_sec), 0)
+
+    def best(self) -> Optional[int]:
+        """The ticket to serve next, or None if every waiter is capped."""
+        now = time.perf_counter()
+        best_key, best_ticket = None, None
+        for ticket, (level, enqueued_at, client, _, finish_tag) in self._waiting.items():
+            if self.enforce_caps:
+                cap = self.clients.max_concurrency(client)
+                if cap > 0 and self._running.get(client, 0) >= cap:
+                    continue
+            key = (self._class(level, enqueued_at, now), finish_tag, ticket)
+            if best_key is None or key < best_key:
+                best_key, best_ticket = key, ticket
+        return best_ticket
+
+    def start(self, ticket: int) -> Tuple[str, int, float]:
+        """Moves a waiter into service. Returns (client, class level, seconds waited)."""
+        level, enqueued_at, client, start_tag, _ = self._waiting.pop(ticket)
+        self._virtual_time = max(self._virtual_time, start_tag)
+        self._running[client] = self._running.get(client, 0) + 1
+        # Tags at or below virtual time carry no information; drop idle ones.
+        if len(self._last_finish) > 1024:
+            waiting_clients = {w[2] for w in self._waiting.values()}
+            self._last_finish = {
+                c: tag
+                for c, tag in self._last_finish.items()
+                if tag > self._virtual_time or c in waiting_clients
+            }
+        return client, level, time.perf_counter() - enqueued_at
+
+    def finish(self, client: str) -> None:
+        remaining = self._running.get(client, 0) - 1
+        if remaining > 0:
+            self._running[client] = remaining
+        else:
+            self._running.pop(client, None)
+
+    def waiting_levels(self) -> List[int]:
+        return [waiter[0] for waiter in self._waiting.values()]
+
+
+class WorkPool:
+    """
+    A bounded thread pool whose queued/running work is observable.
+
+    With a `fair_queue`, work waits on the event loop (holding no thread)
+    and is dispatched to free workers in fair-queue order instead of FIFO,
+    so one client's burst cannot fill the pool ahead of everyone else.
+    """
+
+    def __init__(self, name: str, workers: int, fair_queue: Optional[FairQueue] = None):
+        self.name = name
+        self.workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix=f"tts-{name}"
+        )
+        self._lock = threading.Lock()
+        self.fair_queue = fair_queue
+        self._free_turns = self.workers
+        self._turn_waiters: Dict[int, asyncio.Future] = {}
+        self._tickets = itertools.count()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.peak_queue_depth = 0
+        self.total_wait_sec = 0.0
+        self.max_wait_sec = 0.0
+
+    async def run(self, fn: Callable[..., Any], /, *args, **kwargs) -> Any:
+        """Runs `fn(*args, **kwargs)` on the pool and awaits its result."""
+        return await self.run_scheduled(None, fn, *args, **kwargs)
+
+    async def run_scheduled(
+        self, schedule: Optional[RequestSchedule], fn: Callable[..., Any], /, *args, **kwargs
+    ) -> Any:
+        """Like `run`, dispatched in fair-queue order by `schedule` when the pool has a fair queue."""
+        enqueued_at = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+            self.peak_queue_depth = max(self.peak_queue_depth, self.queued)
+
+        client = None
+        if self.fair_queue is not None:
+            try:
+                client = await self._acquire_turn(schedule or RequestSchedule())
+            except BaseException:
+                with self._lock:
+                    self.queued -= 1
+                raise
+
+        def task():
+            waited = time.perf_counter() - enqueued_at
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.total_wait_sec += waited
+                self.max_wait_sec = max(self.max_wait_sec, waited)
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                with self._lock:
+                    self.failed += 1
+                raise
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+
+        try:
+            future = self._executor.submit(task)
+            try:
+                return await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                # Work that never started is dropped; started work runs to the end
+                # (the engine stops it through its CancellationToken).
+                if future.cancel():
+                    with self._lock:
+                        self.queued -= 1
+                raise
+        finally:
+            if client is not None:
+                self._release_turn(client)
+
+    async def _acquire_turn(self, schedule: RequestSchedule) -> str:
+        """Waits on the event loop until fair-queue order grants a worker."""
+        ticket = next(self._tickets)
+        future = asyncio.get_running_loop().create_future()
+        self.fair_queue.push(ticket, schedule)
+        self._turn_waiters[ticket] = future
+        self._dispatch_turns()
+        try:
+            return await future
+        except asyncio.CancelledError:
+            self._turn_waiters.pop(ticket, None)
+            if future.done() and not future.cancelled():
+                self._release_turn(future.result())  # Granted just before cancellation
+            else:
+                self.fair_queue.remove(ticket)
+            raise
+
+    def _dispatch_turns(self) -> None:
+        while self._free_turns > 0:
+            ticket = self.fair_queue.best()
+            if ticket is None:
+                return
+            client, _, waited = self.fair_queue.start(ticket)
+            self._free_turns -= 1
+            self.fair_queue.clients.record_wait(client, waited)
+            self._turn_waiters.pop(ticket).set_result(client)
+
+    def _release_turn(self, client: str) -> None:
+        self._free_turns += 1
+        self.fair_queue.finish(client)
+        self._dispatch_turns()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            started = self.completed + self.running
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queued,
+                "running": self.running,
+                "peak_queue_depth": self.peak_queue_depth,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_wait_sec": round(self.total_wait_sec / started, 3) if started else 0.0,
+                "max_wait_sec": round(self.max_wait_sec, 3),
+            }
+
+
+class InferenceExecutor:
+    """Inference and encoding pools used by the TTS endpoints."""
+
+    def __init__(
+        self,
+        inference_workers: int = 4,
+        encoding_workers: int = 2,
+        interactive_workers: int = 2,
+        clients: Optional[ClientRegistry] = None,
+        aging_sec: float = 10.0,
+    ):
+        def fair_queue() -> Optional[FairQueue]:
+            if clients is None:
+                return None
+            return FairQueue(clients, aging_sec, enforce_caps=True)
+
+        self.inference = WorkPool("inference", inference_workers, fair_queue())
+        # Bulk requests hold an inference thread while preempted between
+        # chunks; interactive work gets its own lane so it never queues
+        # behind them for a thread (the priority gate orders the chunks).
+        self.interactive = WorkPool("interactive", interactive_workers, fair_queue())
+        self.encoding = WorkPool("encoding", encoding_workers)
+        logger.info(
+            f"Inference executor: {self.inference.workers} inference / "
+            f"{self.interactive.workers} interactive / "
+            f"{self.encoding.workers} encoding worker(s)"
+            f"{', fair dispatch' if clients is not None else ''}."
+        )
+
+    async def run_inference(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Runs `fn` on the inference pool. A `schedule=RequestSchedule(...)`
+        keyword (also passed on to `fn`) orders dispatch, and interactive
+        schedules run on the interactive lane.
+        """
+        schedule = kwargs.get("schedule")
+        interactive = schedule is not None and schedule.priority == "interactive"
+        pool = self.interactive if interactive else self.inference
+        return await pool.run_scheduled(schedule, fn, *args, **kwargs)
+
+    async def run_encoding(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        return await self.encoding.run(fn, *args, **kwargs)
+
+    def shutdown(self) -> None:
+        self.inference.shutdown()
+        self.interactive.shutdown()
+        self.encoding.shutdown()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "inference": self.inference.get_stats(),
+            "interactive": self.interactive.get_stats(),
+            "encoding": self.encoding.get_stats(),
+        }
+
+
+class PriorityGate:
+    """
+    Grants generation slots one chunk at a time, in fair-queue order.
+
+    A multi-chunk request takes a slot per chunk, so between its chunks a
+    more urgent request can overtake it (preemption at chunk boundaries).
+    Its finished chunks stay with the request while it waits. Aging in the
+    fair queue keeps bulk work progressing under sustained interactive
+    load. Within a class, clients share slots by weight.
+
+    `extra_slots` adds capacity on top of `slots` for execution lanes
+    outside the primary model (spillover replicas), so chunks can reach a
+    replica while the primary's lanes are all busy.
+    """
+
+    def __init__(
+        self, slots: int = 2, aging_sec: float = 10.0, clients: Optional[ClientRegistry] = None
+    ):
+        self.slots = max(1, slots)
+        self.extra_slots = 0
+        self.aging_sec = aging_sec
+        self.clients = clients or ClientRegistry()
+        self._queue = FairQueue(self.clients, aging_sec)
+        self._cond = threading.Condition()
+        self._running = 0
+        self._tickets = itertools.count()
+        self._stats = {
+            name: {"granted": 0, "total_wait_sec": 0.0, "max_wait_sec": 0.0, "preempted": 0}
+            for name in PRIORITY_CLASSES
+        }
+
+    @contextmanager
+    def slot(
+        self,
+        schedule: Optional[RequestSchedule],
+        cancel_token: Any = None,
+        cost_sec: Optional[float] = None,
+    ):
+        """
+        Holds one generation slot for the duration of the block. `cost_sec`
+        is the chunk's predicted synthesis time (defaults to the request's).
+        Waiting honours `cancel_token` (anything with `raise_if_cancelled()`).
+        """
+        schedule = schedule or RequestSchedule()
+        ticket = next(self._tickets)
+        with self._cond:
+            self._queue.push(ticket, schedule, cost_sec)
+            try:
+                while not (self._running < self.capacity and self._queue.best() == ticket):
+                    if cancel_token is not None:
+                        cancel_token.raise_if_cancelled()
+                    self._cond.wait(timeout=0.25)  # Timeout also re-evaluates aging
+            except BaseException:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+                raise
+            client, level, waited = self._queue.start(ticket)
+            self._running += 1
+            self._cond.notify_all()
+            stats = self._stats[PRIORITY_CLASSES[level]]
+            stats["granted"] += 1
+            stats["total_wait_sec"] += waited
+            stats["max_wait_sec"] = max(stats["max_wait_sec"], waited)
+            # Less urgent waiters were just overtaken by this chunk.
+            for other_level in self._queue.waiting_levels():
+                if other_level > level:
+                    self._stats[PRIORITY_CLASSES[other_level]]["preempted"] += 1
+        self.clients.record_wait(client, waited, chunk=True)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._queue.finish(client)
+                self._cond.notify_all()
+
+    @property
+    def capacity(self) -> int:
+        return self.slots + self.extra_slots
+
+    def set_extra_slots(self, extra_slots: int) -> None:
+        with self._cond:
+            self.extra_slots = max(0, extra_slots)
+            self._cond.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            waiting = self._queue.waiting_levels()
+            return {
+                "slots": self.slots,
+                "extra_slots": self.extra_slots,
+                "running": self._running,
+                "aging_sec": self.aging_sec,
+                "classes": {
+                    name: {
+                        "waiting": waiting.count(level),
+                        "granted": stats["granted"],
+                        "avg_wait_sec": (
+                            round(stats["total_wait_sec"] / stats["granted"], 3)
+                            if stats["granted"]
+                            else 0.0
+                        ),
+                        "max_wait_sec": round(stats["max_wait_sec"], 3),
+                        "preempted": stats["preempted"],
+                    }
+                    for level, (name, stats) in enumerate(self._stats.items())
+                },
+            }
+
+
+class AdmissionRejected(Exception):
+    """Raised when admitting a request would exceed the queued-audio budget."""
+
+    def __init__(self, message: str, retry_after_sec: int):
+        super().__init__(message)
+        self.retry_after_sec = retry_after_sec
+
+
+class AdmissionController:
+    """
+    Bounds admitted-but-unfinished work, measured in predicted audio-seconds
+    (text length times the measured audio seconds per character), so a spike
+    is rejected up front instead of queueing until clients time out.
+
+    The RTF measured from completed chunks turns queued audio into a
+    predicted wait: `queued_audio_sec * rtf / parallelism`. A request that
+    would overflow `max_queued_audio_sec` is rejected with the time needed to
+    drain the excess. A request is always admitted when nothing is
+    outstanding, however long it is.
+    """
+
+    def __init__(self, max_queued_audio_sec: float, parallelism: int = 1, prior_rtf: float = 0.5):
+        self.max_queued_audio_sec = max_queued_audio_sec
+        self.parallelism = max(1, parallelism)
+        self.cost = RtfCostModel(prior_rtf)
+        self._lock = threading.Lock()
+        self._outstanding: Dict[str, float] = {}  # request id -> predicted audio sec
+        self.admitted = 0
+        self.rejected = 0
+        self.peak_queued_audio_sec = 0.0
+
+    def _drain_sec(self, audio_sec: float) -> float:
+        return audio_sec * self.cost.rtf / self.parallelism
+
+    def admit(self, request_id: str, chars: int, weight: float = 1.0) -> float:
+        """
+        Reserves the request's predicted audio-seconds (times `weight`, e.g.
+        best-of-N takes). Returns the predicted queue wait in seconds; raises
+        AdmissionRejected when the budget is full.
+        """
+        with self._lock:
+            audio_sec = self.cost.audio_sec_per_char * max(chars, 1) * weight
+            queued = sum(self._outstanding.values())
+            if self._outstanding and queued + audio_sec > self.max_queued_audio_sec:
+                self.rejected += 1
+                retry_after = max(1, math.ceil(self._drain_sec(queued + audio_sec - self.max_queued_audio_sec)))
+                raise AdmissionRejected(
+                    f"Server busy: {queued:.0f}s of audio queued (limit "
+                    f"{self.max_queued_audio_sec:.0f}s); retry in ~{retry_after}s.",
+                    retry_after,
+                )
+            self._outstanding[request_id] = audio_sec
+            self.admitted += 1
+            self.peak_queued_audio_sec = max(self.peak_queued_audio_sec, queued + audio_sec)
+            return self._drain_sec(queued)
+
+    def release(self, request_id: str) -> None:
+        with self._lock:
+            self._outstanding.pop(request_id, None)
+
+    def predict_compute_sec(self, chars: int) -> float:
+        """Predicted synthesis seconds for `chars` of text (the fair-queueing cost)."""
+        with self._lock:
+            return self.cost.predict(chars)
+
+    def observe(self, chars: int, audio_sec: float, elapsed_sec: float) -> None:
+        """Feeds one synthesized chunk into the RTF cost model."""
+        with self._lock:
+            self.cost.observe(chars, audio_sec, elapsed_sec)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queued = sum(self._outstanding.values())
+            return {
+                "queue_depth": len(self._outstanding),
+                "queued_audio_sec": round(queued, 1),
+                "max_queued_audio_sec": self.max_queued_audio_sec,
+                "peak_queued_audio_sec": round(self.peak_queued_audio_sec, 1),
+                "predicted_wait_sec": round(self._drain_sec(queued), 2),
+                "rtf": round(self.cost.rtf, 3),
+                "audio_sec_per_char": round(self.cost.audio_sec_per_char, 4),
+                "cost_samples": self.cost.samples,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key onto one execution.
+
+    The first caller starts `make_call(token)` with a token owned by the
+    flight; later callers with the same key attach and receive the same
+    result. Each caller waits on its own token, so a caller that disconnects
+    or is cancelled detaches without disturbing the others. The shared work
+    is cancelled only when every caller has detached. A finished flight is
+    forgotten immediately: this is deduplication, not a result cache.
+    """
+
+    def __init__(self, token_factory: Callable[[], Any], poll_sec: float = 0.1):
+        self.token_factory = token_factory
+        self.poll_sec = poll_sec
+        self._flights: Dict[Any, Dict[str, Any]] = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    def in_flight(self, key: Any) -> bool:
+        return key in self._flights
+
+    async def run(
+        self, key: Any, make_call: Callable[[Any], Awaitable[Any]], caller_token: Any
+    ) -> Tuple[Any, bool]:
+        """Returns (result, shared); `shared` is True when another caller's execution was reused."""
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            token = self.token_factory()
+            flight = {"task": asyncio.ensure_future(make_call(token)), "token": token, "waiters": 0}
+            self._flights[key] = flight
+            flight["task"].add_done_callback(lambda task: self._on_done(key, flight, task))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+        flight["waiters"] += 1
+        try:
+            while True:
+                done, _ = await asyncio.wait({flight["task"]}, timeout=self.poll_sec)
+                if done:
+                    return flight["task"].result(), shared
+                caller_token.raise_if_cancelled()
+        finally:
+            flight["waiters"] -= 1
+            if flight["waiters"] == 0 and not flight["task"].done():
+                # Nobody is waiting any more: stop the work and let new callers start afresh.
+                self.abandoned += 1
+                self._forget(key, flight)
+                flight["token"].cancel("all coalesced requests left")
+
+    def _on_done(self, key: Any, flight: Dict[str, Any], task: asyncio.Future) -> None:
+        self._forget(key, flight)
+        if not task.cancelled():
+            task.exception()  # Retrieved even if every caller detached
+
+    def _forget(self, key: Any, flight: Dict[str, Any]) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._flights),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+        }
+
+
+# --- End File: scheduler.py ---
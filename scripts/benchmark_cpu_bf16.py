@@ -0,0 +1,163 @@
+"""
+Benchmark CPU bfloat16 autocast against fp32 inference.
+
+Runs the same test sentences with the same seeds in both modes on CPU and
+reports real-time factor (RTF) per mode plus output similarity between the
+bf16 and fp32 takes (duration ratio, log-mel cosine, speaker-embedding cosine).
+
+Usage: python scripts/benchmark_cpu_bf16.py [--voice voices/default.wav] [--output results.json]
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import librosa  # noqa: E402
+
+from config import (  # noqa: E402
+    _set_nested_value,
+    config_manager,
+    get_predefined_voices_path,
+)
+import engine  # noqa: E402
+
+TEST_SENTENCES = [
+    "Hola, ¿cómo estás? Espero que tengas un excelente día.",
+    "El tren de las ocho y cuarto sale desde el andén número tres.",
+    "La inteligencia artificial está transformando la manera en que trabajamos y nos comunicamos.",
+    "Por favor, confirmá tu cita para el próximo martes a las diez de la mañana.",
+    "En la ciudad de México, la temperatura máxima hoy será de veinticuatro grados.",
+]
+
+
+def _log_mel(wav: np.ndarray, sr: int) -> np.ndarray:
+    mel = librosa.feature.melspectrogram(y=wav, sr=sr, n_fft=1024, hop_length=256, n_mels=80)
+    return np.log(mel + 1e-6)
+
+
+def _mel_cosine(wav_a: np.ndarray, wav_b: np.ndarray, sr: int) -> float:
+    """Frame-wise cosine similarity of log-mels over the common length."""
+    mel_a, mel_b = _log_mel(wav_a, sr), _log_mel(wav_b, sr)
+    frames = min(mel_a.shape[1], mel_b.shape[1])
+    a, b = mel_a[:, :frames].ravel(), mel_b[:, :frames].ravel()
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-9))
+
+
+def _speaker_cosine(wav_a: np.ndarray, wav_b: np.ndarray, sr: int):
+    """Cosine similarity between VoiceEncoder embeddings, or None if unavailable."""
+    voice_encoder = getattr(engine.chatterbox_model, "ve", None)
+    if voice_encoder is None:
+        return None
+    wavs_16k = [librosa.resample(w, orig_sr=sr, target_sr=16000) for w in (wav_a, wav_b)]
+    embeds = voice_encoder.embeds_from_wavs(wavs_16k, sample_rate=16000)
+    a, b = np.asarray(embeds[0]), np.asarray(embeds[1])
+    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b) + 1e-9))
+
+
+def _set_mode(use_bf16: bool):
+    engine._bf16_autocast_device = "cpu" if use_bf16 else None
+    engine._use_bf16_inference = use_bf16
+
+
+def _run_mode(label: str, use_bf16: bool, voice: str, seed: int):
+    _set_mode(use_bf16)
+    # Warm-up so one-time allocation/oneDNN primitive creation is not timed.
+    engine.synthesize("Calentamiento.", audio_prompt_path=voice, seed=seed)
+
+    results = []
+    for sentence in TEST_SENTENCES:
+        start_time = time.perf_counter()
+        wav, sr = engine.synthesize(sentence, audio_prompt_path=voice, seed=seed)
+        elapsed = time.perf_counter() - start_time
+        if wav is None:
+            print(f"❌ [{label}] synthesis failed for: {sentence}")
+            results.append(None)
+            continue
+        wav = np.asarray(wav, dtype=np.float32).squeeze()
+        duration = len(wav) / sr
+        results.append({"wav": wav, "sr": sr, "seconds": elapsed, "rtf": elapsed / duration})
+        print(f"  [{label}] {duration:5.2f}s audio in {elapsed:6.2f}s (RTF {elapsed / duration:.2f})")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--voice", help="Reference audio for conditioning (defaults to first predefined voice).")
+    parser.add_argument("--seed", type=int, default=1234, help="Seed shared by both modes.")
+    parser.add_argument("--output", help="Optional path to write JSON results.")
+    args = parser.parse_args()
+
+    _set_nested_value(config_manager.config, ["tts_engine", "device"], "cpu")
+    caps = engine._cpu_bf16_capabilities()
+    print(f"CPU bf16 capabilities: {caps}")
+    if not caps["supported"]:
+        print("❌ oneDNN bf16 kernels are not available on this CPU; nothing to compare.")
+        return
+
+    voice = args.voice
+    if voice is None:
+        candidates = sorted(
+            p for p in get_predefined_voices_path().iterdir() if p.suffix.lower() in (".wav", ".mp3")
+        )
+        voice = str(candidates[0]) if candidates else None
+    print(f"Reference voice: {voice}")
+
+    if not engine.load_model():
+        print("❌ Model failed to load.")
+        return
+
+    print("\nfp32:")
+    fp32_results = _run_mode("fp32", False, voice, args.seed)
+    print("\nbf16:")
+    bf16_results = _run_mode("bf16", True, voice, args.seed)
+
+    rows = []
+    for sentence, fp32, bf16 in zip(TEST_SENTENCES, fp32_results, bf16_results):
+        if fp32 is None or bf16 is None:
+            continue
+        rows.append(
+            {
+                "sentence": sentence,
+                "rtf_fp32": fp32["rtf"],
+                "rtf_bf16": bf16["rtf"],
+                "speedup": fp32["seconds"] / bf16["seconds"],
+                "duration_ratio": len(bf16["wav"]) / len(fp32["wav"]),
+                "mel_cosine": _mel_cosine(fp32["wav"], bf16["wav"], fp32["sr"]),
+                "speaker_cosine": _speaker_cosine(fp32["wav"], bf16["wav"], fp32["sr"]),
+            }
+        )
+
+    if not rows:
+        print("❌ No sentence produced audio in both modes.")
+        return
+
+    print("\n" + "=" * 78)
+    print(f"{'RTF fp32':>9} {'RTF bf16':>9} {'speedup':>8} {'dur ratio':>10} {'mel cos':>8} {'spk cos':>8}")
+    for row in rows:
+        speaker = f"{row['speaker_cosine']:.3f}" if row["speaker_cosine"] is not None else "n/a"
+        print(
+            f"{row['rtf_fp32']:9.2f} {row['rtf_bf16']:9.2f} {row['speedup']:7.2f}x "
+            f"{row['duration_ratio']:10.2f} {row['mel_cosine']:8.3f} {speaker:>8}"
+        )
+    summary = {
+        "cpu_bf16": caps,
+        "median_rtf_fp32": float(np.median([r["rtf_fp32"] for r in rows])),
+        "median_rtf_bf16": float(np.median([r["rtf_bf16"] for r in rows])),
+        "median_speedup": float(np.median([r["speedup"] for r in rows])),
+        "median_mel_cosine": float(np.median([r["mel_cosine"] for r in rows])),
+    }
+    print("=" * 78)
+    print(json.dumps(summary, indent=2))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({"summary": summary, "sentences": rows}, indent=2), encoding="utf-8")
+        print(f"✅ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Exercise the spillover scheduler with two CPU replicas of different thread counts.
+
+Fires a burst of concurrent requests at the engine with spillover enabled and
+reports, per replica, how many requests it served, its measured RTF and the
+cost model's state, plus total wall time versus a primary-only run.
+
+Usage: python scripts/benchmark_spillover.py [--primary-threads 8] [--replica-threads 2] [--requests 8]
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import _set_nested_value, config_manager  # noqa: E402
+import engine  # noqa: E402
+
+TEST_SENTENCES = [
+    "Hola, ¿cómo estás? Espero que tengas un excelente día.",
+    "El tren de las ocho y cuarto sale desde el andén número tres.",
+    "La inteligencia artificial está transformando la manera en que trabajamos y nos comunicamos.",
+    "Por favor, confirmá tu cita para el próximo martes a las diez de la mañana.",
+]
+
+
+def _configure(enabled: bool, primary_threads: int, replica_threads: int, threshold: float):
+    config = config_manager.config
+    _set_nested_value(config, ["tts_engine", "device"], "cpu")
+    _set_nested_value(config, ["tts_engine", "spillover", "enabled"], enabled)
+    _set_nested_value(config, ["tts_engine", "spillover", "primary_threads"], primary_threads)
+    _set_nested_value(config, ["tts_engine", "spillover", "queue_wait_threshold_sec"], threshold)
+    _set_nested_value(
+        config,
+        ["tts_engine", "spillover", "replicas"],
+        [{"name": "cpu-secondary", "device": "cpu", "threads": replica_threads}],
+    )
+
+
+def _burst(requests: int, voice: str) -> float:
+    sentences = [TEST_SENTENCES[i % len(TEST_SENTENCES)] for i in range(requests)]
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=requests) as pool:
+        results = list(
+            pool.map(lambda text: engine.generate(text, voice_source_path=voice, seed=1234), sentences)
+        )
+    elapsed = time.perf_counter() - start_time
+    failed = sum(1 for wav, _ in results if wav is None)
+    if failed:
+        print(f"❌ {failed} request(s) failed")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--voice", help="Reference audio for conditioning.")
+    parser.add_argument("--primary-threads", type=int, default=8)
+    parser.add_argument("--replica-threads", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=8, help="Concurrent requests per burst.")
+    parser.add_argument("--threshold", type=float, default=2.0, help="Primary queue wait threshold (s).")
+    args = parser.parse_args()
+
+    runs = {}
+    for label, enabled in (("primary_only", False), ("spillover", True)):
+        _configure(enabled, args.primary_threads, args.replica_threads, args.threshold)
+        if not engine.reload_model():
+            print("❌ Model failed to load.")
+            return
+        if not enabled and args.primary_threads > 0:
+            import torch
+
+            torch.set_num_threads(args.primary_threads)
+        # Warm-up, so the first measured request does not pay one-time costs.
+        engine.generate("Calentamiento.", voice_source_path=args.voice, seed=1234)
+        elapsed = _burst(args.requests, args.voice)
+        runs[label] = {"wall_sec": round(elapsed, 2)}
+        if engine.spillover_scheduler is not None:
+            runs[label]["scheduler"] = engine.spillover_scheduler.get_stats()
+        print(f"{label}: {args.requests} requests in {elapsed:.2f}s")
+
+    print(json.dumps(runs, indent=2))
+
+
+if __name__ == "__main__":
+    main()
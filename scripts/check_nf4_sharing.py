@@ -0,0 +1,106 @@
+"""
+Check that NF4 quantization packs each shared Linear exactly once.
+
+Builds a tiny primary model and a resident variant that differs only in its
+transformer, deduplicates them through a ComponentShareRegistry (as
+`model.share_components` does), then runs `engine._quantize_model_nf4` over
+both, in load order (primary, then variant) and in the reverse order. Every
+shared Linear must end up a single Linear4bit, used by both models, whose
+packed weight is not re-wrapped by the second pass.
+
+Requires bitsandbytes. Usage: python scripts/check_nf4_sharing.py
+"""
+import copy
+import sys
+from pathlib import Path
+
+import torch
+from torch import nn
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import engine  # noqa: E402
+from model_sharing import ComponentShareRegistry, get_component  # noqa: E402
+
+HIDDEN = 256  # Above gpu_optimizations.nf4_min_features
+SHARED_PATHS = ["ve", "t3.speech_head"]
+
+
+class TinyT3(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.tfmr = nn.Sequential(nn.Linear(HIDDEN, HIDDEN), nn.Linear(HIDDEN, HIDDEN))
+        self.speech_head = nn.Linear(HIDDEN, HIDDEN)
+
+
+class TinyTTS:
+    """Composite object with nn.Module attributes, like ChatterboxTTS."""
+
+    def __init__(self):
+        self.ve = nn.Sequential(nn.Linear(HIDDEN, HIDDEN), nn.ReLU(), nn.Linear(HIDDEN, HIDDEN))
+        self.t3 = TinyT3()
+
+
+def _build_pair():
+    torch.manual_seed(0)
+    primary = TinyTTS()
+    variant = copy.deepcopy(primary)
+    with torch.no_grad():
+        for param in variant.t3.tfmr.parameters():
+            param.add_(0.01)  # A fine-tune: only the transformer differs
+    registry = ComponentShareRegistry(SHARED_PATHS + ["t3.tfmr"])
+    registry.register("primary", primary)
+    registry.register("variant", variant)
+    for path in SHARED_PATHS:
+        assert get_component(primary, path) is get_component(variant, path), path
+    assert primary.t3.tfmr is not variant.t3.tfmr
+    return primary, variant
+
+
+def _linears(module: nn.Module):
+    return [m for m in module.modules() if isinstance(m, nn.Linear)]
+
+
+def _check(order: str) -> bool:
+    primary, variant = _build_pair()
+    first, second = (primary, variant) if order == "primary first" else (variant, primary)
+    first_count = engine._quantize_model_nf4(first)
+    packed = {
+        path: [(layer, layer.weight) for layer in _linears(get_component(first, path))]
+        for path in SHARED_PATHS
+    }
+    second_count = engine._quantize_model_nf4(second)
+
+    ok = True
+    for path, layers in packed.items():
+        current = _linears(get_component(second, path))
+        for (layer, weight), now in zip(layers, current):
+            once = (
+                isinstance(layer, engine.bnb.nn.Linear4bit)
+                and now is layer
+                and now.weight is weight
+                and type(now.weight) is engine.bnb.nn.Params4bit
+            )
+            ok &= once
+            if not once:
+                print(f"  {path}: shared Linear was re-wrapped by the second pass")
+    unique = len(_linears(second.t3.tfmr))
+    ok &= second_count == unique
+    print(
+        f"{order}: first pass {first_count} layers, second pass {second_count} "
+        f"(expected {unique}, its unshared transformer)"
+    )
+    return ok
+
+
+def main():
+    if not engine.BNB_AVAILABLE:
+        print("bitsandbytes is not installed; nothing to check.")
+        sys.exit(1)
+    ok = _check("primary first") & _check("variant first")
+    print("\n✅ Each shared Linear quantized once" if ok else "\n❌ NF4 sharing check FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
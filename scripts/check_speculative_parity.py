@@ -0,0 +1,184 @@
+"""
+Parity check for speculative T3 decoding against standard sampling, on CPU.
+
+Builds a tiny randomly initialised T3 stand-in (Llama backbone, speech
+embeddings, positional embeddings, speech head) so no checkpoint is needed, then:
+
+1. Greedy parity: with temperature 0 the speculative loop must emit exactly
+   the same tokens as `decode_speech_tokens`.
+2. Distribution parity: with sampling, per-position token marginals and the
+   length distribution from speculative decoding must match standard
+   sampling as closely as two independent standard runs match each other
+   (total variation distance).
+3. Acceptance rate for several draft depths.
+
+Usage: python scripts/check_speculative_parity.py [--samples 2000] [--layers 4] [--k 4]
+"""
+import argparse
+import sys
+from collections import Counter
+from pathlib import Path
+from types import SimpleNamespace
+
+import torch
+from torch import nn
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import decoding  # noqa: E402
+
+from transformers import LlamaConfig, LlamaModel  # noqa: E402
+
+SPEECH_VOCAB = 24
+TEXT_VOCAB = 32
+HIDDEN = 64
+
+
+class _PositionEmbedding(nn.Module):
+    def __init__(self, length: int, dim: int):
+        super().__init__()
+        self.emb = nn.Embedding(length, dim)
+
+    def get_fixed_embedding(self, idx):
+        device = self.emb.weight.device
+        idx = idx.to(device) if torch.is_tensor(idx) else torch.tensor(idx, device=device)
+        return self.emb(torch.atleast_2d(idx))
+
+
+class TinyT3(nn.Module):
+    """Minimal object exposing the T3 attributes the decoding loops use."""
+
+    def __init__(self, num_layers: int):
+        super().__init__()
+        self.hp = SimpleNamespace(
+            start_speech_token=SPEECH_VOCAB - 2, stop_speech_token=SPEECH_VOCAB - 1
+        )
+        config = LlamaConfig(
+            hidden_size=HIDDEN,
+            intermediate_size=2 * HIDDEN,
+            num_hidden_layers=num_layers,
+            num_attention_heads=4,
+            num_key_value_heads=4,
+            vocab_size=TEXT_VOCAB,
+            max_position_embeddings=512,
+        )
+        config._attn_implementation = "eager"
+        self.tfmr = LlamaModel(config)
+        self.text_emb = nn.Embedding(TEXT_VOCAB, HIDDEN)
+        self.speech_emb = nn.Embedding(SPEECH_VOCAB, HIDDEN)
+        self.speech_pos_emb = _PositionEmbedding(256, HIDDEN)
+        self.speech_head = nn.Linear(HIDDEN, SPEECH_VOCAB)
+        with torch.no_grad():
+            self.speech_head.weight.mul_(4.0)  # Peakier distributions than uniform noise
+
+    def prepare_input_embeds(self, *, t3_cond, text_tokens, speech_tokens):
+        text = self.text_emb(text_tokens)
+        if text.size(0) > 1:
+            text[1].zero_()  # Unconditional CFG row, as upstream
+        speech = self.speech_emb(speech_tokens) + self.speech_pos_emb.get_fixed_embedding(0)
+        embeds = torch.cat([text, speech], dim=1)
+        return embeds, embeds.size(1)
+
+
+def _text_tokens(seed: int) -> torch.Tensor:
+    row = torch.randint(0, TEXT_VOCAB, (1, 8), generator=torch.Generator().manual_seed(seed))
+    return torch.cat([row, row], dim=0)
+
+
+def _standard(t3, text_tokens, seed, **kwargs):
+    generator = decoding.make_generator(seed, "cpu")
+    return decoding.decode_speech_tokens(t3, None, text_tokens, generator, **kwargs).tolist()
+
+
+def _speculative(t3, draft, text_tokens, seed, k, **kwargs):
+    generator = decoding.make_generator(seed, "cpu")
+    return decoding.speculative_decode_speech_tokens(
+        t3, draft, None, text_tokens, generator, num_speculative_tokens=k, **kwargs
+    ).tolist()
+
+
+def _tv_distance(a: Counter, b: Counter) -> float:
+    total_a, total_b = sum(a.values()) or 1, sum(b.values()) or 1
+    keys = set(a) | set(b)
+    return 0.5 * sum(abs(a[key] / total_a - b[key] / total_b) for key in keys)
+
+
+def _marginals(sequences, positions: int):
+    counters = [Counter() for _ in range(positions)]
+    for seq in sequences:
+        for pos in range(positions):
+            counters[pos][seq[pos] if pos < len(seq) else "<end>"] += 1
+    lengths = Counter(len(seq) for seq in sequences)
+    return counters, lengths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=2000, help="Sampled sequences per method.")
+    parser.add_argument("--layers", type=int, default=4, help="Backbone layers of the tiny T3.")
+    parser.add_argument("--k", type=int, default=4, help="Speculative tokens per round.")
+    parser.add_argument("--max-new-tokens", type=int, default=6)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    t3 = TinyT3(args.layers).eval()
+    draft = decoding.build_layer_truncated_draft(t3.tfmr, max(1, args.layers // 2))
+    ok = True
+
+    # 1. Greedy parity
+    mismatches = 0
+    for seed in range(20):
+        text_tokens = _text_tokens(seed)
+        kwargs = dict(temperature=0.0, cfg_weight=0.5, max_new_tokens=64)
+        if _standard(t3, text_tokens, seed, **kwargs) != _speculative(
+            t3, draft, text_tokens, seed, args.k, **kwargs
+        ):
+            mismatches += 1
+    print(f"Greedy parity: {20 - mismatches}/20 sequences identical")
+    ok &= mismatches == 0
+
+    # 2. Distribution parity
+    text_tokens = _text_tokens(1234)
+    kwargs = dict(temperature=1.0, cfg_weight=0.5, max_new_tokens=args.max_new_tokens)
+    n = args.samples
+    standard_a = [_standard(t3, text_tokens, seed + 1, **kwargs) for seed in range(n)]
+    standard_b = [_standard(t3, text_tokens, seed + 1 + n, **kwargs) for seed in range(n)]
+    decoding.speculative_stats.reset()
+    speculative = [
+        _speculative(t3, draft, text_tokens, seed + 1 + 2 * n, args.k, **kwargs)
+        for seed in range(n)
+    ]
+    positions = min(3, args.max_new_tokens)
+    marg_a, len_a = _marginals(standard_a, positions)
+    marg_b, len_b = _marginals(standard_b, positions)
+    marg_s, len_s = _marginals(speculative, positions)
+    print(f"\nTotal variation distance ({n} samples each):")
+    print(f"{'':>12} {'std vs std':>11} {'std vs spec':>12}")
+    for pos in range(positions):
+        baseline, observed = _tv_distance(marg_a[pos], marg_b[pos]), _tv_distance(marg_a[pos], marg_s[pos])
+        print(f"{'token ' + str(pos):>12} {baseline:11.3f} {observed:12.3f}")
+        ok &= observed <= 2 * baseline + 0.03
+    baseline, observed = _tv_distance(len_a, len_b), _tv_distance(len_a, len_s)
+    print(f"{'length':>12} {baseline:11.3f} {observed:12.3f}")
+    ok &= observed <= 2 * baseline + 0.03
+    print(f"Speculative stats: {decoding.speculative_stats.get_stats()}")
+
+    # 3. Acceptance by draft depth
+    print("\nAcceptance rate by draft depth:")
+    for depth in range(1, args.layers + 1):
+        depth_draft = decoding.build_layer_truncated_draft(t3.tfmr, depth)
+        decoding.speculative_stats.reset()
+        for seed in range(200):
+            _speculative(t3, depth_draft, text_tokens, seed + 1, args.k, **kwargs)
+        stats = decoding.speculative_stats.get_stats()
+        print(
+            f"  {depth}/{args.layers} layers: acceptance {stats['acceptance_rate']}, "
+            f"tokens/target pass {stats['tokens_per_target_forward']}"
+        )
+
+    print("\n✅ Parity check passed" if ok else "\n❌ Parity check FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
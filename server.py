@@ -4,6 +4,9 @@
 
 import os
 import io
+import base64
+import hashlib
+import json
 import asyncio
 import logging
 import logging.handlers
@@ -11,11 +14,13 @@ import shutil
 import time
 import uuid
 import yaml
+import zipfile
 import numpy as np
 import librosa
 from pathlib import Path
+import contextlib
 from contextlib import asynccontextmanager
-from typing import Optional, List, Dict, Any, Literal
+from typing import Optional, List, Dict, Any, Literal, Union, Callable
 import webbrowser
 import threading
 
@@ -27,6 +32,8 @@ from fastapi import (
     UploadFile,
     Form,
     BackgroundTasks,
+    WebSocket,
+    WebSocketDisconnect,
 )
 from fastapi.responses import (
     HTMLResponse,
@@ -61,22 +68,43 @@ from config import (
 
 import engine
 from models import (
+    AudioFormat,
+    BatchTTSRequest,
     CustomTTSRequest,
+    WebSocketTTSConfig,
+    JobRequest,
     ErrorResponse,
     UpdateStatusResponse,
 )
 import utils
+from scheduler import (
+    AdmissionController,
+    AdmissionRejected,
+    ClientRegistry,
+    InferenceExecutor,
+    PriorityGate,
+    RequestSchedule,
+    SingleFlight,
+    PRIORITY_CLASSES,
+    ANONYMOUS_CLIENT,
+    priority_level,
+)
+from jobs import JobManager, JobStore, JOB_COMPLETED
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 
 
 class OpenAISpeechRequest(BaseModel):
     model: str
     input_: str = Field(..., alias="input")
     voice: str
-    response_format: Literal["wav", "opus", "mp3"] = "wav"
+    response_format: AudioFormat = "wav"
     speed: float = 1.0
     seed: Optional[int] = None
+    stream: Optional[bool] = None  # None: audio_output.stream_by_default
+    stream_format: Optional[Literal["audio", "sse"]] = None  # "sse": base64 audio deltas as events (always streams)
+    priority: Optional[Literal["interactive", "default", "bulk"]] = None
+    coalesce: Optional[bool] = None  # None: share identical requests only with a fixed seed
 
 
 # Logging Configuration
@@ -125,26 +153,362 @@ def _delayed_browser_open(host: str, port: int):
         logger.error(f"Failed to open browser: {e}", exc_info=True)
 
 
+class InflightRequestRegistry:
+    """
+    Tracks cancellation tokens of in-flight generations by request id and by
+    optional session id. Registering a new request for a session cancels the
+    session's previous one (barge-in: the newer utterance supersedes it).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_request_id: Dict[str, engine.CancellationToken] = {}
+        self._request_by_session: Dict[str, str] = {}
+        self.superseded: int = 0
+        self.disconnected: int = 0
+        self.cancelled_via_api: int = 0
+
+    def register(
+        self, request_id: str, session_id: Optional[str] = None
+    ) -> engine.CancellationToken:
+        token = engine.CancellationToken()
+        with self._lock:
+            if session_id:
+                previous_id = self._request_by_session.get(session_id)
+                previous_token = self._by_request_id.get(previous_id) if previous_id else None
+                if previous_token is not None and not previous_token.cancelled:
+                    previous_token.cancel("superseded")
+                    self.superseded += 1
+                    logger.info(
+                        f"Request {previous_id} superseded by {request_id} (session {session_id})."
+                    )
+                self._request_by_session[session_id] = request_id
+            self._by_request_id[request_id] = token
+        return token
+
+    def unregister(self, request_id: str, session_id: Optional[str] = None):
+        with self._lock:
+            self._by_request_id.pop(request_id, None)
+            if session_id and self._request_by_session.get(session_id) == request_id:
+                del self._request_by_session[session_id]
+
+    def cancel(self, request_id: str, reason: str = "cancelled") -> bool:
+        with self._lock:
+            token = self._by_request_id.get(request_id)
+            if token is None:
+                return False
+            token.cancel(reason)
+            self.cancelled_via_api += 1
+            return True
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._by_request_id),
+                "superseded": self.superseded,
+                "disconnected": self.disconnected,
+                "cancelled_via_api": self.cancelled_via_api,
+            }
+
+
+inflight_requests = InflightRequestRegistry()
+
+# Per-client weights, concurrency caps and usage (server.fair_queueing).
+client_registry = ClientRegistry(
+    default_weight=config_manager.get_float("server.fair_queueing.default_weight", 1.0),
+    default_max_concurrency=config_manager.get_int(
+        "server.fair_queueing.default_max_concurrency", 0
+    ),
+    overrides=config_manager.get("server.fair_queueing.clients", {}) or {},
+)
+
+# Generation and encoding run here, never on the event loop. With fair
+# queueing on, inference work is dispatched per client instead of FIFO.
+inference_executor = InferenceExecutor(
+    inference_workers=config_manager.get_int("server.executor.inference_workers", 4),
+    encoding_workers=config_manager.get_int("server.executor.encoding_workers", 2),
+    interactive_workers=config_manager.get_int("server.executor.interactive_workers", 2),
+    clients=(
+        client_registry
+        if config_manager.get_bool("server.fair_queueing.enabled", True)
+        else None
+    ),
+    aging_sec=config_manager.get_float("server.priority.aging_sec", 10.0),
+)
+
+# Orders chunk generations by priority class (None: plain FIFO on the pools).
+priority_gate: Optional[PriorityGate] = (
+    PriorityGate(
+        slots=config_manager.get_int("server.priority.slots", 2),
+        aging_sec=config_manager.get_float("server.priority.aging_sec", 10.0),
+        clients=client_registry,
+    )
+    if config_manager.get_bool("server.priority.enabled", True)
+    else None
+)
+engine.spillover_gate = priority_gate
+
+
+def _request_priority(headers, requested: Optional[str] = None) -> str:
+    """
+    Resolves a request's priority class. The API key's class (X-API-Key,
+    mapped in server.priority.api_key_classes) is a ceiling: a request may
+    ask for a lower priority than its key allows, never a higher one.
+    """
+    key_classes = config_manager.get("server.priority.api_key_classes", {}) or {}
+    api_key = headers.get("x-api-key")
+    ceiling = key_classes.get(api_key) if api_key else None
+    ceiling = ceiling or config_manager.get_string("server.priority.default_class", "default")
+    if requested is None:
+        return ceiling
+    return PRIORITY_CLASSES[max(priority_level(requested), priority_level(ceiling))]
+
+
+def _request_client(headers) -> str:
+    """
+    Identifies the client for fair queueing: the client header
+    (server.fair_queueing.client_header), else a digest of the API key.
+    """
+    header = config_manager.get_string("server.fair_queueing.client_header", "X-Client-ID")
+    client = headers.get(header.lower())
+    if client:
+        return client
+    api_key = headers.get("x-api-key")
+    if api_key:
+        return "key-" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:10]
+    return ANONYMOUS_CLIENT
+
+
+def _predict_compute_sec(chars: int) -> float:
+    if admission_controller is not None:
+        return admission_controller.predict_compute_sec(chars)
+    return 0.3 + 0.5 * 0.065 * max(chars, 1)  # Spillover priors until measured
+
+
+def _request_schedule(
+    headers, chars: int, requested_priority: Optional[str] = None, weight: float = 1.0
+) -> RequestSchedule:
+    """Priority class, client and predicted cost used to order a request's work."""
+    return RequestSchedule(
+        priority=_request_priority(headers, requested_priority),
+        client=_request_client(headers),
+        cost_sec=_predict_compute_sec(chars) * weight,
+    )
+
+
+def _chunk_slot(
+    schedule: Optional[RequestSchedule],
+    text: str,
+    cancel_token: Optional[engine.CancellationToken],
+):
+    """Context manager holding a generation slot for one chunk of `text`."""
+    if priority_gate is None:
+        return contextlib.nullcontext()
+    return priority_gate.slot(schedule, cancel_token, cost_sec=_predict_compute_sec(len(text)))
+
+
+# Sheds load once too much predicted audio is outstanding (None: disabled).
+# Background jobs are not admitted here; they queue in the job manager.
+admission_controller: Optional[AdmissionController] = (
+    AdmissionController(
+        config_manager.get_float("server.admission.max_queued_audio_sec", 600.0),
+        parallelism=inference_executor.inference.workers,
+    )
+    if config_manager.get_bool("server.admission.enabled", True)
+    else None
+)
+
+
+def _admit_request(request_id: str, chars: int, weight: float = 1.0) -> None:
+    """Admits a request's predicted audio; raises 429 with Retry-After when full."""
+    if admission_controller is None:
+        return
+    try:
+        admission_controller.admit(request_id, chars, weight)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after_sec)}
+        )
+
+
+def _finish_request(request_id: str, session_id: Optional[str]) -> None:
+    """Drops a finished request from the in-flight registry and the admission budget."""
+    inflight_requests.unregister(request_id, session_id)
+    if admission_controller is not None:
+        admission_controller.release(request_id)
+
+
+# Long-form jobs; created in lifespan (needs the running loop to resume jobs).
+job_manager: Optional[JobManager] = None
+
+
+async def _cancel_on_disconnect(
+    http_request: Request, token: engine.CancellationToken, poll_sec: float = 0.25
+):
+    """Triggers `token` if the HTTP client disconnects while work is in flight."""
+    while not token.cancelled:
+        if await http_request.is_disconnected():
+            inflight_requests.disconnected += 1
+            token.cancel("client disconnected")
+            return
+        await asyncio.sleep(poll_sec)
+
+
+async def _run_cancellable(
+    http_request: Request, token: engine.CancellationToken, fn, *args, **kwargs
+):
+    """
+    Runs a blocking engine call on the inference pool so the event loop can
+    keep watching for client disconnects (and serving cancel calls) meanwhile.
+    """
+    watcher = asyncio.create_task(_cancel_on_disconnect(http_request, token))
+    try:
+        return await inference_executor.run_inference(fn, *args, **kwargs)
+    finally:
+        watcher.cancel()
+
+
+# Identical concurrent generations run once (None: disabled).
+single_flight: Optional[SingleFlight] = (
+    SingleFlight(engine.CancellationToken)
+    if config_manager.get_bool("server.coalescing.enabled", True)
+    else None
+)
+
+
+def _voice_identity(voice_source) -> tuple:
+    """Content identity of a voice: inline audio hash, or file path, mtime and size."""
+    if isinstance(voice_source, engine.InlineVoice):
+        return ("sha256", voice_source.sha256)
+    path = Path(voice_source).resolve()
+    stat = path.stat()
+    return (str(path), stat.st_mtime_ns, stat.st_size)
+
+
+def _coalesce_key(requested: Optional[bool], *parts) -> Optional[tuple]:
+    """
+    Generation key for single-flight coalescing, or None when the request
+    must run on its own. The last part is the params dict. A random seed (0)
+    makes outputs differ, so such requests share only when the caller opts
+    in with `coalesce: true`.
+    """
+    if single_flight is None or requested is False:
+        return None
+    params = parts[-1]
+    if params.get("seed", 0) == 0 and not requested:
+        return None
+    return (*parts[:-1], tuple(sorted(params.items())))
+
+
+async def _run_coalesced(
+    http_request: Request,
+    token: engine.CancellationToken,
+    key: Optional[tuple],
+    make_call: Callable[[engine.CancellationToken], Any],
+):
+    """
+    Awaits `make_call(token)` while watching for client disconnects. With a
+    key, identical concurrent requests attach to one execution; this
+    request's token then only detaches it. Returns (result, shared).
+    """
+    watcher = asyncio.create_task(_cancel_on_disconnect(http_request, token))
+    try:
+        if key is None or single_flight is None:
+            return await make_call(token), False
+        return await single_flight.run(key, make_call, token)
+    finally:
+        watcher.cancel()
+
+
+# Traffic histogram used for predictive pre-wake (created in lifespan)
+traffic_forecaster: Optional[utils.TrafficForecaster] = None
+
+
+def _record_request_arrival():
+    """Feeds the traffic histogram and counts requests that hit a cold model."""
+    if traffic_forecaster is None:
+        return
+    if not engine.MODEL_LOADED or engine._model_on_cpu:
+        traffic_forecaster.cold_wakes += 1
+    traffic_forecaster.record_arrival()
+
+
 async def _idle_watcher(timeout_sec: int):
-    """Background task: offloads model to CPU after timeout_sec of inactivity."""
+    """
+    Background task: offloads model to CPU after timeout_sec of inactivity.
+    With predictive wake enabled it also pre-wakes the model ahead of predicted
+    traffic and skips sleeping while a busy window is predicted.
+    """
     if timeout_sec <= 0:
         return
     poll_interval = min(30, timeout_sec // 2)
+    lead_time_sec = config_manager.get_int("tts_engine.predictive_wake.lead_time_sec", 300)
+    save_interval_sec = 600
+    last_save_time = time.time()
     logger.info(f"Idle watcher started (timeout={timeout_sec}s, poll={poll_interval}s).")
     while True:
         await asyncio.sleep(poll_interval)
+        now = time.time()
+        forecaster = traffic_forecaster
+
+        if forecaster is not None:
+            # A pre-wake not followed by traffic within lead time + one bin is a miss.
+            forecaster.expire_prewake(lead_time_sec + forecaster.bin_minutes * 60, now)
+            if now - last_save_time >= save_interval_sec:
+                await asyncio.to_thread(forecaster.save)
+                last_save_time = now
+
+        model_cold = not engine.MODEL_LOADED or engine._model_on_cpu
+        if (
+            forecaster is not None
+            and model_cold
+            and forecaster.prewake_pending_since is None
+            and forecaster.is_busy(now + lead_time_sec)
+        ):
+            logger.info(
+                f"Traffic predicted within {lead_time_sec}s — pre-waking model."
+            )
+            if await asyncio.to_thread(engine.ensure_loaded):
+                forecaster.note_prewake(now)
+                # Give the pre-woken model a full idle period before it can sleep again.
+                engine.last_request_time = time.time()
+            continue
+
         if (
             engine.MODEL_LOADED
             and not engine._model_on_cpu
             and engine.last_request_time > 0
-            and time.time() - engine.last_request_time >= timeout_sec
+            and now - engine.last_request_time >= timeout_sec
         ):
+            if forecaster is not None and (
+                forecaster.is_busy(now) or forecaster.is_busy(now + lead_time_sec)
+            ):
+                forecaster.sleeps_skipped_busy += 1
+                logger.debug("Idle timeout reached inside a predicted busy window; staying awake.")
+                continue
             logger.info(
                 f"No TTS requests for {timeout_sec}s — sleeping model to free VRAM."
             )
             await asyncio.to_thread(engine.sleep_model)
 
 
+async def _component_residency_watcher(idle_sec: float):
+    """
+    Background task: offloads conditioning components (VoiceEncoder, S3
+    tokenizer, speaker encoder) that have been idle for idle_sec, while the
+    rest of the model stays resident.
+    """
+    if idle_sec <= 0:
+        return
+    poll_interval = max(1.0, min(30.0, idle_sec / 2))
+    while True:
+        await asyncio.sleep(poll_interval)
+        try:
+            await asyncio.to_thread(engine.offload_idle_components)
+        except Exception as e:
+            logger.warning(f"Component offload check failed: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manages application startup and shutdown"""
@@ -167,8 +531,46 @@ async def lifespan(app: FastAPI):
         # Lazy load: model loads on first TTS request, not at startup.
         logger.info("Model will load on first TTS request (lazy load).")
 
+        global traffic_forecaster
+        if config_manager.get_bool("tts_engine.predictive_wake.enabled", True):
+            traffic_forecaster = utils.TrafficForecaster(
+                bin_minutes=config_manager.get_int(
+                    "tts_engine.predictive_wake.bin_minutes", 15
+                ),
+                half_life_days=config_manager.get_float(
+                    "tts_engine.predictive_wake.half_life_days", 14.0
+                ),
+                busy_threshold=config_manager.get_float(
+                    "tts_engine.predictive_wake.busy_threshold", 1.0
+                ),
+                min_bin_arrivals=config_manager.get_float(
+                    "tts_engine.predictive_wake.min_bin_arrivals", 3.0
+                ),
+                history_file=config_manager.get_path(
+                    "tts_engine.predictive_wake.history_file",
+                    "logs/traffic_history.json",
+                    ensure_absolute=True,
+                ),
+            )
+
+        global job_manager
+        job_manager = JobManager(
+            JobStore(get_output_path() / "jobs"),
+            _synthesize_job_chunk,
+            workers=config_manager.get_int("server.jobs.workers", 1),
+            token_factory=engine.CancellationToken,
+        )
+        await job_manager.start()
+
         idle_timeout = config_manager.get_int("tts_engine.idle_timeout_sec", 300)
         idle_task = asyncio.create_task(_idle_watcher(idle_timeout))
+        residency_task = asyncio.create_task(
+            _component_residency_watcher(
+                config_manager.get_float("tts_engine.component_residency.idle_sec", 300.0)
+                if config_manager.get_bool("tts_engine.component_residency.enabled", True)
+                else 0
+            )
+        )
 
         host_address = get_host()
         server_port = get_port()
@@ -187,6 +589,12 @@ async def lifespan(app: FastAPI):
         yield
     finally:
         idle_task.cancel()
+        residency_task.cancel()
+        if job_manager is not None:
+            await job_manager.stop()
+        inference_executor.shutdown()
+        if traffic_forecaster is not None:
+            traffic_forecaster.save()
         logger.info("Application shutdown complete.")
 
 
@@ -252,6 +660,36 @@ async def health_check():
     }
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Runtime metrics for the engine and server-side scheduling features."""
+    return {
+        "model": engine.get_model_info(),
+        "traffic_forecast": (
+            traffic_forecaster.get_stats() if traffic_forecaster is not None else None
+        ),
+        "requests": inflight_requests.get_stats(),
+        "executor": inference_executor.get_stats(),
+        "priority": priority_gate.get_stats() if priority_gate is not None else None,
+        "clients": client_registry.get_stats(),
+        "coalescing": single_flight.get_stats() if single_flight is not None else None,
+        "jobs": job_manager.get_stats() if job_manager is not None else None,
+        "admission": (
+            admission_controller.get_stats() if admission_controller is not None else None
+        ),
+    }
+
+
+@app.post("/tts/cancel/{request_id}")
+async def cancel_tts_request(request_id: str):
+    """Cancels an in-flight generation by the id from its X-Request-ID header."""
+    if not inflight_requests.cancel(request_id, reason="cancelled via API"):
+        raise HTTPException(
+            status_code=404, detail=f"No in-flight request with id '{request_id}'"
+        )
+    return {"request_id": request_id, "cancelled": True}
+
+
 def get_available_voices_list():
     """Helper to list voices from the voices directory"""
     voices_path = get_predefined_voices_path()
@@ -305,9 +743,10 @@ async def list_models():
 
 
 @app.post("/v1/audio/speech")
-async def openai_compatible_tts(request: OpenAISpeechRequest):
+async def openai_compatible_tts(request: OpenAISpeechRequest, http_request: Request):
     """OpenAI-compatible TTS endpoint"""
     logger.info(f"OpenAI API request: model={request.model}, voice={request.voice}")
+    _record_request_arrival()
 
     # Map request to internal format
     voice_path = get_predefined_voices_path() / request.voice
@@ -318,7 +757,54 @@ async def openai_compatible_tts(request: OpenAISpeechRequest):
             raise HTTPException(
                 status_code=404, detail=f"Voice '{request.voice}' not found"
             )
+    return await _openai_speech_response(request, http_request, str(voice_path))
+
+
+@app.post("/v1/audio/speech/multipart")
+async def openai_compatible_tts_multipart(
+    http_request: Request,
+    model: str = Form(...),
+    input_: str = Form(..., alias="input"),
+    reference_audio: UploadFile = File(
+        ..., description="Reference clip to clone; cached by content hash."
+    ),
+    voice: str = Form("inline"),
+    response_format: str = Form("wav"),
+    speed: float = Form(1.0),
+    seed: Optional[int] = Form(None),
+    stream: Optional[bool] = Form(None),
+    stream_format: Optional[str] = Form(None),
+    priority: Optional[str] = Form(None),
+    coalesce: Optional[bool] = Form(None),
+):
+    """OpenAI-compatible TTS with the reference voice uploaded inline."""
+    logger.info(f"OpenAI API multipart request: model={model}")
+    _record_request_arrival()
+    try:
+        request = OpenAISpeechRequest.model_validate(
+            {
+                "model": model,
+                "input": input_,
+                "voice": voice,
+                "response_format": response_format,
+                "speed": speed,
+                "seed": seed,
+                "stream": stream,
+                "stream_format": stream_format,
+                "priority": priority,
+                "coalesce": coalesce,
+            }
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors())
+    inline_voice = await _read_inline_voice(reference_audio)
+    return await _openai_speech_response(request, http_request, inline_voice)
 
+
+async def _openai_speech_response(
+    request: OpenAISpeechRequest, http_request: Request, voice_source
+) -> StreamingResponse:
+    """Synthesizes an OpenAI speech request with a resolved voice (path or InlineVoice)."""
     # Generate audio
     params = {
         "temperature": get_gen_default_temperature(),
@@ -327,39 +813,626 @@ async def openai_compatible_tts(request: OpenAISpeechRequest):
         "seed": request.seed if request.seed else get_gen_default_seed(),
         "speed_factor": request.speed,
         "language": get_gen_default_language(),
+        # Routes to a resident variant when `model` names one; otherwise primary.
+        "model_variant": request.model,
     }
 
-    audio_array, sample_rate = engine.generate(
-        text=request.input_, voice_source_path=str(voice_path), **params
+    request_id = http_request.headers.get("x-request-id") or uuid.uuid4().hex
+    session_id = http_request.headers.get("x-session-id")
+    schedule = _request_schedule(http_request.headers, len(request.input_), request.priority)
+    sse = request.stream_format == "sse"
+    streaming = sse or _should_stream(request.stream)
+    coalesce_key = (
+        None
+        if streaming
+        else _coalesce_key(
+            request.coalesce, "speech", request.input_, _voice_identity(voice_source), params
+        )
     )
+    if coalesce_key is None or not single_flight.in_flight(coalesce_key):
+        _admit_request(request_id, len(request.input_))
+    cancel_token = inflight_requests.register(request_id, session_id)
+    if streaming:
+        # Streaming splits by sentence so the first audio arrives early.
+        text_chunks = utils.chunk_text_by_sentences(
+            request.input_, config_manager.get_int("audio_output.stream_chunk_size", 120)
+        ) or [request.input_]
+        return await _stream_response(
+            http_request,
+            text_chunks,
+            voice_source,
+            params,
+            request.response_format,
+            request_id,
+            session_id,
+            cancel_token,
+            schedule,
+            sse=sse,
+        )
+
+    async def synthesize(token: engine.CancellationToken):
+        # The OpenAI endpoint synthesizes the input as one chunk unless memory
+        # admission has to split it to fit the budget.
+        return await inference_executor.run_inference(
+            _generate_chunks, [request.input_], voice_source, params, token, schedule=schedule
+        )
 
-    if audio_array is None:
-        raise HTTPException(status_code=500, detail="Audio generation failed")
+    try:
+        (generated_chunks, sample_rate), coalesced = await _run_coalesced(
+            http_request, cancel_token, coalesce_key, synthesize
+        )
+    except engine.GenerationCancelled as e:
+        raise HTTPException(status_code=499, detail=f"Generation cancelled: {e}")
+    except engine.MemoryAdmissionError as e:
+        raise _memory_admission_http_error(e)
+    finally:
+        _finish_request(request_id, session_id)
+
+    audio_array = (
+        generated_chunks[0]
+        if len(generated_chunks) == 1
+        else np.concatenate(generated_chunks)
+    )
 
     # Encode audio
-    audio_bytes = utils.encode_audio(
-        audio_array, sample_rate, output_format=request.response_format
+    audio_bytes = await inference_executor.run_encoding(
+        utils.encode_audio, audio_array, sample_rate, output_format=request.response_format
     )
 
     if audio_bytes is None:
         raise HTTPException(status_code=500, detail="Audio encoding failed")
 
-    media_type_map = {"wav": "audio/wav", "opus": "audio/opus", "mp3": "audio/mpeg"}
-
     return StreamingResponse(
         io.BytesIO(audio_bytes),
-        media_type=media_type_map.get(request.response_format, "audio/wav"),
+        media_type=utils.AUDIO_MEDIA_TYPES.get(request.response_format, "audio/wav"),
+        headers={"X-Request-ID": request_id, **({"X-Coalesced": "true"} if coalesced else {})},
     )
 
 
 @app.post("/tts")
-async def custom_tts(request: CustomTTSRequest):
+async def custom_tts(request: CustomTTSRequest, http_request: Request):
     """Custom TTS endpoint with advanced features"""
     logger.info(
         f"TTS request: mode={request.voice_mode}, text_length={len(request.text)}"
     )
+    _record_request_arrival()
+
+    voice_path = _resolve_voice_path(request)
+    return await _custom_tts_response(request, http_request, str(voice_path))
+
+
+@app.websocket("/ws/tts")
+async def websocket_tts(websocket: WebSocket):
+    """
+    Streaming text in, audio out, for LLM agents producing text incrementally.
+
+    Client messages (JSON text frames):
+      {"type": "start", ...}          Voice/generation settings (WebSocketTTSConfig); required first.
+      {"type": "text", "text": "..."} A text delta; finalized sentences are synthesized immediately.
+      {"type": "flush"}               Synthesize buffered text now, even without a sentence end.
+      {"type": "cancel"}              Drop buffered and queued text and stop the current sentence.
+      {"type": "end"}                 Flush, finish pending audio, then close.
+
+    Server messages: binary frames carrying one continuous audio stream in the
+    chosen format, and JSON events: sentence, sentence_done, flushed,
+    cancelled, error, done.
+    """
+    await websocket.accept()
+    _record_request_arrival()
+    await _WebSocketTTSSession(websocket).run()
+
+
+class _WebSocketTTSSession:
+    """State of one /ws/tts connection: splitter, sentence queue and encoder."""
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.config: Optional[WebSocketTTSConfig] = None
+        self.voice_path: Optional[str] = None
+        self.params: Dict[str, Any] = {}
+        self.splitter = utils.IncrementalSentenceSplitter()
+        # Items: ("sentence", epoch, text), ("event", epoch, name) or None (stop)
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.epoch = 0  # Bumped by cancel; older queued items are dropped
+        self.cancel_token = engine.CancellationToken()
+        self.encoder: Optional[utils.StreamingAudioEncoder] = None
+        self.sentence_index = 0
+        # Voice agents are latency-bound; the API key's class still caps this.
+        self.schedule_headers = websocket.headers
+        self._send_lock = asyncio.Lock()
+
+    async def send_event(self, event_type: str, **fields) -> None:
+        async with self._send_lock:
+            await self.websocket.send_json({"type": event_type, **fields})
+
+    async def send_audio(self, data: bytes) -> None:
+        if data:
+            async with self._send_lock:
+                await self.websocket.send_bytes(data)
+
+    def configure(self, message: Dict[str, Any]) -> None:
+        config = WebSocketTTSConfig.model_validate(
+            {key: value for key, value in message.items() if key != "type"}
+        )
+        self.voice_path = str(_resolve_voice_path(config))
+        self.params = _generation_params(config)
+        self.splitter = utils.IncrementalSentenceSplitter(config.max_sentence_chars)
+        if self.config is not None and config.output_format != self.config.output_format:
+            self.encoder = None  # New stream in the new format
+        self.config = config
+
+    def enqueue(self, sentences: List[str]) -> None:
+        for sentence in sentences:
+            self.queue.put_nowait(("sentence", self.epoch, sentence))
+
+    def cancel(self) -> None:
+        self.epoch += 1
+        self.splitter.clear()
+        self.cancel_token.cancel("cancelled by client")
+        self.cancel_token = engine.CancellationToken()
+
+    async def run(self) -> None:
+        worker = asyncio.create_task(self._synthesis_worker())
+        try:
+            while True:
+                try:
+                    message = json.loads(await self.websocket.receive_text())
+                    kind = message.get("type")
+                except (json.JSONDecodeError, AttributeError):
+                    await self.send_event("error", detail="Messages must be JSON objects.")
+                    continue
+
+                if kind == "start":
+                    try:
+                        self.configure(message)
+                    except ValidationError as e:
+                        await self.send_event("error", detail=str(e))
+                    except HTTPException as e:
+                        await self.send_event("error", detail=e.detail)
+                elif kind in ("text", "flush", "end") and self.voice_path is None:
+                    await self.send_event("error", detail="Send a 'start' message first.")
+                elif kind == "text":
+                    self.enqueue(self.splitter.feed(str(message.get("text", ""))))
+                elif kind == "flush":
+                    self.enqueue(self.splitter.flush())
+                    self.queue.put_nowait(("event", self.epoch, "flushed"))
+                elif kind == "cancel":
+                    self.cancel()
+                    await self.send_event("cancelled")
+                elif kind == "end":
+                    self.enqueue(self.splitter.flush())
+                    self.queue.put_nowait(("event", self.epoch, "done"))
+                    self.queue.put_nowait(None)
+                    break
+                else:
+                    await self.send_event("error", detail=f"Unknown message type: {kind!r}")
+            await worker
+            await self.websocket.close()
+        except WebSocketDisconnect:
+            logger.info("WebSocket TTS client disconnected.")
+        finally:
+            self.cancel_token.cancel("websocket closed")
+            worker.cancel()
+
+    async def _synthesis_worker(self) -> None:
+        """
+        Synthesizes queued sentences in order and streams their audio. A
+        segment that fails unexpectedly gets an `error` event and the worker
+        moves on; it stops only when the socket can no longer be written.
+        """
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            kind, epoch, payload = item
+            if epoch != self.epoch:
+                continue
+            index = self.sentence_index if kind == "sentence" else None
+            try:
+                await self._process(kind, epoch, payload)
+            except WebSocketDisconnect:
+                return
+            except Exception as e:
+                logger.error(f"WebSocket TTS segment failed: {e}", exc_info=True)
+                try:
+                    await self.send_event(
+                        "error",
+                        **({"index": index} if index is not None else {}),
+                        detail=f"Synthesis failed: {e}",
+                    )
+                except Exception:
+                    return  # Socket is gone; nothing left to stream to
+
+    async def _process(self, kind: str, epoch: int, payload: str) -> None:
+        """Handles one queued item: a control event or a sentence to speak."""
+        if kind == "event":
+            if payload == "done" and self.encoder is not None:
+                await self.send_audio(
+                    await inference_executor.run_encoding(self.encoder.finish)
+                )
+            await self.send_event(payload)
+            return
+
+        index = self.sentence_index
+        self.sentence_index += 1
+        await self.send_event("sentence", index=index, text=payload)
+        admission_id = f"ws-{id(self)}-{index}"
+        try:
+            _admit_request(admission_id, len(payload))
+            chunks, sample_rate = await inference_executor.run_inference(
+                _generate_chunks,
+                [payload],
+                self.voice_path,
+                self.params,
+                self.cancel_token,
+                schedule=_request_schedule(
+                    self.schedule_headers, len(payload), "interactive"
+                ),
+            )
+        except engine.GenerationCancelled:
+            return
+        except engine.MemoryAdmissionError as e:
+            await self.send_event("error", index=index, detail=str(e))
+            return
+        except HTTPException as e:
+            retry_after = (e.headers or {}).get("Retry-After")
+            await self.send_event(
+                "error",
+                index=index,
+                detail=e.detail,
+                **({"retry_after_sec": int(retry_after)} if retry_after else {}),
+            )
+            return
+        finally:
+            if admission_controller is not None:
+                admission_controller.release(admission_id)
+        if epoch != self.epoch:
+            return  # Cancelled while finishing
+        if self.encoder is None:
+            self.encoder = utils.StreamingAudioEncoder(
+                self.config.output_format, sample_rate
+            )
+        for chunk in chunks:
+            await self.send_audio(
+                await inference_executor.run_encoding(self.encoder.encode, chunk)
+            )
+        await self.send_event(
+            "sentence_done",
+            index=index,
+            duration_sec=round(sum(chunk.size for chunk in chunks) / sample_rate, 3),
+        )
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: JobRequest, http_request: Request):
+    """Queues a long-form synthesis job; poll GET /jobs/{id} for progress."""
+    if job_manager is None:
+        raise HTTPException(status_code=503, detail="Job manager is not running")
+    max_chars = config_manager.get_int("server.jobs.max_text_chars", 500000)
+    if len(request.text) > max_chars:
+        raise HTTPException(
+            status_code=413, detail=f"Text too long for a job ({len(request.text)} > {max_chars} chars)"
+        )
+    voice_path = _resolve_voice_path(request)
+    chunk_size = request.chunk_size or config_manager.get_int("server.jobs.chunk_size", 200)
+    text_chunks = utils.chunk_text_by_sentences(request.text, chunk_size) or [request.text]
+    job = job_manager.submit(
+        text_chunks,
+        {
+            "voice_path": str(voice_path),
+            "params": _generation_params(request),
+            "output_format": request.output_format,
+            "client": _request_client(http_request.headers),
+        },
+    )
+    return job_manager.status(job)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status: progress percentage, ETA from measured RTF, errors."""
+    job = job_manager.store.load(job_id) if job_manager is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job_manager.status(job)
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancels a queued or running job; finished chunks stay on disk until DELETE."""
+    job = job_manager.cancel(job_id) if job_manager is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job_manager.status(job_manager.store.load(job_id) or job)
+
+
+@app.delete("/jobs/{job_id}", status_code=204)
+async def delete_job(job_id: str):
+    """Deletes a job that is not running (cancel it first), with its audio."""
+    if job_manager is None or job_manager.store.load(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    if job_manager.is_running(job_id):
+        raise HTTPException(
+            status_code=409, detail="Job is running; POST /jobs/{id}/cancel first"
+        )
+    await asyncio.to_thread(job_manager.delete, job_id)
+
+
+@app.get("/jobs/{job_id}/audio")
+async def get_job_audio(job_id: str):
+    """The finished job's audio, encoded once and kept next to its chunks."""
+    job = job_manager.store.load(job_id) if job_manager is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    if job["status"] != JOB_COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}, not completed")
+
+    output_format = job["request"]["output_format"]
+    audio_path = job_manager.store.audio_path(job_id, output_format)
+    async with job_manager.audio_lock(job_id):
+        if not audio_path.is_file():
+            audio_array, sample_rate = await asyncio.to_thread(job_manager.store.read_audio, job)
+            audio_bytes = await inference_executor.run_encoding(
+                utils.encode_audio, audio_array, sample_rate, output_format=output_format
+            )
+            if audio_bytes is None:
+                raise HTTPException(status_code=500, detail="Audio encoding failed")
+            await asyncio.to_thread(
+                job_manager.store.write_audio, job_id, output_format, audio_bytes
+            )
+    return FileResponse(
+        audio_path,
+        media_type=utils.AUDIO_MEDIA_TYPES.get(output_format, "audio/wav"),
+        filename=f"{job_id}.{output_format}",
+    )
 
-    # Determine voice source
+
+async def _synthesize_job_chunk(
+    job: Dict[str, Any], text: str, cancel_token: Optional[engine.CancellationToken]
+):
+    """
+    Synthesizes one job chunk on the inference pool. Memory pressure is
+    waited out (shown as `waiting_for: memory` in the job status) for up to
+    server.jobs.memory_retry_limit attempts; then the job fails with the reason.
+    """
+    request = job["request"]
+    retry_limit = config_manager.get_int("server.jobs.memory_retry_limit", 60)
+    retry_sec = config_manager.get_float("server.jobs.memory_retry_sec", 5.0)
+    attempt = 0
+    while True:
+        try:
+            chunks, sample_rate = await inference_executor.run_inference(
+                _generate_chunks,
+                [text],
+                request["voice_path"],
+                request["params"],
+                cancel_token,
+                schedule=RequestSchedule(
+                    "bulk",
+                    request.get("client", ANONYMOUS_CLIENT),
+                    _predict_compute_sec(len(text)),
+                ),
+            )
+            break
+        except engine.MemoryAdmissionError as e:
+            attempt += 1
+            if not e.retryable or attempt > retry_limit:
+                raise RuntimeError(
+                    f"Memory admission failed after {attempt} attempt(s): {e}"
+                ) from e
+            if attempt == 1:
+                job_manager.note_waiting(job, "memory")
+            await asyncio.sleep(retry_sec)
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+    if attempt:
+        job_manager.note_waiting(job, None)
+    audio = chunks[0] if len(chunks) == 1 else np.concatenate(chunks)
+    return audio, sample_rate
+
+
+@app.post("/tts/batch")
+async def batch_tts(request: BatchTTSRequest, http_request: Request):
+    """
+    Synthesizes many short texts in one call. Items are decoded together in
+    engine batches and each succeeds or fails on its own. `ndjson` streams
+    one line per item as it finishes (then a final `done` line); `zip`
+    returns every item's audio plus a results.json manifest.
+    """
+    logger.info(f"Batch TTS request: {len(request.items)} item(s)")
+    _record_request_arrival()
+    max_items = config_manager.get_int("server.batch.max_items", 256)
+    if len(request.items) > max_items:
+        raise HTTPException(
+            status_code=413, detail=f"Too many batch items ({len(request.items)} > {max_items})"
+        )
+    item_ids = [item.id or str(index) for index, item in enumerate(request.items)]
+    if len(set(item_ids)) != len(item_ids):
+        raise HTTPException(status_code=400, detail="Batch item ids must be unique")
+
+    # Items that cannot run (bad voice, too long) fail here without touching the engine.
+    max_item_chars = config_manager.get_int("server.batch.max_item_chars", 300)
+    early_errors: Dict[int, str] = {}
+    engine_items: List[Dict[str, Any]] = []
+    positions: List[int] = []  # engine item -> request item
+    for position, item in enumerate(request.items):
+        if len(item.text) > max_item_chars:
+            early_errors[position] = (
+                f"Text too long for a batch item ({len(item.text)} > {max_item_chars} chars)"
+            )
+            continue
+        try:
+            voice_path = _resolve_voice_path(item)
+        except HTTPException as e:
+            early_errors[position] = e.detail
+            continue
+        params = _generation_params(item)
+        engine_items.append(
+            {
+                "text": item.text,
+                "voice_source_path": str(voice_path),
+                "temperature": params["temperature"],
+                "exaggeration": params["exaggeration"],
+                "cfg_weight": params["cfg_weight"],
+                "seed": params["seed"],
+                "speed_factor": params["speed_factor"],
+            }
+        )
+        positions.append(position)
+
+    total_chars = sum(len(item["text"]) for item in engine_items)
+    request_id = http_request.headers.get("x-request-id") or uuid.uuid4().hex
+    schedule = _request_schedule(http_request.headers, total_chars, request.priority)
+    if engine_items:
+        _admit_request(request_id, total_chars)
+    cancel_token = inflight_requests.register(request_id)
+
+    async def result_line(position: int, result: Dict[str, Any]) -> Dict[str, Any]:
+        line = {"index": position, "id": item_ids[position]}
+        if "error" in result:
+            return {**line, "status": "error", "error": result["error"]}
+        audio_bytes = await inference_executor.run_encoding(
+            utils.encode_audio,
+            result["audio"],
+            result["sample_rate"],
+            output_format=request.output_format,
+        )
+        if audio_bytes is None:
+            return {**line, "status": "error", "error": "Audio encoding failed"}
+        return {
+            **line,
+            "status": "ok",
+            "format": request.output_format,
+            "sample_rate": result["sample_rate"],
+            "duration_sec": round(result["audio"].size / result["sample_rate"], 3),
+            "audio": audio_bytes,
+        }
+
+    if request.response_mode == "zip":
+        try:
+            results = (
+                await _run_cancellable(
+                    http_request,
+                    cancel_token,
+                    _generate_batch,
+                    engine_items,
+                    request.model,
+                    cancel_token,
+                    schedule=schedule,
+                )
+                if engine_items
+                else []
+            )
+        except engine.GenerationCancelled as e:
+            raise HTTPException(status_code=499, detail=f"Generation cancelled: {e}")
+        finally:
+            _finish_request(request_id, None)
+        by_position = {position: {"error": error} for position, error in early_errors.items()}
+        by_position.update(zip(positions, results))
+        lines = [
+            await result_line(position, by_position[position]) for position in range(len(item_ids))
+        ]
+        archive = await inference_executor.run_encoding(_batch_zip, lines)
+        return StreamingResponse(
+            io.BytesIO(archive),
+            media_type="application/zip",
+            headers={
+                "X-Request-ID": request_id,
+                "Content-Disposition": f'attachment; filename="batch_{request_id}.zip"',
+            },
+        )
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def on_group(group_results: List[tuple]) -> None:
+        loop.call_soon_threadsafe(queue.put_nowait, group_results)
+
+    producer = None
+    if engine_items:
+        producer = asyncio.ensure_future(
+            _run_cancellable(
+                http_request,
+                cancel_token,
+                _generate_batch,
+                engine_items,
+                request.model,
+                cancel_token,
+                on_group,
+                schedule=schedule,
+            )
+        )
+        producer.add_done_callback(lambda _: queue.put_nowait(_STREAM_END))
+    else:
+        queue.put_nowait(_STREAM_END)
+
+    async def body():
+        reported = set()
+        failed = 0
+        try:
+            pending = [(position, {"error": error}) for position, error in early_errors.items()]
+            while True:
+                for position, result in pending:
+                    line = await result_line(position, result)
+                    if "audio" in line:
+                        line["audio_base64"] = base64.b64encode(line.pop("audio")).decode("ascii")
+                    else:
+                        failed += 1
+                    reported.add(position)
+                    yield json.dumps(line, ensure_ascii=False) + "\n"
+                group_results = await queue.get()
+                if group_results is _STREAM_END:
+                    break
+                pending = [(positions[index], result) for index, result in group_results]
+            error = None
+            if producer is not None:
+                try:
+                    await producer
+                except Exception as e:
+                    error = getattr(e, "detail", None) or str(e)
+                    logger.error(f"Batch {request_id} ended early: {error}")
+            # Items the producer never reached share its failure.
+            for position in range(len(item_ids)):
+                if position not in reported:
+                    failed += 1
+                    line = {
+                        "index": position,
+                        "id": item_ids[position],
+                        "status": "error",
+                        "error": error or "Batch ended before this item",
+                    }
+                    yield json.dumps(line, ensure_ascii=False) + "\n"
+            yield json.dumps({"done": True, "items": len(item_ids), "failed": failed}) + "\n"
+        finally:
+            if producer is not None and not producer.done():
+                cancel_token.cancel("stream closed")
+            _finish_request(request_id, None)
+
+    return StreamingResponse(
+        body(),
+        media_type="application/x-ndjson",
+        headers={"X-Request-ID": request_id},
+    )
+
+
+def _batch_zip(lines: List[Dict[str, Any]]) -> bytes:
+    """Packs batch results: one audio entry per successful item plus results.json."""
+    buffer = io.BytesIO()
+    # Audio is stored as-is: compressed formats gain nothing and PCM gains little.
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        manifest = []
+        for line in lines:
+            audio_bytes = line.pop("audio", None)
+            if audio_bytes is not None:
+                line["file"] = f"{line['id']}.{line['format']}"
+                archive.writestr(line["file"], audio_bytes)
+            manifest.append(line)
+        archive.writestr("results.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+    return buffer.getvalue()
+
+
+def _resolve_voice_path(request) -> Path:
+    """Maps a request's voice_mode/voice fields to an existing voice file."""
     if request.voice_mode == "predefined":
         if not request.predefined_voice_id:
             raise HTTPException(status_code=400, detail="predefined_voice_id required")
@@ -375,9 +1448,12 @@ async def custom_tts(request: CustomTTSRequest):
         raise HTTPException(
             status_code=404, detail=f"Voice file not found: {voice_path}"
         )
+    return voice_path
 
-    # Prepare generation parameters
-    params = {
+
+def _generation_params(request) -> Dict[str, Any]:
+    """Generation parameters from a request, falling back to config defaults."""
+    return {
         "temperature": request.temperature
         if request.temperature is not None
         else get_gen_default_temperature(),
@@ -394,8 +1470,59 @@ async def custom_tts(request: CustomTTSRequest):
         "language": request.language
         if request.language
         else get_gen_default_language(),
+        "model_variant": getattr(request, "model", None),
     }
 
+
+@app.post("/tts/multipart")
+async def custom_tts_multipart(
+    http_request: Request,
+    payload: str = Form(
+        ..., description="CustomTTSRequest as JSON; voice_mode fields are ignored."
+    ),
+    reference_audio: UploadFile = File(
+        ..., description="Reference clip to clone; cached by content hash."
+    ),
+):
+    """/tts with the clone reference uploaded inline instead of stored on disk."""
+    try:
+        request = CustomTTSRequest.model_validate_json(payload)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors())
+    logger.info(f"TTS multipart request: text_length={len(request.text)}")
+    _record_request_arrival()
+    inline_voice = await _read_inline_voice(reference_audio)
+    return await _custom_tts_response(request, http_request, inline_voice)
+
+
+async def _read_inline_voice(upload: UploadFile) -> engine.InlineVoice:
+    """
+    Reads and validates an uploaded reference clip in memory. Nothing is
+    written to disk; the engine keys its conditionals by the content hash.
+    """
+    max_bytes = int(
+        config_manager.get_float("audio_output.max_reference_upload_mb", 10) * 1024 * 1024
+    )
+    data = await upload.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Reference audio exceeds {max_bytes // (1024 * 1024)} MB.",
+        )
+    is_valid, message = utils.validate_reference_audio_bytes(
+        data, config_manager.get_int("audio_output.max_reference_duration_sec", 30)
+    )
+    if not is_valid:
+        raise HTTPException(status_code=400, detail=message)
+    return engine.InlineVoice(data, upload.filename)
+
+
+async def _custom_tts_response(
+    request: CustomTTSRequest, http_request: Request, voice_source
+) -> StreamingResponse:
+    """Synthesizes a /tts request with a resolved voice (path or InlineVoice)."""
+    params = _generation_params(request)
+
     # Generate audio (single pass or chunked by sentence boundaries)
     text_chunks = [request.text]
     if request.split_text:
@@ -407,22 +1534,92 @@ async def custom_tts(request: CustomTTSRequest):
             f"Chunking enabled: generated {len(text_chunks)} chunk(s) with chunk_size={chunk_size}"
         )
 
-    generated_chunks = []
-    sample_rate = None
-    for chunk in text_chunks:
-        chunk_audio, chunk_sample_rate = engine.generate(
-            text=chunk, voice_source_path=str(voice_path), **params
+    n_candidates = request.n_candidates or 1
+    output_format = (
+        request.output_format if request.output_format else get_audio_output_format()
+    )
+    request_id = http_request.headers.get("x-request-id") or uuid.uuid4().hex
+    session_id = http_request.headers.get("x-session-id")
+    schedule = _request_schedule(
+        http_request.headers, len(request.text), request.priority, weight=n_candidates
+    )
+    # Best-of-N needs every take of a chunk before choosing, so it is not streamed.
+    streaming = n_candidates == 1 and _should_stream(request.stream)
+    coalesce_key = (
+        None
+        if streaming
+        else _coalesce_key(
+            request.coalesce,
+            "tts",
+            tuple(text_chunks),
+            _voice_identity(voice_source),
+            n_candidates,
+            params,
         )
-        if chunk_audio is None:
-            raise HTTPException(status_code=500, detail="Audio generation failed")
-        if sample_rate is None:
-            sample_rate = chunk_sample_rate
-        elif chunk_sample_rate != sample_rate:
-            raise HTTPException(
-                status_code=500,
-                detail="Audio generation failed due to sample rate mismatch across chunks",
+    )
+    # Attaching to a running identical generation adds no work.
+    if coalesce_key is None or not single_flight.in_flight(coalesce_key):
+        _admit_request(request_id, len(request.text), weight=n_candidates)
+    cancel_token = inflight_requests.register(request_id, session_id)
+    if streaming:
+        return await _stream_response(
+            http_request,
+            text_chunks,
+            voice_source,
+            params,
+            output_format,
+            request_id,
+            session_id,
+            cancel_token,
+            schedule,
+        )
+
+    async def synthesize(token: engine.CancellationToken):
+        if n_candidates > 1:
+            return await inference_executor.run_inference(
+                _generate_candidate_chunks,
+                text_chunks,
+                voice_source,
+                params,
+                n_candidates,
+                token,
+                schedule=schedule,
             )
-        generated_chunks.append(np.asarray(chunk_audio).squeeze())
+        return await inference_executor.run_inference(
+            _generate_chunks, text_chunks, voice_source, params, token, schedule=schedule
+        )
+
+    try:
+        result, coalesced = await _run_coalesced(
+            http_request, cancel_token, coalesce_key, synthesize
+        )
+    except engine.GenerationCancelled as e:
+        raise HTTPException(status_code=499, detail=f"Generation cancelled: {e}")
+    except engine.MemoryAdmissionError as e:
+        raise _memory_admission_http_error(e)
+    finally:
+        _finish_request(request_id, session_id)
+
+    headers = {"X-Request-ID": request_id}
+    if coalesced:
+        headers["X-Coalesced"] = "true"
+    if n_candidates > 1:
+        chunk_candidates, sample_rate = result
+    else:
+        generated_chunks, sample_rate = result
+    if n_candidates > 1:
+        if request.return_candidates == "all":
+            return await _all_candidates_response(
+                chunk_candidates, sample_rate, output_format, request_id
+            )
+        # Best take of each chunk; seeds let the caller reproduce it via /tts.
+        generated_chunks = [candidates[0]["audio"] for candidates in chunk_candidates]
+        headers["X-Candidate-Seeds"] = ",".join(
+            str(candidates[0]["seed"]) for candidates in chunk_candidates
+        )
+        headers["X-Candidate-Scores"] = ",".join(
+            f"{candidates[0]['score']:.4f}" for candidates in chunk_candidates
+        )
 
     audio_array = (
         generated_chunks[0]
@@ -431,24 +1628,425 @@ async def custom_tts(request: CustomTTSRequest):
     )
 
     # Encode audio
-    output_format = (
-        request.output_format if request.output_format else get_audio_output_format()
-    )
-    audio_bytes = utils.encode_audio(
-        audio_array, sample_rate, output_format=output_format
+    audio_bytes = await inference_executor.run_encoding(
+        utils.encode_audio, audio_array, sample_rate, output_format=output_format
     )
 
     if audio_bytes is None:
         raise HTTPException(status_code=500, detail="Audio encoding failed")
 
-    media_type_map = {"wav": "audio/wav", "opus": "audio/opus", "mp3": "audio/mpeg"}
-
     return StreamingResponse(
         io.BytesIO(audio_bytes),
-        media_type=media_type_map.get(output_format, "audio/wav"),
+        media_type=utils.AUDIO_MEDIA_TYPES.get(output_format, "audio/wav"),
+        headers=headers,
+    )
+
+
+async def _all_candidates_response(
+    chunk_candidates: List[List[Dict[str, Any]]],
+    sample_rate: int,
+    output_format: str,
+    request_id: str,
+) -> JSONResponse:
+    """
+    Returns every take as JSON, best first. Take i joins candidate i of each
+    chunk; its score is the mean of those chunks' scores.
+    """
+    takes = []
+    for index in range(len(chunk_candidates[0])):
+        parts = [
+            next(c for c in candidates if c["index"] == index)
+            for candidates in chunk_candidates
+        ]
+        audio_bytes = await inference_executor.run_encoding(
+            utils.encode_audio,
+            np.concatenate([part["audio"] for part in parts]),
+            sample_rate,
+            output_format=output_format,
+        )
+        if audio_bytes is None:
+            raise HTTPException(status_code=500, detail="Audio encoding failed")
+        takes.append(
+            {
+                "index": index,
+                "score": round(float(np.mean([part["score"] for part in parts])), 4),
+                "seeds": [part["seed"] for part in parts],
+                "chunk_metrics": [part["metrics"] for part in parts],
+                "audio_base64": base64.b64encode(audio_bytes).decode("ascii"),
+            }
+        )
+    takes.sort(key=lambda take: take["score"], reverse=True)
+    return JSONResponse(
+        {
+            "request_id": request_id,
+            "format": output_format,
+            "sample_rate": sample_rate,
+            "best_index": takes[0]["index"],
+            "candidates": takes,
+        },
+        headers={"X-Request-ID": request_id},
+    )
+
+
+def _should_stream(requested: Optional[bool]) -> bool:
+    if requested is not None:
+        return requested
+    return config_manager.get_bool("audio_output.stream_by_default", False)
+
+
+# Queue sentinel: the producer finished (successfully or not)
+_STREAM_END = object()
+
+
+async def _stream_response(
+    http_request: Request,
+    text_chunks: List[str],
+    voice_source,
+    params: Dict[str, Any],
+    output_format: str,
+    request_id: str,
+    session_id: Optional[str],
+    cancel_token: engine.CancellationToken,
+    schedule: Optional[RequestSchedule] = None,
+    sse: bool = False,
+) -> StreamingResponse:
+    """
+    Streams audio chunk by chunk. One producer on the inference pool runs
+    `_generate_chunks` and hands each chunk to the event loop, where it is
+    encoded incrementally and flushed to the client. With `sse`, each piece
+    is sent as an OpenAI `speech.audio.delta` server-sent event (base64),
+    followed by `speech.audio.done`.
+
+    The response starts only once the first chunk exists, so admission and
+    early generation failures still map to proper status codes. A failure
+    later ends the stream early. Takes ownership of the request's
+    registration in `inflight_requests`.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def on_chunk(audio: np.ndarray, sample_rate: int) -> None:
+        loop.call_soon_threadsafe(queue.put_nowait, (audio, sample_rate))
+
+    producer = asyncio.ensure_future(
+        _run_cancellable(
+            http_request,
+            cancel_token,
+            _generate_chunks,
+            text_chunks,
+            voice_source,
+            params,
+            cancel_token,
+            on_chunk,
+            schedule=schedule,
+        )
+    )
+
+    def on_producer_done(future: asyncio.Future) -> None:
+        if not future.cancelled():
+            future.exception()  # Retrieved here; awaited again below to report it
+        queue.put_nowait(_STREAM_END)
+
+    producer.add_done_callback(on_producer_done)
+
+    try:
+        first = await queue.get()
+        if first is _STREAM_END:
+            await producer  # Re-raises the producer's error
+            raise HTTPException(status_code=500, detail="Audio generation failed")
+        encoder = utils.StreamingAudioEncoder(output_format, first[1])
+    except BaseException as e:
+        cancel_token.cancel("request failed")
+        _finish_request(request_id, session_id)
+        if isinstance(e, engine.GenerationCancelled):
+            raise HTTPException(status_code=499, detail=f"Generation cancelled: {e}")
+        if isinstance(e, engine.MemoryAdmissionError):
+            raise _memory_admission_http_error(e)
+        if isinstance(e, ValueError):
+            raise HTTPException(status_code=400, detail=str(e))
+        raise
+
+    def frame(data: bytes) -> bytes:
+        if not sse:
+            return data
+        return _sse_event(
+            {"type": "speech.audio.delta", "audio": base64.b64encode(data).decode("ascii")}
+        )
+
+    async def body():
+        item = first
+        try:
+            while item is not _STREAM_END:
+                audio, _ = item
+                data = await inference_executor.run_encoding(encoder.encode, audio)
+                if data:
+                    yield frame(data)
+                item = await queue.get()
+            tail = await inference_executor.run_encoding(encoder.finish)
+            if tail:
+                yield frame(tail)
+            try:
+                await producer
+            except Exception as e:
+                logger.error(f"Stream {request_id} ended early: {e}")
+                if sse:
+                    detail = getattr(e, "detail", None) or str(e)
+                    yield _sse_event({"type": "error", "error": {"message": detail}})
+            else:
+                if sse:
+                    yield _sse_event({"type": "speech.audio.done"})
+        finally:
+            # Client went away (or an error occurred) before the last chunk.
+            if not producer.done():
+                cancel_token.cancel("stream closed")
+            _finish_request(request_id, session_id)
+
+    if sse:
+        return StreamingResponse(
+            body(),
+            media_type="text/event-stream",
+            headers={"X-Request-ID": request_id, "Cache-Control": "no-cache"},
+        )
+    return StreamingResponse(
+        body(),
+        media_type=encoder.media_type,
+        headers={"X-Request-ID": request_id},
     )
 
 
+def _sse_event(event: Dict[str, Any]) -> bytes:
+    """One server-sent event carrying `event` as JSON."""
+    return f"data: {json.dumps(event)}\n\n".encode("utf-8")
+
+
+def _memory_admission_http_error(e: "engine.MemoryAdmissionError") -> HTTPException:
+    """Maps a memory admission failure to 413 (never fits) or 503 (retry later)."""
+    if e.retryable:
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return HTTPException(status_code=413, detail=str(e))
+
+
+# Chunk sizes tried, largest first, when a request must be split to fit in memory
+MEMORY_RECHUNK_SIZES = (300, 200, 120, 80, 50)
+
+
+def _plan_memory_admission(text_chunks: List[str], batch: int = 1) -> tuple:
+    """
+    Estimates the request's peak memory (its largest chunk, with `batch`
+    best-of-N candidates) and, when that can never fit the budget, re-chunks
+    the text with progressively smaller chunk sizes.
+    Returns (text_chunks, peak_bytes); peak_bytes is 0 if admission is off.
+    """
+    estimates = [engine.estimate_peak_memory(chunk, batch) for chunk in text_chunks]
+    if not estimates or any(e is None for e in estimates):
+        return text_chunks, 0
+    peak_bytes = max(e["peak_bytes"] for e in estimates)
+    controller = engine.memory_controller
+    if controller.fits(peak_bytes) or not config_manager.get_bool(
+        "tts_engine.memory_admission.force_chunking", True
+    ):
+        return text_chunks, peak_bytes
+
+    full_text = " ".join(text_chunks)
+    for chunk_size in MEMORY_RECHUNK_SIZES:
+        rechunked = utils.chunk_text_by_sentences(full_text, chunk_size)
+        if not rechunked:
+            continue
+        rechunked_peak = max(
+            engine.estimate_peak_memory(chunk, batch)["peak_bytes"] for chunk in rechunked
+        )
+        if controller.fits(rechunked_peak):
+            controller.rechunked += 1
+            logger.info(
+                f"Memory admission: split request into {len(rechunked)} chunk(s) "
+                f"(chunk_size={chunk_size}) to fit the memory budget."
+            )
+            return rechunked, rechunked_peak
+    return text_chunks, peak_bytes
+
+
+def _generate_chunks(
+    text_chunks: List[str],
+    voice_path: Union[str, engine.InlineVoice],
+    params: Dict[str, Any],
+    cancel_token: Optional[engine.CancellationToken] = None,
+    on_chunk: Optional[Callable[[np.ndarray, int], None]] = None,
+    schedule: Optional[RequestSchedule] = None,
+):
+    """
+    Generates each text chunk in order, checking for cancellation between chunks.
+    The request is first planned against the memory budget, which may re-chunk
+    it or raise MemoryAdmissionError. With `on_chunk`, each chunk is handed
+    over as soon as it is produced instead of being collected. Each chunk
+    waits for a slot in priority and fair-queue order (`schedule`), so more
+    urgent requests and other clients can overtake this one between chunks,
+    and reserves its memory only once it holds the slot.
+    Returns (list of 1D audio arrays, sample_rate); raises HTTPException on failure.
+    """
+    if not engine.ensure_loaded():
+        raise HTTPException(status_code=500, detail="Model could not be loaded")
+    text_chunks, peak_bytes = _plan_memory_admission(text_chunks)
+
+    generated_chunks = []
+    sample_rate = None
+    for chunk in text_chunks:
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        # Memory is reserved only while the chunk holds its slot (so a request
+        # overtaken between chunks does not keep memory from the one that
+        # overtook it), and by engine.generate once spillover has picked the
+        # device, so a chunk spilled off the primary device reserves none.
+        with _chunk_slot(schedule, chunk, cancel_token):
+            start_time = time.perf_counter()
+            chunk_audio, chunk_sample_rate = engine.generate(
+                text=chunk,
+                voice_source_path=voice_path,
+                cancel_token=cancel_token,
+                memory_bytes=peak_bytes,
+                **params,
+            )
+        if chunk_audio is None:
+            raise HTTPException(status_code=500, detail="Audio generation failed")
+        chunk_audio_sec = np.asarray(chunk_audio).size / chunk_sample_rate
+        chunk_compute_sec = time.perf_counter() - start_time
+        if admission_controller is not None:
+            admission_controller.observe(len(chunk), chunk_audio_sec, chunk_compute_sec)
+        client_registry.record_served(
+            schedule.client if schedule is not None else ANONYMOUS_CLIENT,
+            chunk_audio_sec,
+            chunk_compute_sec,
+        )
+        if sample_rate is None:
+            sample_rate = chunk_sample_rate
+        elif chunk_sample_rate != sample_rate:
+            raise HTTPException(
+                status_code=500,
+                detail="Audio generation failed due to sample rate mismatch across chunks",
+            )
+        chunk_audio = np.asarray(chunk_audio).squeeze()
+        if on_chunk is not None:
+            on_chunk(chunk_audio, sample_rate)
+        else:
+            generated_chunks.append(chunk_audio)
+    return generated_chunks, sample_rate
+
+
+def _generate_candidate_chunks(
+    text_chunks: List[str],
+    voice_path: Union[str, engine.InlineVoice],
+    params: Dict[str, Any],
+    n_candidates: int,
+    cancel_token: Optional[engine.CancellationToken] = None,
+    schedule: Optional[RequestSchedule] = None,
+):
+    """
+    Best-of-N counterpart of `_generate_chunks`: each chunk gets
+    `n_candidates` takes from one batched pass, admitted as a batch.
+    Returns (per-chunk candidate lists sorted best first, sample_rate).
+    """
+    if not engine.ensure_loaded():
+        raise HTTPException(status_code=500, detail="Model could not be loaded")
+    text_chunks, peak_bytes = _plan_memory_admission(text_chunks, batch=n_candidates)
+
+    chunk_candidates = []
+    sample_rate = None
+    for chunk in text_chunks:
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        with _chunk_slot(schedule, chunk, cancel_token), engine.reserve_memory(peak_bytes):
+            candidates = engine.generate_candidates(
+                text=chunk,
+                voice_source_path=voice_path,
+                n_candidates=n_candidates,
+                cancel_token=cancel_token,
+                **params,
+            )
+        if not candidates:
+            raise HTTPException(status_code=500, detail="Audio generation failed")
+        chunk_sample_rate = candidates[0]["sample_rate"]
+        if sample_rate is None:
+            sample_rate = chunk_sample_rate
+        elif chunk_sample_rate != sample_rate:
+            raise HTTPException(
+                status_code=500,
+                detail="Audio generation failed due to sample rate mismatch across chunks",
+            )
+        for candidate in candidates:
+            candidate["audio"] = np.asarray(candidate["audio"]).squeeze()
+        chunk_candidates.append(candidates)
+    return chunk_candidates, sample_rate
+
+
+def _generate_batch(
+    items: List[Dict[str, Any]],
+    model_variant: Optional[str],
+    cancel_token: Optional[engine.CancellationToken] = None,
+    on_group: Optional[Callable[[List[tuple]], None]] = None,
+    schedule: Optional[RequestSchedule] = None,
+):
+    """
+    Runs /tts/batch items through `engine.generate_batch`, up to
+    server.batch.max_batch_size at a time. Items are sorted by length so each
+    batch pads little. A batch whose predicted peak memory never fits the
+    budget is halved until it does; a single item that still does not fit
+    fails alone. Each batch takes one generation slot (`schedule`). With
+    `on_group`, each batch's (item index, result) pairs are handed over as
+    soon as they exist; otherwise the results are returned in item order.
+    """
+    if not engine.ensure_loaded():
+        raise HTTPException(status_code=500, detail="Model could not be loaded")
+    max_batch_size = max(1, config_manager.get_int("server.batch.max_batch_size", 8))
+    order = sorted(range(len(items)), key=lambda index: len(items[index]["text"]))
+    pending = [
+        order[start : start + max_batch_size] for start in range(0, len(order), max_batch_size)
+    ]
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    while pending:
+        group = pending.pop(0)
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        longest = max((items[index]["text"] for index in group), key=len)
+        estimate = engine.estimate_peak_memory(longest, batch=len(group))
+        peak_bytes = estimate["peak_bytes"] if estimate is not None else 0
+        if peak_bytes and not engine.memory_controller.fits(peak_bytes) and len(group) > 1:
+            middle = len(group) // 2
+            pending[:0] = [group[:middle], group[middle:]]
+            continue
+
+        group_text = " ".join(items[index]["text"] for index in group)
+        try:
+            with _chunk_slot(schedule, group_text, cancel_token), engine.reserve_memory(peak_bytes):
+                start_time = time.perf_counter()
+                group_results = engine.generate_batch(
+                    [items[index] for index in group], cancel_token, model_variant
+                )
+        except engine.MemoryAdmissionError as e:
+            group_results = [{"error": str(e)} for _ in group]
+        else:
+            compute_sec = time.perf_counter() - start_time
+            served_chars = 0
+            audio_sec = 0.0
+            for index, result in zip(group, group_results):
+                if "audio" in result:
+                    result["audio"] = np.asarray(result["audio"]).squeeze()
+                    served_chars += len(items[index]["text"])
+                    audio_sec += result["audio"].size / result["sample_rate"]
+            if admission_controller is not None:
+                admission_controller.observe(served_chars, audio_sec, compute_sec)
+            client_registry.record_served(
+                schedule.client if schedule is not None else ANONYMOUS_CLIENT,
+                audio_sec,
+                compute_sec,
+            )
+        if on_group is not None:
+            on_group(list(zip(group, group_results)))
+        else:
+            for index, result in zip(group, group_results):
+                results[index] = result
+    return results
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,245 @@
+# File: spillover.py
+# Routes synthesis requests between a primary replica and secondary overflow
+# replicas. Each replica keeps an online cost model (measured RTF on its device
+# times the audio length predicted from the text); when the primary's predicted
+# queue wait exceeds a threshold, a request goes to whichever replica is
+# predicted to finish it first.
+
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Starting RTF (compute seconds per audio second) before a replica is measured.
+PRIOR_RTF = {"cuda": 0.5, "mps": 1.0, "cpu": 2.0}
+
+
+class RtfCostModel:
+    """
+    Predicts a request's compute time as
+    `overhead_sec + rtf * audio_sec_per_char * chars`, updating `rtf`,
+    `audio_sec_per_char` and `overhead_sec` by exponential moving average from
+    completed requests.
+    """
+
+    def __init__(
+        self,
+        prior_rtf: float,
+        audio_sec_per_char: float = 0.065,
+        overhead_sec: float = 0.3,
+        alpha: float = 0.3,
+    ):
+        self.rtf = prior_rtf
+        self.audio_sec_per_char = audio_sec_per_char
+        self.overhead_sec = overhead_sec
+        self.alpha = alpha
+        self.samples = 0
+
+    def predict(self, chars: int) -> float:
+        return self.overhead_sec + self.rtf * self.audio_sec_per_char * max(chars, 1)
+
+    def observe(self, chars: int, audio_sec: float, elapsed_sec: float) -> None:
+        if audio_sec <= 0 or chars <= 0:
+            return
+        # Attribute a fixed share of short requests to overhead so RTF is not
+        # inflated by per-request setup (conditioning, vocoder warm-up).
+        observed_rtf = max(elapsed_sec - self.overhead_sec, 0.05 * elapsed_sec) / audio_sec
+        observed_sec_per_char = audio_sec / chars
+        a = self.alpha if self.samples else 1.0
+        self.rtf = (1 - a) * self.rtf + a * observed_rtf
+        self.audio_sec_per_char = (
+            (1 - a) * self.audio_sec_per_char + a * observed_sec_per_char
+        )
+        self.samples += 1
+
+
+class ModelReplica:
+    """
+    One execution lane: a model on a device, a CPU thread count and a bounded
+    number of concurrent requests. Replicas on the same device as the primary
+    reuse the primary's weights.
+
+    A replica with `num_threads` set runs its requests on its own worker
+    threads, each of which applies the count once at start. The OpenMP count
+    belongs to the thread that set it, so lanes never overwrite each other's
+    setting mid-request; libraries that keep a single process-wide count (MKL)
+    still see whichever value was set last.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        model: Any,
+        device: str,
+        num_threads: int = 0,
+        max_concurrency: int = 1,
+        autocast_device: Optional[str] = None,
+    ):
+        self.name = name
+        self.model = model
+        self.device = device
+        self.num_threads = num_threads
+        self.max_concurrency = max(1, max_concurrency)
+        self.autocast_device = autocast_device
+        self.cost = RtfCostModel(PRIOR_RTF.get(device, PRIOR_RTF["cpu"]))
+        self._slots = threading.Semaphore(self.max_concurrency)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if num_threads > 0:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency,
+                thread_name_prefix=f"replica-{name}",
+                initializer=torch.set_num_threads,
+                initargs=(num_threads,),
+            )
+        self._lock = threading.Lock()
+        # ticket -> (predicted_sec, start_time or None while waiting)
+        self._pending: Dict[int, Tuple[float, Optional[float]]] = {}
+        self.completed = 0
+        self.busy_sec = 0.0
+
+    def predicted_wait(self, now: Optional[float] = None) -> float:
+        """Seconds before a newly queued request would start on this replica."""
+        now = now or time.time()
+        with self._lock:
+            remaining = sum(
+                predicted if start is None else max(predicted - (now - start), 0.0)
+                for predicted, start in self._pending.values()
+            )
+            if len(self._pending) < self.max_concurrency:
+                return 0.0
+        return remaining / self.max_concurrency
+
+    def _enqueue(self, ticket: int, predicted_sec: float) -> None:
+        with self._lock:
+            self._pending[ticket] = (predicted_sec, None)
+
+    def _start(self, ticket: int) -> None:
+        with self._lock:
+            predicted, _ = self._pending[ticket]
+            self._pending[ticket] = (predicted, time.time())
+
+    def _finish(self, ticket: int, elapsed_sec: float) -> None:
+        with self._lock:
+            self._pending.pop(ticket, None)
+            self.completed += 1
+            self.busy_sec += elapsed_sec
+
+    def run(self, fn: Callable[["ModelReplica"], Any]) -> Any:
+        """Runs `fn(self)` on this replica's worker threads (or inline without any)."""
+        if self._executor is None:
+            return fn(self)
+        return self._executor.submit(fn, self).result()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queued = sum(1 for _, start in self._pending.values() if start is None)
+            running = len(self._pending) - queued
+        return {
+            "device": self.device,
+            "num_threads": self.num_threads,
+            "max_concurrency": self.max_concurrency,
+            "running": running,
+            "queued": queued,
+            "predicted_wait_sec": round(self.predicted_wait(), 2),
+            "rtf": round(self.cost.rtf, 3),
+            "audio_sec_per_char": round(self.cost.audio_sec_per_char, 4),
+            "cost_samples": self.cost.samples,
+            "completed": self.completed,
+            "busy_sec": round(self.busy_sec, 1),
+        }
+
+
+class SpilloverScheduler:
+    """
+    Sends requests to the primary replica unless its predicted queue wait
+    exceeds `wait_threshold_sec`; then picks the replica with the earliest
+    predicted finish (wait + cost-model service time), which may still be
+    the primary.
+    """
+
+    def __init__(
+        self,
+        primary: ModelReplica,
+        secondaries: List[ModelReplica],
+        wait_threshold_sec: float = 2.0,
+    ):
+        self.primary = primary
+        self.secondaries = secondaries
+        self.wait_threshold_sec = wait_threshold_sec
+        self._tickets = itertools.count()
+        self.routed: Dict[str, int] = {r.name: 0 for r in self.replicas}
+        self.spilled = 0
+
+    @property
+    def replicas(self) -> List[ModelReplica]:
+        return [self.primary] + self.secondaries
+
+    def choose(self, chars: int) -> ModelReplica:
+        now = time.time()
+        if (
+            not self.secondaries
+            or self.primary.predicted_wait(now) <= self.wait_threshold_sec
+        ):
+            return self.primary
+        return min(
+            self.replicas,
+            key=lambda r: r.predicted_wait(now) + r.cost.predict(chars),
+        )
+
+    def execute(self, chars: int, fn: Callable[[ModelReplica], Tuple[Any, Optional[int]]]):
+        """
+        Runs `fn(replica)` on the chosen replica, blocking while its slots are
+        busy. `fn` returns (audio, sample_rate); the measured time feeds the
+        replica's cost model.
+        """
+        replica = self.choose(chars)
+        ticket = next(self._tickets)
+        replica._enqueue(ticket, replica.cost.predict(chars))
+        self.routed[replica.name] = self.routed.get(replica.name, 0) + 1
+        if replica is not self.primary:
+            self.spilled += 1
+            logger.info(
+                f"Primary queue wait above {self.wait_threshold_sec:.1f}s; "
+                f"spilling request ({chars} chars) to replica '{replica.name}'."
+            )
+        start_time = None
+        try:
+            with replica._slots:
+                replica._start(ticket)
+                start_time = time.perf_counter()
+                audio, sample_rate = replica.run(fn)
+            elapsed = time.perf_counter() - start_time
+            if audio is not None and sample_rate:
+                audio_sec = float(getattr(audio, "shape", [0])[-1]) / sample_rate
+                replica.cost.observe(chars, audio_sec, elapsed)
+            return audio, sample_rate
+        finally:
+            replica._finish(
+                ticket, time.perf_counter() - start_time if start_time else 0.0
+            )
+
+    def shutdown(self) -> None:
+        for replica in self.replicas:
+            replica.shutdown()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "wait_threshold_sec": self.wait_threshold_sec,
+            "spilled": self.spilled,
+            "routed": dict(self.routed),
+            "replicas": {r.name: r.get_stats() for r in self.replicas},
+        }
+
+
+# --- End File: spillover.py ---
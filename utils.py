@@ -8,6 +8,10 @@ import logging
 import re
 import time
 import io
+import json
+import struct
+import subprocess
+import threading
 import uuid
 from pathlib import Path
 from typing import Optional, Tuple, Dict, Any, Set, List
@@ -211,6 +215,81 @@ NON_VERBAL_CUE_PATTERN = re.compile(r"(\([\w\s'-]+\))")
 
 
 # --- Audio Processing Utilities ---
+
+# Media types of every supported output format.
+AUDIO_MEDIA_TYPES = {
+    "wav": "audio/wav",
+    "opus": "audio/opus",
+    "mp3": "audio/mpeg",
+    "pcm": "audio/pcm",  # Raw little-endian int16, mono, at the model's rate
+    "flac": "audio/flac",
+    "mulaw": "audio/basic",  # Raw G.711 mu-law, 8 kHz
+    "alaw": "audio/x-alaw-basic",  # Raw G.711 A-law, 8 kHz
+}
+TELEPHONY_FORMATS = {"mulaw", "alaw"}
+TELEPHONY_SAMPLE_RATE = 8000
+
+# G.711 segment end points (14-bit mu-law / 13-bit A-law magnitudes).
+_MULAW_SEGMENT_ENDS = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+_ALAW_SEGMENT_ENDS = np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF])
+
+
+def _to_pcm16(audio_array: np.ndarray) -> np.ndarray:
+    audio = np.asarray(audio_array, dtype=np.float32).reshape(-1)
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+def linear_to_mulaw(pcm16: np.ndarray) -> np.ndarray:
+    """G.711 mu-law encoding of int16 samples, vectorized (matches audioop.lin2ulaw)."""
+    samples = pcm16.astype(np.int32) >> 2
+    mask = np.where(samples < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(samples), 8159) + 0x21
+    segment = np.searchsorted(_MULAW_SEGMENT_ENDS, magnitude)
+    value = (np.minimum(segment, 7) << 4) | ((magnitude >> (segment + 1)) & 0x0F)
+    value = np.where(segment >= 8, 0x7F, value)  # Clipped full scale
+    return (value ^ mask).astype(np.uint8)
+
+
+def linear_to_alaw(pcm16: np.ndarray) -> np.ndarray:
+    """G.711 A-law encoding of int16 samples, vectorized (matches audioop.lin2alaw)."""
+    samples = pcm16.astype(np.int32) >> 3
+    mask = np.where(samples >= 0, 0xD5, 0x55)
+    magnitude = np.where(samples >= 0, samples, -samples - 1)
+    segment = np.searchsorted(_ALAW_SEGMENT_ENDS, magnitude)
+    shift = np.where(segment < 2, 1, segment)
+    value = (np.minimum(segment, 7) << 4) | ((magnitude >> shift) & 0x0F)
+    value = np.where(segment >= 8, 0x7F, value)
+    return (value ^ mask).astype(np.uint8)
+
+
+def resample_for_telephony(audio_array: np.ndarray, sample_rate: int) -> np.ndarray:
+    """
+    Resamples to 8 kHz. Integer ratios (24 kHz -> 8 kHz) use a windowed-sinc
+    low-pass and decimation in NumPy; other rates fall back to librosa.
+    """
+    audio = np.asarray(audio_array, dtype=np.float32).reshape(-1)
+    if sample_rate == TELEPHONY_SAMPLE_RATE:
+        return audio
+    if sample_rate % TELEPHONY_SAMPLE_RATE == 0:
+        factor = sample_rate // TELEPHONY_SAMPLE_RATE
+        taps = 16 * factor + 1
+        cutoff = 0.45 / factor  # Just under the 4 kHz Nyquist of the target rate
+        n = np.arange(taps) - (taps - 1) / 2
+        kernel = (2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)).astype(np.float32)
+        kernel /= kernel.sum()
+        return np.convolve(audio, kernel, mode="same")[::factor]
+    if LIBROSA_AVAILABLE:
+        return librosa.resample(y=audio, orig_sr=sample_rate, target_sr=TELEPHONY_SAMPLE_RATE)
+    raise ValueError(f"Cannot resample {sample_rate}Hz to 8kHz without librosa.")
+
+
+def encode_telephony(audio_array: np.ndarray, sample_rate: int, output_format: str) -> bytes:
+    """Raw 8 kHz G.711 ('mulaw' or 'alaw') bytes."""
+    pcm16 = _to_pcm16(resample_for_telephony(audio_array, sample_rate))
+    encoder = linear_to_mulaw if output_format == "mulaw" else linear_to_alaw
+    return encoder(pcm16).tobytes()
+
+
 def encode_audio(
     audio_array: np.ndarray,
     sample_rate: int,
@@ -218,13 +297,15 @@ def encode_audio(
     target_sample_rate: Optional[int] = None,
 ) -> Optional[bytes]:
     """
-    Encodes a NumPy audio array into the specified format (Opus or WAV) in memory.
+    Encodes a NumPy audio array into the specified format in memory.
     Can resample the audio to a target sample rate before encoding if specified.
+    pcm, flac, mulaw and alaw are encoded in-process (NumPy/libsndfile), with
+    no ffmpeg subprocess; mulaw/alaw are always 8 kHz.
 
     Args:
         audio_array: NumPy array containing audio data (expected as float32, range [-1, 1]).
         sample_rate: Sample rate of the input audio data.
-        output_format: Desired output format ('opus', 'wav' or 'mp3').
+        output_format: Desired output format (see AUDIO_MEDIA_TYPES).
         target_sample_rate: Optional target sample rate to resample to before encoding.
 
     Returns:
@@ -297,7 +378,29 @@ def encode_audio(
         audio_to_write = audio_array
         rate_to_write = sample_rate
 
-        if output_format == "opus":
+        if output_format == "pcm":
+            # Fast path: the samples themselves, no container.
+            encoded_bytes = _to_pcm16(audio_array).astype("<i2").tobytes()
+            logger.info(
+                f"Encoded {len(encoded_bytes)} bytes to 'pcm' at {rate_to_write}Hz in "
+                f"{time.time() - start_time:.3f} seconds."
+            )
+            return encoded_bytes
+
+        elif output_format in TELEPHONY_FORMATS:
+            rate_to_write = TELEPHONY_SAMPLE_RATE
+            output_buffer.write(encode_telephony(audio_array, sample_rate, output_format))
+
+        elif output_format == "flac":
+            sf.write(
+                output_buffer,
+                _to_pcm16(audio_array),
+                rate_to_write,
+                format="FLAC",
+                subtype="PCM_16",
+            )
+
+        elif output_format == "opus":
             OPUS_SUPPORTED_RATES = {8000, 12000, 16000, 24000, 48000}
             TARGET_OPUS_RATE = 48000  # Preferred Opus rate.
 
@@ -374,6 +477,200 @@ def encode_audio(
         return None
 
 
+class StreamingAudioEncoder:
+    """
+    Incremental encoder for progressive HTTP delivery. `encode(chunk)` returns
+    the bytes that can be sent for one audio chunk (the container header comes
+    with the first) and `finish()` returns any trailing bytes.
+
+    - wav: RIFF header declaring the maximum data size (clients read to EOF),
+      then raw PCM16 per chunk.
+    - opus: a single Ogg/Opus stream; pages completed by each chunk are sent
+      immediately, the rest on finish().
+    - mp3: one encoder for the whole stream (libsndfile's, else a single
+      ffmpeg process fed through stdin), so chunk joins carry no per-segment
+      encoder delay or padding; frames are sent as the encoder emits them.
+    - pcm, mulaw, alaw: headerless, so each chunk is just its samples.
+    - flac: one FLAC stream (header first, frames per chunk), like opus.
+    """
+
+    MEDIA_TYPES = AUDIO_MEDIA_TYPES
+    OPUS_SUPPORTED_RATES = {8000, 12000, 16000, 24000, 48000}
+    # Formats streamed through one persistent libsndfile encoder: (format, subtype)
+    SOUNDFILE_FORMATS = {
+        "opus": ("OGG", "OPUS"),
+        "flac": ("FLAC", "PCM_16"),
+        **({"mp3": ("MP3", "MPEG_LAYER_III")} if "MP3" in sf.available_formats() else {}),
+    }
+
+    def __init__(self, output_format: str, sample_rate: int):
+        if output_format not in self.MEDIA_TYPES:
+            raise ValueError(f"Streaming is not supported for format '{output_format}'.")
+        self.output_format = output_format
+        self.sample_rate = sample_rate
+        self._started = False
+        self._ogg_buffer: Optional[io.BytesIO] = None
+        self._ogg_file = None
+        self._sent = 0
+        self._mp3_process: Optional[_Mp3EncoderProcess] = None
+
+    @property
+    def media_type(self) -> str:
+        return self.MEDIA_TYPES[self.output_format]
+
+    @staticmethod
+    def _pcm16(audio_array: np.ndarray) -> np.ndarray:
+        return _to_pcm16(audio_array)
+
+    def _wav_header(self) -> bytes:
+        # 0xFFFFFFFF RIFF size: length unknown while streaming.
+        return struct.pack(
+            "<4sI4s4sIHHIIHH4sI",
+            b"RIFF",
+            0xFFFFFFFF,
+            b"WAVE",
+            b"fmt ",
+            16,
+            1,  # PCM
+            1,  # Mono
+            self.sample_rate,
+            self.sample_rate * 2,
+            2,
+            16,
+            b"data",
+            0xFFFFFFFF - 36,
+        )
+
+    def _drain_ogg(self) -> bytes:
+        data = self._ogg_buffer.getvalue()
+        new_bytes = data[self._sent :]
+        self._sent = len(data)
+        return new_bytes
+
+    def encode(self, audio_array: np.ndarray) -> bytes:
+        if audio_array is None or np.asarray(audio_array).size == 0:
+            return b""
+        if self.output_format == "wav":
+            header = b"" if self._started else self._wav_header()
+            self._started = True
+            return header + self._pcm16(audio_array).tobytes()
+
+        if self.output_format == "pcm":
+            return self._pcm16(audio_array).astype("<i2").tobytes()
+
+        if self.output_format in TELEPHONY_FORMATS:
+            return encode_telephony(audio_array, self.sample_rate, self.output_format)
+
+        if self.output_format in self.SOUNDFILE_FORMATS:
+            audio = np.asarray(audio_array, dtype=np.float32).reshape(-1)
+            rate = self.sample_rate
+            if (
+                self.output_format == "opus"
+                and rate not in self.OPUS_SUPPORTED_RATES
+                and LIBROSA_AVAILABLE
+            ):
+                audio = librosa.resample(y=audio, orig_sr=rate, target_sr=48000)
+                rate = 48000
+            if self._ogg_file is None:
+                file_format, subtype = self.SOUNDFILE_FORMATS[self.output_format]
+                self._ogg_buffer = io.BytesIO()
+                self._ogg_file = sf.SoundFile(
+                    self._ogg_buffer,
+                    mode="w",
+                    samplerate=rate,
+                    channels=1,
+                    format=file_format,
+                    subtype=subtype,
+                )
+            self._ogg_file.write(audio)
+            self._ogg_file.flush()
+            return self._drain_ogg()
+
+        # mp3 without libsndfile MPEG support
+        if self._mp3_process is None:
+            self._mp3_process = _Mp3EncoderProcess(self.sample_rate)
+        return self._mp3_process.write(self._pcm16(audio_array).tobytes())
+
+    def finish(self) -> bytes:
+        if self._ogg_file is not None:
+            self._ogg_file.close()
+            self._ogg_file = None
+            return self._drain_ogg()
+        if self._mp3_process is not None:
+            process, self._mp3_process = self._mp3_process, None
+            return process.close()
+        if self.output_format == "wav" and not self._started:
+            self._started = True
+            return self._wav_header()  # Empty but well-formed stream
+        return b""
+
+
+class _Mp3EncoderProcess:
+    """
+    One ffmpeg process encoding a whole stream: PCM16 goes in on stdin and a
+    reader thread collects the MP3 frames ffmpeg writes to stdout. `write`
+    returns the frames produced so far; `close` flushes the encoder.
+    """
+
+    def __init__(self, sample_rate: int):
+        self._process = subprocess.Popen(
+            [
+                AudioSegment.converter,
+                "-hide_banner",
+                "-loglevel", "error",
+                "-f", "s16le",
+                "-ar", str(sample_rate),
+                "-ac", "1",
+                "-i", "pipe:0",
+                "-f", "mp3",
+                "-write_xing", "0",
+                "-id3v2_version", "0",
+                "pipe:1",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._output = bytearray()
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        stdout = self._process.stdout
+        while True:
+            data = stdout.read1(65536)
+            if not data:
+                return
+            with self._lock:
+                self._output.extend(data)
+
+    def _take(self) -> bytes:
+        with self._lock:
+            data = bytes(self._output)
+            self._output.clear()
+        return data
+
+    def write(self, pcm: bytes) -> bytes:
+        self._process.stdin.write(pcm)
+        self._process.stdin.flush()
+        return self._take()
+
+    def close(self) -> bytes:
+        self._process.stdin.close()
+        self._reader.join(timeout=30)
+        self._process.wait(timeout=30)
+        return self._take()
+
+    def __del__(self):
+        # Abandoned stream (client went away): do not leave ffmpeg running.
+        try:
+            if self._process.poll() is None:
+                self._process.kill()
+        except Exception:
+            pass
+
+
 def save_audio_to_file(
     audio_array: np.ndarray, sample_rate: int, file_path_str: str
 ) -> bool:
@@ -1024,6 +1321,62 @@ def _preprocess_and_segment_text(full_text: str) -> List[Tuple[Optional[str], st
     return segmented_with_tags
 
 
+class IncrementalSentenceSplitter:
+    """
+    Incremental counterpart of `split_into_sentences` for text that arrives in
+    deltas (e.g. LLM tokens). `feed()` returns the sentences that are final:
+    followed by more text, so the splitter has already accepted the boundary
+    (abbreviations, decimals and ellipses are handled as in the batch splitter).
+    A sentence ending the buffer is final once whitespace follows its
+    terminator. Text running past `max_chars` with no boundary is cut at the
+    last comma or space so synthesis never stalls on unpunctuated input.
+    """
+
+    def __init__(self, max_chars: int = 300):
+        self.max_chars = max_chars
+        self._buffer = ""
+
+    @property
+    def pending(self) -> str:
+        return self._buffer
+
+    def feed(self, delta: str) -> List[str]:
+        self._buffer += delta.replace("\r\n", "\n").replace("\r", "\n")
+        if not self._buffer.strip():
+            return []
+        # A sentinel word after trailing whitespace lets the batch splitter
+        # decide whether the last terminator really ends a sentence.
+        probe = self._buffer + ("Z" if self._buffer[-1].isspace() else "")
+        finals = split_into_sentences(probe)[:-1]
+        cursor = 0
+        for sentence in finals:
+            index = self._buffer.find(sentence, cursor)
+            if index < 0:  # Splitter normalized the text; stop conservatively.
+                finals = finals[: finals.index(sentence)]
+                break
+            cursor = index + len(sentence)
+        self._buffer = self._buffer[cursor:].lstrip()
+
+        while len(self._buffer) > self.max_chars:
+            cut = max(
+                self._buffer.rfind(",", 0, self.max_chars),
+                self._buffer.rfind(" ", 0, self.max_chars),
+            )
+            cut = cut + 1 if cut > 0 else self.max_chars
+            finals.append(self._buffer[:cut].strip())
+            self._buffer = self._buffer[cut:].lstrip()
+        return [sentence for sentence in finals if sentence]
+
+    def flush(self) -> List[str]:
+        """Returns whatever is buffered (end of input or explicit flush)."""
+        remaining = self._buffer.strip()
+        self._buffer = ""
+        return split_into_sentences(remaining) if remaining else []
+
+    def clear(self) -> None:
+        self._buffer = ""
+
+
 def chunk_text_by_sentences(
     full_text: str,
     chunk_size: int,
@@ -1247,6 +1600,40 @@ def validate_reference_audio(
     return True, "Reference audio appears valid."
 
 
+def validate_reference_audio_bytes(
+    data: bytes, max_duration_sec: Optional[int] = None
+) -> Tuple[bool, str]:
+    """
+    Validates reference audio uploaded inline with a request. Only the header
+    is parsed (no full decode), so this is cheap even for cached voices.
+
+    Args:
+        data: Raw bytes of the uploaded audio file.
+        max_duration_sec: Optional maximum duration in seconds. If None, duration is not checked.
+
+    Returns:
+        A tuple (is_valid: bool, message: str).
+    """
+    if not data:
+        return False, "Reference audio upload is empty."
+    try:
+        audio_info = sf.info(io.BytesIO(data))
+    except Exception as e:
+        return (
+            False,
+            f"Could not decode reference audio ({e}). Please use WAV, FLAC, OGG or MP3 format.",
+        )
+    duration = audio_info.duration
+    if duration <= 0:
+        return False, "Reference audio has zero or negative duration."
+    if max_duration_sec is not None and max_duration_sec > 0 and duration > max_duration_sec:
+        return (
+            False,
+            f"Reference audio duration ({duration:.2f}s) exceeds maximum allowed ({max_duration_sec}s).",
+        )
+    return True, "Reference audio appears valid."
+
+
 # --- Performance Monitoring Utility ---
 class PerformanceMonitor:
     """
@@ -1299,3 +1686,156 @@ class PerformanceMonitor:
         if self.logger:
             self.logger.log(log_level, full_report_str)
         return full_report_str
+
+
+# --- Traffic Forecasting Utility ---
+class TrafficForecaster:
+    """
+    Keeps a decayed day-of-week x time-of-day histogram of request arrivals and
+    predicts whether a given moment falls inside a busy window. Used by the idle
+    watcher to pre-wake a sleeping model ahead of recurring traffic and to hold
+    off sleeping while traffic is expected.
+
+    Bin values are "expected arrivals per bin on this weekday", estimated with an
+    exponential decay so that the histogram follows schedule changes. A bin is
+    only predicted busy once it holds `min_bin_arrivals` (decayed) arrivals, so
+    a one-off request early on does not keep the model awake every week.
+    """
+
+    def __init__(
+        self,
+        bin_minutes: int = 15,
+        half_life_days: float = 14.0,
+        busy_threshold: float = 1.0,
+        history_file: Optional[Path] = None,
+        min_bin_arrivals: float = 3.0,
+    ):
+        self.bin_minutes: int = max(1, int(bin_minutes))
+        self.bins_per_day: int = (24 * 60) // self.bin_minutes
+        self.half_life_days: float = max(0.1, float(half_life_days))
+        self.busy_threshold: float = float(busy_threshold)
+        self.min_bin_arrivals: float = max(0.0, float(min_bin_arrivals))
+        self.history_file: Optional[Path] = history_file
+        self.counts: List[float] = [0.0] * (7 * self.bins_per_day)
+        # Effective number of observed weeks under the same decay, per weekday.
+        self.weeks_observed: float = 0.0
+        self.last_update: float = time.time()
+
+        # Pre-wake accounting
+        self.prewake_pending_since: Optional[float] = None
+        self.prewake_hits: int = 0
+        self.prewake_misses: int = 0
+        self.cold_wakes: int = 0
+        self.sleeps_skipped_busy: int = 0
+
+        if self.history_file is not None:
+            self.load()
+
+    def _bin_index(self, timestamp: float) -> int:
+        local_time = time.localtime(timestamp)
+        minute_of_day = local_time.tm_hour * 60 + local_time.tm_min
+        return local_time.tm_wday * self.bins_per_day + minute_of_day // self.bin_minutes
+
+    def _decay_to(self, now: float):
+        """Applies exponential decay for the time elapsed since the last update."""
+        elapsed_days = max(0.0, now - self.last_update) / 86400.0
+        if elapsed_days <= 0:
+            return
+        factor = 0.5 ** (elapsed_days / self.half_life_days)
+        self.counts = [c * factor for c in self.counts]
+        # One week of observation accrues per 7 days, decayed the same way.
+        self.weeks_observed = self.weeks_observed * factor + elapsed_days / 7.0
+        self.last_update = now
+
+    def record_arrival(self, timestamp: Optional[float] = None):
+        """Records one request arrival and resolves a pending pre-wake as a hit."""
+        now = timestamp if timestamp is not None else time.time()
+        self._decay_to(now)
+        self.counts[self._bin_index(now)] += 1.0
+        if self.prewake_pending_since is not None:
+            self.prewake_hits += 1
+            self.prewake_pending_since = None
+
+    def expected_arrivals(self, timestamp: float) -> float:
+        """Returns the expected number of arrivals in the bin containing `timestamp`."""
+        # Less than a week of history: treat raw counts as a single week.
+        return self.counts[self._bin_index(timestamp)] / max(self.weeks_observed, 1.0)
+
+    def is_busy(self, timestamp: float) -> bool:
+        """True when the bin containing `timestamp` is predicted to see traffic."""
+        if self.counts[self._bin_index(timestamp)] < self.min_bin_arrivals:
+            return False
+        return self.expected_arrivals(timestamp) >= self.busy_threshold
+
+    def note_prewake(self, timestamp: Optional[float] = None):
+        """Marks that the model was woken ahead of predicted traffic."""
+        self.prewake_pending_since = (
+            timestamp if timestamp is not None else time.time()
+        )
+
+    def expire_prewake(self, window_sec: float, timestamp: Optional[float] = None):
+        """Counts a pending pre-wake as a miss once `window_sec` passes without traffic."""
+        now = timestamp if timestamp is not None else time.time()
+        if (
+            self.prewake_pending_since is not None
+            and now - self.prewake_pending_since >= window_sec
+        ):
+            self.prewake_misses += 1
+            self.prewake_pending_since = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "bin_minutes": self.bin_minutes,
+            "weeks_observed": round(self.weeks_observed, 3),
+            "expected_arrivals_current_bin": round(self.expected_arrivals(now), 3),
+            "busy_now": self.is_busy(now),
+            "prewake_pending": self.prewake_pending_since is not None,
+            "prewake_hits": self.prewake_hits,
+            "prewake_misses": self.prewake_misses,
+            "cold_wakes": self.cold_wakes,
+            "sleeps_skipped_busy": self.sleeps_skipped_busy,
+        }
+
+    def save(self) -> bool:
+        """Persists the histogram to `history_file` as JSON."""
+        if self.history_file is None:
+            return False
+        try:
+            self.history_file.parent.mkdir(parents=True, exist_ok=True)
+            payload = {
+                "bin_minutes": self.bin_minutes,
+                "counts": self.counts,
+                "weeks_observed": self.weeks_observed,
+                "last_update": self.last_update,
+            }
+            tmp_path = self.history_file.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(payload), encoding="utf-8")
+            os.replace(tmp_path, self.history_file)
+            return True
+        except Exception as e:
+            logger.warning(f"Could not save traffic history to {self.history_file}: {e}")
+            return False
+
+    def load(self) -> bool:
+        """Restores a histogram saved by `save`; ignored if the bin layout changed."""
+        if self.history_file is None or not self.history_file.is_file():
+            return False
+        try:
+            payload = json.loads(self.history_file.read_text(encoding="utf-8"))
+            if payload.get("bin_minutes") != self.bin_minutes or len(
+                payload.get("counts", [])
+            ) != len(self.counts):
+                logger.info(
+                    "Traffic history bin layout changed; starting a fresh histogram."
+                )
+                return False
+            self.counts = [float(c) for c in payload["counts"]]
+            self.weeks_observed = float(payload.get("weeks_observed", 0.0))
+            self.last_update = float(payload.get("last_update", time.time()))
+            self._decay_to(time.time())
+            logger.info(f"Loaded traffic history from {self.history_file}.")
+            return True
+        except Exception as e:
+            logger.warning(f"Could not load traffic history from {self.history_file}: {e}")
+            return False